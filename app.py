@@ -1,23 +1,56 @@
-import streamlit as st
-import pandas as pd
-import plotly.express as px
+from rag import arranque
 import json
-import fitz  # PyMuPDF para manejar PDFs
-from supabase import create_client
-from rag.pipeline import process_user_question
-from rag.db_queries import get_contratos, get_facturas, top_conceptos_global
+import streamlit as st
+from rag import trazas
+from rag.trazas import span, traza
+
+# Las dependencias pesadas (pandas, plotly, openai, supabase, fitz) se importan con
+# arranque.importar() dentro de cada vista: abrir el chatbot no paga plotly, etc.
+arranque.marcar("imports de app.py")
 
 st.set_page_config(page_title="POC Residencias", layout="wide")
 
-# 📌 Inicialización de Supabase
+trazas.configurar(umbral_ms=st.secrets.get("SLOW_REQUEST_MS"), ruta_log=st.secrets.get("SLOW_LOG_PATH"))
+
+# 📌 Inicialización del cliente de datos (Supabase REST o Postgres directo, según DATA_BACKEND)
+# Se crea la primera vez que una vista lo pide, no al cargar el script
+@st.cache_resource
 def init_connection():
-    url = st.secrets["SUPABASE_URL"]
-    key = st.secrets["SUPABASE_KEY"]
-    return create_client(url, key)
+    with span("app.init_connection"):
+        return arranque.importar("rag.backends").crear_cliente(st.secrets)
+
+# 📌 Calentamiento opcional (WARMUP = true en secrets): snapshot, parser e índice de nombres en segundo plano
+@st.cache_resource
+def iniciar_calentamiento():
+    from streamlit.runtime.scriptrunner import add_script_run_ctx
 
-supabase_client = init_connection()
+    hilo = arranque.hilo_calentamiento(init_connection)
+    add_script_run_ctx(hilo)
+    hilo.start()
+    return hilo
+
+if str(st.secrets.get("WARMUP", "")).lower() in ("1", "true", "si", "sí"):
+    iniciar_calentamiento()
+
+# 📌 Extracción de PDFs en segundo plano (compartida entre reruns y sesiones)
+@st.cache_resource
+def get_extractor_pdf():
+    return arranque.importar("rag.extraccion_pdf").ExtractorPDF()
+
+# 📌 JSON subido: con la forma de residencias_data.json -> dataset en memoria; si no, como texto
+@st.cache_resource(max_entries=8)
+def cargar_dataset_json(data: bytes):
+    """
+    Devuelve (cliente en memoria, None) o (None, texto del JSON). El JSON se parsea una sola vez.
+    """
+    dataset_json = arranque.importar("rag.dataset_json")
+    contenido = json.loads(data)
+    if not dataset_json.es_formato_residencias(contenido):
+        return None, json.dumps(contenido, ensure_ascii=False)
+    return dataset_json.cliente_desde_json(contenido), None
 
 # 📌 Función para Formatear las Respuestas del Chatbot
+@traza("app.formatear_respuesta")
 def formatear_respuesta(respuesta):
     """
     Aplica formato a la respuesta:
@@ -25,6 +58,7 @@ def formatear_respuesta(respuesta):
     - Si es una tabla, muestra en `st.dataframe()`.
     - Si es texto normal, devuelve en Markdown sin formato de tabla.
     """
+    pd = arranque.importar("pandas")
     if isinstance(respuesta, list):  
         return "<ul style='padding-left: 20px;'>" + "".join([f"<li><b>{item}</b></li>" for item in respuesta]) + "</ul>"
 
@@ -41,23 +75,34 @@ def formatear_respuesta(respuesta):
 # 🏠 Dashboard General con Pestañas y Gráficos Restaurados
 def vista_dashboard():
     st.subheader("📊 Dashboard Residencias")
+    pd = arranque.importar("pandas")
+    px = arranque.importar("plotly.express")
+    db_queries = arranque.importar("rag.db_queries")
+    dinero = arranque.importar("rag.dinero")
+    supabase_client = init_connection()
     
-    # Cargar datos
-    df_contr = get_contratos(supabase_client)
-    df_fact = get_facturas(supabase_client)
+    # Cargar datos (el dinero de las facturas en céntimos: totales exactos, euros solo al mostrar)
+    df_contr = db_queries.get_contratos(supabase_client)
+    df_fact = db_queries.get_facturas(supabase_client, centimos=True)
 
     # Tabs
     tab1, tab2, tab3 = st.tabs(["📑 Visión General", "🏡 Análisis por Residencia", "📈 Top Conceptos"])
 
-    with tab1:
+    with tab1, span("dashboard.vision_general"):
         st.metric("📄 Facturas Totales", len(df_fact))
         st.metric("📑 Contratos Totales", len(df_contr))
-        df_fact["total"] = pd.to_numeric(df_fact["total"], errors="coerce").fillna(0)
-        st.metric("💰 Total Facturado", f"{df_fact['total'].sum():,.2f} €")
+        st.metric("💰 Total Facturado", f"{dinero.formatear(df_fact['total'].sum(), miles=True)} €")
+
+        # Vigentes mes a mes con el índice de fechas (búsquedas binarias, sin recorrer los contratos)
+        hoy = pd.Timestamp.today().normalize()
+        serie = arranque.importar("rag.intervalos").indice_intervalos(supabase_client).serie_vigentes(
+            hoy - pd.DateOffset(months=36), hoy + pd.DateOffset(months=12))
+        fig = px.line(serie, x="fecha", y="contratos_vigentes", title="📅 Contratos vigentes por mes")
+        st.plotly_chart(fig, use_container_width=True)
         st.dataframe(df_contr)
-        st.dataframe(df_fact)
+        st.dataframe(dinero.euros_frame(df_fact, "facturas"))
 
-    with tab2:
+    with tab2, span("dashboard.por_residencia"):
         centros = df_contr["centro"].dropna().unique().tolist()
         sel = st.selectbox("🏠 Selecciona una Residencia:", ["(Todas)"] + centros)
         
@@ -66,15 +111,16 @@ def vista_dashboard():
             cids = df_contr["id"].unique().tolist()
             df_fact = df_fact[df_fact["contrato_id"].isin(cids)]
 
+        df_fact_euros = dinero.euros_frame(df_fact, "facturas")
         st.dataframe(df_contr)
-        st.dataframe(df_fact)
+        st.dataframe(df_fact_euros)
         suma = df_fact["total"].sum()
-        st.metric(f"💵 Gasto Total en {sel}", f"{suma:,.2f} €")
-        fig = px.bar(df_fact, x="numero_factura", y="total", title="📊 Facturas")
+        st.metric(f"💵 Gasto Total en {sel}", f"{dinero.formatear(suma, miles=True)} €")
+        fig = px.bar(df_fact_euros, x="numero_factura", y="total", title="📊 Facturas")
         st.plotly_chart(fig, use_container_width=True)
 
-    with tab3:
-        df_top = top_conceptos_global(supabase_client)
+    with tab3, span("dashboard.top_conceptos"):
+        df_top = db_queries.top_conceptos_global(supabase_client)
         if df_top.empty:
             st.warning("⚠️ No hay datos.")
         else:
@@ -88,20 +134,39 @@ def vista_chat_archivos():
 
     uploaded_file = st.file_uploader("📤 Sube un archivo PDF o JSON", type=["json", "pdf"])
     file_content = None
+    dataset_json = None
 
     if uploaded_file:
         file_extension = uploaded_file.name.split(".")[-1].lower()
 
         try:
             if file_extension == "pdf":
-                doc = fitz.open(stream=uploaded_file.read(), filetype="pdf")
-                file_content = "\n".join([page.get_text("text") for page in doc])
+                extraccion = get_extractor_pdf().extraer(uploaded_file.getvalue())
+                if not extraccion.terminada:
+                    # Mostramos las páginas según van terminando
+                    barra = st.progress(0.0, text="⏳ Extrayendo texto del PDF...")
+                    vista = st.empty()
+                    for i, (num, texto) in enumerate(extraccion.iterar(), start=1):
+                        barra.progress(i / max(extraccion.num_paginas, 1),
+                                       text=f"⏳ Página {num + 1} extraída ({i}/{extraccion.num_paginas})")
+                        vista.text(texto[:300])
+                    barra.empty()
+                    vista.empty()
+                if extraccion.error:
+                    raise extraccion.error
+                file_content = extraccion.texto()
 
             elif file_extension == "json":
-                file_content = json.load(uploaded_file)
+                dataset_json, file_content = cargar_dataset_json(uploaded_file.getvalue())
 
             st.subheader("🔍 Vista previa del contenido")
-            st.text(file_content[:1000] if isinstance(file_content, str) else json.dumps(file_content, indent=2)[:1000])
+            if dataset_json is not None:
+                cols = st.columns(4)
+                for col, tabla in zip(cols, ["proveedores", "contratos", "facturas", "documentos"]):
+                    col.metric(tabla.capitalize(), len(dataset_json.frame(tabla)))
+                st.dataframe(dataset_json.frame("contratos").head(20))
+            else:
+                st.text(file_content[:1000])
 
         except Exception as e:
             st.error(f"⚠️ Error al procesar el archivo: {str(e)}")
@@ -113,29 +178,80 @@ def vista_chat_archivos():
 
     user_input = st.text_input("✍️ Escribe tu pregunta:")
 
-    if st.button("Enviar") and file_content:
+    if st.button("Enviar") and (file_content or dataset_json is not None):
+        process_user_question = arranque.importar("rag.pipeline").process_user_question
         openai_api_key = st.secrets.get("OPENAI_API_KEY")
-        if not openai_api_key:
+        resp = None
+        if dataset_json is not None:
+            # Mismas consultas de db_queries sobre el JSON en memoria (GPT solo si no se reconoce la intención)
+            with span("vista.chat_archivos", pregunta=user_input[:200]):
+                resp = process_user_question(dataset_json, user_input, openai_api_key)
+        elif not openai_api_key:
             st.error("⚠️ Falta `OPENAI_API_KEY` en `secrets.toml`.")
         else:
             query = f"Con base en el siguiente contenido, responde: {user_input}\n\n{file_content[:4000]}"  # LIMITAMOS A 4000 caracteres
             resp = process_user_question(None, query, openai_api_key)
+
+        if resp is not None:
             resp_formatted = formatear_respuesta(resp)
             st.session_state["chat_history_files"].insert(0, ("Usuario", user_input))
             st.session_state["chat_history_files"].insert(0, ("Chatbot 🤖", resp_formatted))
 
+    for r, m in st.session_state["chat_history_files"]:
+        st.markdown(f"<div style='background-color: #f8f9fa; border-left: 5px solid #dc3545; padding: 10px; border-radius: 10px; margin: 5px 0; font-size: 14px;'><b>{r}</b>: {m}</div>", unsafe_allow_html=True)
+
 # 🎛 Navegación Principal
 def main():
     st.sidebar.title("📌 POC Residencias")
-    menu = ["Dashboard", "Chatbot", "Chat con Archivos"]
+    menu = ["Dashboard", "Chatbot", "Chat con Archivos", "Diagnóstico"]
     sel = st.sidebar.radio("📍 Navegación", menu)
 
+    arranque.marcar(f"primera vista ({sel})")
+
     if sel == "Dashboard":
-        vista_dashboard()
+        with span("vista.dashboard"):
+            vista_dashboard()
     elif sel == "Chatbot":
         vista_chatbot()
     elif sel == "Chat con Archivos":
         vista_chat_archivos()
+    elif sel == "Diagnóstico":
+        vista_diagnostico()
+
+# 🩺 Diagnóstico: trazas recientes y métricas
+def vista_diagnostico():
+    st.header("🩺 Diagnóstico")
+    pd = arranque.importar("pandas")
+    st.caption(f"Se registran en `{trazas.SLOW_LOG_PATH}` las peticiones de más de {trazas.UMBRAL_LENTO_MS:.0f} ms.")
+
+    recientes = trazas.trazas_recientes()
+    st.subheader("⏱️ Peticiones recientes")
+    if not recientes:
+        st.info("Todavía no hay trazas registradas.")
+    else:
+        st.dataframe(pd.DataFrame([{"inicio": t.inicio.strftime("%H:%M:%S"), "petición": t.nombre,
+                                    "ms": round(t.duracion_s * 1000, 1), "error": t.error or ""}
+                                   for t in recientes]))
+        for t in recientes[:20]:
+            with st.expander(f"{t.inicio:%H:%M:%S} · {t.nombre} · {t.duracion_s * 1000:.0f} ms"):
+                st.json(t.to_dict())
+
+    st.subheader("📈 Métricas por span")
+    st.dataframe(pd.DataFrame(trazas.resumen_metricas()))
+    texto = trazas.exportar_prometheus()
+    st.download_button("⬇️ Exportar métricas (Prometheus)", texto, file_name="metrics.prom", mime="text/plain")
+
+    st.subheader("🚀 Arranque en frío")
+    informe = arranque.informe()
+    st.caption("Milisegundos desde que se importó app.py por primera vez en este proceso.")
+    st.dataframe(pd.DataFrame(informe["eventos"]))
+    st.caption("Primera importación de cada dependencia (incluye las que arrastra).")
+    st.dataframe(pd.DataFrame(informe["importaciones"]))
+    if informe["calentamiento"]:
+        st.caption("Pasos del calentamiento en segundo plano.")
+        st.dataframe(pd.DataFrame(informe["calentamiento"]))
+    else:
+        st.info("Calentamiento desactivado (WARMUP en secrets) o todavía en curso.")
 
 # 🤖 Chatbot con RAG
 def vista_chatbot():
@@ -151,8 +267,10 @@ def vista_chatbot():
         if not openai_api_key:
             st.error("⚠️ Falta `OPENAI_API_KEY` en secrets.")
         else:
-            resp = process_user_question(supabase_client, user_input, openai_api_key)
-            resp_formatted = formatear_respuesta(resp)  
+            with span("vista.chatbot", pregunta=user_input[:200]):
+                pipeline = arranque.importar("rag.pipeline")
+                resp = pipeline.process_user_question(init_connection(), user_input, openai_api_key)
+                resp_formatted = formatear_respuesta(resp)
             st.session_state["chat_history"].insert(0, ("Usuario", user_input))
             st.session_state["chat_history"].insert(0, ("Chatbot 🤖", resp_formatted))
 
@@ -0,0 +1,78 @@
+"""
+Compara la ingesta fila a fila (ingest_items) con la carga masiva por COPY (ingest_copy).
+
+Uso (¡vacía las tablas!):
+    DATABASE_URL=postgresql://... python -m benchmarks.bench_ingest residencias_data.json --repeticiones 20 --si-vaciar
+"""
+import os
+import json
+import time
+import argparse
+from dotenv import load_dotenv
+from rag.backends import ClientePostgres
+from ingest_data import ingest_items, ingest_copy
+
+
+def vaciar_tablas(cliente: ClientePostgres):
+    with cliente.conexion() as conn, conn.cursor() as cur:
+        cur.execute("TRUNCATE documentos, facturas, contratos, proveedores RESTART IDENTITY CASCADE")
+
+
+def contar_filas(cliente: ClientePostgres) -> dict:
+    with cliente.conexion() as conn, conn.cursor() as cur:
+        conteo = {}
+        for tabla in ("proveedores", "contratos", "facturas", "documentos"):
+            cur.execute(f"SELECT count(*) FROM {tabla}")
+            conteo[tabla] = cur.fetchone()[0]
+        return conteo
+
+
+def medir(nombre: str, fn) -> dict:
+    inicio = time.perf_counter()
+    fn()
+    segundos = time.perf_counter() - inicio
+    print(f"{nombre:<12} {segundos:10.3f} s")
+    return {"modo": nombre, "segundos": segundos}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("json_file", nargs="?", default="residencias_data.json")
+    parser.add_argument("--repeticiones", type=int, default=1,
+                        help="Multiplica el JSON para tener un volumen significativo")
+    parser.add_argument("--si-vaciar", action="store_true",
+                        help="Confirma que se pueden vaciar las tablas antes de cada modo")
+    parser.add_argument("--salida", help="Fichero JSON con los resultados")
+    args = parser.parse_args()
+
+    if not args.si_vaciar:
+        parser.error("El benchmark vacía proveedores/contratos/facturas/documentos; confirma con --si-vaciar.")
+
+    load_dotenv()
+    cliente = ClientePostgres(os.environ["DATABASE_URL"])
+
+    with open(args.json_file, "r", encoding="utf-8") as f:
+        data = json.load(f) * args.repeticiones
+
+    resultados = []
+    for nombre, fn in [("fila_a_fila", lambda: ingest_items(cliente, data)),
+                       ("copy", lambda: ingest_copy(cliente, data))]:
+        vaciar_tablas(cliente)
+        resultado = medir(nombre, fn)
+        resultado["filas"] = contar_filas(cliente)
+        resultados.append(resultado)
+
+    # Ambos modos deben dejar exactamente los mismos datos
+    if resultados[0]["filas"] != resultados[1]["filas"]:
+        print("⚠️ Los modos no cargaron el mismo número de filas:", resultados)
+
+    base, rapido = resultados[0]["segundos"], resultados[1]["segundos"]
+    print(f"COPY es {base / max(rapido, 1e-9):.1f}x más rápido ({resultados[1]['filas']})")
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
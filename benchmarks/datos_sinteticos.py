@@ -0,0 +1,135 @@
+"""
+Generador reproducible (con semilla) de proveedores/contratos/facturas/documentos
+con el mismo esquema que create_db.py, para medir sin Supabase.
+"""
+import numpy as np
+import pandas as pd
+
+ESCALAS = {
+    "1k": 1_000,
+    "10k": 10_000,
+    "100k": 100_000,
+    "1m": 1_000_000,
+    "5m": 5_000_000,
+}
+
+TIPOS_SERVICIO = ["electricidad", "gas", "agua", "limpieza", "mantenimiento", "catering",
+                  "lavandería", "telecomunicaciones", "seguridad", "jardinería"]
+PALABRAS = ["Iberia", "Norte", "Servicios", "Levante", "Global", "Integral", "Grupo", "Sur",
+            "Energía", "Facility", "Hogar", "Técnicos", "Castilla", "Atlántico", "Mediterráneo"]
+CONCEPTOS = ["consumo mensual", "mantenimiento preventivo", "reparación", "suministro",
+             "servicio de limpieza", "menús", "revisión anual", "cuota fija", "material"]
+
+
+def _fechas(rng, n, desde: str, hasta: str) -> np.ndarray:
+    inicio = np.datetime64(desde, "D")
+    dias = (np.datetime64(hasta, "D") - inicio).astype(int)
+    return inicio + rng.integers(0, dias, n).astype("timedelta64[D]")
+
+
+def _iso(fechas: np.ndarray) -> np.ndarray:
+    return np.datetime_as_string(fechas, unit="D").astype(object)
+
+
+def generar_dataset(n_facturas: int, seed: int = 42) -> dict:
+    """
+    Devuelve {tabla: DataFrame} con ~20 facturas por contrato y ~5 contratos por proveedor.
+    Las fechas van como 'YYYY-MM-DD' y los importes como float, igual que PostgREST.
+    """
+    rng = np.random.default_rng(seed)
+    n_contr = max(1, n_facturas // 20)
+    n_prov = max(1, n_contr // 5)
+    n_centros = min(200, max(1, n_contr // 50))
+
+    prov_ids = np.arange(1, n_prov + 1)
+    palabras = np.array(PALABRAS, dtype=object)
+    nombres = (palabras[rng.integers(0, len(PALABRAS), n_prov)] + " "
+               + palabras[rng.integers(0, len(PALABRAS), n_prov)] + " "
+               + prov_ids.astype(str).astype(object) + " S.L.")
+    proveedores = pd.DataFrame({
+        "id": prov_ids,
+        "cif_proveedor": ["B%08d" % i for i in prov_ids],
+        "nombre_proveedor": nombres,
+        "tipo_servicio": np.array(TIPOS_SERVICIO, dtype=object)[rng.integers(0, len(TIPOS_SERVICIO), n_prov)],
+    })
+
+    fecha_contrato = _fechas(rng, n_contr, "2018-01-01", "2025-01-01")
+    fecha_vencimiento = fecha_contrato + rng.integers(180, 5 * 365, n_contr).astype("timedelta64[D]")
+    contratos = pd.DataFrame({
+        "id": np.arange(1, n_contr + 1),
+        "proveedor_id": rng.integers(1, n_prov + 1, n_contr),
+        "centro": ["Residencia %d" % i for i in rng.integers(1, n_centros + 1, n_contr)],
+        "fecha_contrato": _iso(fecha_contrato),
+        "fecha_vencimiento": _iso(fecha_vencimiento),
+        "importe": np.round(rng.lognormal(9, 1, n_contr), 2),
+    })
+
+    base_general = np.round(rng.lognormal(6, 1.2, n_facturas), 2)
+    base_exenta = np.where(rng.random(n_facturas) < 0.2, np.round(rng.lognormal(4, 1, n_facturas), 2), 0.0)
+    iva_general = np.round(base_general * 0.21, 2)
+    fecha_factura = _fechas(rng, n_facturas, "2020-01-01", "2026-01-01")
+    facturas = pd.DataFrame({
+        "id": np.arange(1, n_facturas + 1),
+        "contrato_id": rng.integers(1, n_contr + 1, n_facturas),
+        "numero_factura": ["F%09d" % i for i in range(1, n_facturas + 1)],
+        "fecha_factura": _iso(fecha_factura),
+        "concepto": np.array(CONCEPTOS, dtype=object)[rng.integers(0, len(CONCEPTOS), n_facturas)],
+        "base_exenta": base_exenta,
+        "base_general": base_general,
+        "iva_general": iva_general,
+        "total": np.round(base_exenta + base_general + iva_general, 2),
+        "inicio_periodo": _iso(fecha_factura - np.timedelta64(30, "D")),
+        "fin_periodo": _iso(fecha_factura),
+    })
+
+    # Un documento por contrato y uno por cada dos facturas
+    fact_docs = facturas["id"].to_numpy()[::2]
+    documentos = pd.DataFrame({
+        "contrato_id": np.concatenate([contratos["id"].to_numpy(), np.full(len(fact_docs), np.nan)]),
+        "factura_id": np.concatenate([np.full(n_contr, np.nan), fact_docs]),
+        "nombre_archivo": (["contrato_%d.pdf" % i for i in contratos["id"]]
+                           + ["factura_%d.pdf" % i for i in fact_docs]),
+    })
+    documentos.insert(0, "id", np.arange(1, len(documentos) + 1))
+
+    return {"proveedores": proveedores, "contratos": contratos, "facturas": facturas, "documentos": documentos}
+
+
+def _dmy(iso):
+    return f"{iso[8:10]}/{iso[5:7]}/{iso[0:4]}" if isinstance(iso, str) else None
+
+
+def a_items_json(frames: dict) -> list:
+    """
+    Convierte el dataset a la forma de residencias_data.json, para medir ingest_data.
+    """
+    prov = frames["proveedores"].set_index("id")
+    facturas_por_contrato = {cid: df for cid, df in frames["facturas"].groupby("contrato_id")}
+    items = []
+    for contrato in frames["contratos"].itertuples(index=False):
+        p = prov.loc[contrato.proveedor_id]
+        df_fact = facturas_por_contrato.get(contrato.id)
+        facturas = [] if df_fact is None else [{
+            "numero": f.numero_factura,
+            "fecha": _dmy(f.fecha_factura),
+            "concepto": f.concepto,
+            "base exenta": f.base_exenta,
+            "base general": f.base_general,
+            "iva general": f.iva_general,
+            "total": f.total,
+            "inicio periodo": _dmy(f.inicio_periodo),
+            "fin periodo": _dmy(f.fin_periodo),
+            "Documentos": [{"fichero": f"factura_{f.id}.pdf"}],
+        } for f in df_fact.itertuples(index=False)]
+        items.append({
+            "cif_proveedor": p["cif_proveedor"],
+            "nombre proveedor": p["nombre_proveedor"],
+            "tipo": p["tipo_servicio"],
+            "centro": contrato.centro,
+            "fecha contrato": _dmy(contrato.fecha_contrato),
+            "fecha vencimiento": _dmy(contrato.fecha_vencimiento),
+            "importe": contrato.importe,
+            "Documentos": [{"fichero": f"contrato_{contrato.id}.pdf"}],
+            "facturas": facturas,
+        })
+    return items
@@ -0,0 +1,76 @@
+"""
+Sustitutos locales de Supabase y OpenAI para los benchmarks.
+"""
+import json
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+from rag.memoria import ClienteMemoria
+
+
+class ClienteFalso(ClienteMemoria):
+    """
+    ClienteMemoria con una latencia fija por execute(), para simular la ida y
+    vuelta HTTP de PostgREST. Como Supabase, devuelve registros (no DataFrames).
+    """
+
+    def __init__(self, frames: dict = None, latencia: float = 0.0):
+        super().__init__(frames)
+        self.latencia = latencia
+        self.llamadas = 0
+
+    def table(self, nombre: str):
+        consulta = super().table(nombre)
+        execute = consulta.execute
+
+        def execute_con_latencia():
+            self.llamadas += 1
+            if self.latencia:
+                time.sleep(self.latencia)
+            return execute()
+
+        consulta.execute = execute_con_latencia
+        return consulta
+
+
+class GPTFalso:
+    """
+    Misma interfaz que GPTFunctionCaller, sin red: tarda `latencia` segundos
+    y responde siempre con la función configurada.
+    """
+
+    latencia = 0.0
+    funcion = "facturas_mas_elevadas"
+    argumentos = {}
+    llamadas = 0
+
+    def __init__(self, api_key: str = None):
+        self.api_key = api_key
+
+    def call_step_1(self, user_message: str):
+        type(self).llamadas += 1
+        time.sleep(self.latencia)
+        fn_call = SimpleNamespace(name=self.funcion, arguments=json.dumps(self.argumentos))
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(function_call=fn_call))])
+
+    def call_step_2(self, function_name: str, function_result: str) -> str:
+        type(self).llamadas += 1
+        time.sleep(self.latencia)
+        return function_result
+
+
+@contextmanager
+def gpt_falso(latencia: float = 0.0, funcion: str = "facturas_mas_elevadas", argumentos: dict = None):
+    """
+    Sustituye GPTFunctionCaller por GPTFalso en rag.parser y rag.pipeline.
+    """
+    from rag import parser, pipeline
+
+    clase = type("GPTFalsoConfigurado", (GPTFalso,), {
+        "latencia": latencia, "funcion": funcion, "argumentos": argumentos or {}, "llamadas": 0})
+    originales = parser.GPTFunctionCaller, pipeline.GPTFunctionCaller
+    parser.GPTFunctionCaller = pipeline.GPTFunctionCaller = clase
+    try:
+        yield clase
+    finally:
+        parser.GPTFunctionCaller, pipeline.GPTFunctionCaller = originales
@@ -0,0 +1,203 @@
+"""
+Benchmarks offline de db_queries, pipeline, ingest_data y del dashboard,
+con datos sintéticos y sin credenciales de Supabase ni OpenAI.
+
+Uso:
+    python -m benchmarks.run --escala 10k --salida bench_resultados.json
+    python -m benchmarks.run --escala 10k --comparar bench_resultados.json
+    python -m benchmarks.run --escala 100k --motor duckdb
+"""
+import sys
+import json
+import time
+import platform
+import argparse
+import statistics
+from datetime import datetime
+import pandas as pd
+from rag import db_queries
+from rag.dinero import euros_frame, formatear
+from rag.intervalos import indice_intervalos
+from rag.pipeline import process_user_question
+from rag.motor_sql import MotorSQL, MOTORES
+from ingest_data import ingest_items
+from .datos_sinteticos import ESCALAS, generar_dataset, a_items_json
+from .fakes import ClienteFalso, gpt_falso
+
+# Argumentos de cada función de db_queries (los nombres existen en los datos sintéticos)
+CONSULTAS = {
+    "get_contratos": {},
+    "get_facturas": {},
+    "get_proveedores": {},
+    "facturas_importe_mayor": {"importe": 500.0},
+    "proveedor_mas_contratos": {},
+    "factura_mas_reciente": {},
+    "gasto_en_rango_fechas": {"fecha_inicio": "01/01/2023", "fecha_fin": "31/12/2023"},
+    "contratos_vencen_antes_de": {"fecha_limite": "01/01/2024"},
+    "gasto_proveedor_en_year": {"proveedor": "norte castilla 1", "year": 2023},
+    "facturas_mas_elevadas": {"top_n": 5},
+    "ranking_proveedores_por_importe": {"limit": 5, "year": 2023},
+    "top_conceptos_global": {},
+    "get_gastos_por_residencia": {"residencia": "Residencia 1"},
+    "get_mantenimientos_pendientes": {},
+    "get_proveedores_con_contratos_vigentes": {},
+    "get_facturas_por_proveedor": {"proveedor": "Norte Castilla 1 S.L.", "year": 2023},
+    "get_contratos_vencen_proximos_meses": {},
+    "get_top_centros_mayores_gastos": {"year": 2023},
+    "contrato_mas_costoso": {},
+    "facturas_de_proveedor": {"proveedor": "Norte Castilla 1 S.L.", "year": 2023},
+    "top_contratos_mas_costosos": {},
+}
+
+# Funciones sin escenario: fallarían en cada ejecución y no medirían nada
+SIN_ESCENARIO = {
+    "get_facturas_pendientes": "facturas no tiene columna 'estado' (migrations/0001_esquema_inicial.sql)",
+    "get_gastos_por_mes_categoria": "facturas no tiene columna 'categoria'",
+    "gasto_por_tipo_servicio": "busca tipo_servicio en contratos y está en proveedores",
+    "ranking_tipos_servicios": "busca tipo_servicio en contratos y está en proveedores",
+}
+
+PREGUNTAS = {
+    "pipeline_regex": "¿Cuáles son las facturas más costosas?",
+    "pipeline_gpt": "Dime algo interesante de los datos",
+}
+
+
+def medir(fn, repeticiones: int) -> dict:
+    """
+    Ejecuta fn `repeticiones` veces. Si falla, se registra el error y no se repite.
+    """
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            return {"error": f"{type(e).__name__}: {e}"}
+        tiempos.append(time.perf_counter() - inicio)
+    return {"min_s": min(tiempos), "mediana_s": statistics.median(tiempos), "repeticiones": repeticiones}
+
+
+def escenario_dashboard(cliente):
+    """
+    Trabajo de datos de vista_dashboard (app.py) sin Streamlit: mismas lecturas,
+    dinero en céntimos y los mismos pasos a euros para tablas y gráficos.
+    """
+    df_contr = db_queries.get_contratos(cliente)
+    df_fact = db_queries.get_facturas(cliente, centimos=True)
+
+    # Visión general
+    formatear(df_fact["total"].sum(), miles=True)
+    hoy = pd.Timestamp.today().normalize()
+    indice_intervalos(cliente).serie_vigentes(hoy - pd.DateOffset(months=36), hoy + pd.DateOffset(months=12))
+    euros_frame(df_fact, "facturas")
+
+    # Por residencia (la primera del selector)
+    centros = df_contr["centro"].dropna().unique().tolist()
+    if centros:
+        cids = df_contr[df_contr["centro"] == centros[0]]["id"].unique().tolist()
+        df_fact = df_fact[df_fact["contrato_id"].isin(cids)]
+        euros_frame(df_fact, "facturas")
+        formatear(df_fact["total"].sum(), miles=True)
+
+    db_queries.top_conceptos_global(cliente).head(10)
+
+
+def ejecutar(escala: str, repeticiones: int, latencia_db: float, latencia_gpt: float,
+             max_ingest: int, seed: int, motor: str = None) -> dict:
+    n_facturas = ESCALAS[escala]
+    inicio = time.perf_counter()
+    frames = generar_dataset(n_facturas, seed=seed)
+    print(f"Dataset {escala}: {n_facturas} facturas generadas en {time.perf_counter() - inicio:.2f} s", file=sys.stderr)
+
+    cliente = ClienteFalso(frames, latencia=latencia_db)
+    if motor:
+        cliente = MotorSQL(cliente, motor)
+    resultados = {}
+
+    def registrar(nombre, fn, reps=repeticiones):
+        resultados[nombre] = medir(fn, reps)
+        r = resultados[nombre]
+        print(f"{nombre:<45} " + (f"{r['mediana_s'] * 1000:10.1f} ms" if "error" not in r else f"ERROR {r['error']}"),
+              file=sys.stderr)
+
+    for nombre, kwargs in CONSULTAS.items():
+        fn = getattr(db_queries, nombre)
+        registrar(f"consulta.{nombre}", lambda fn=fn, kwargs=kwargs: fn(cliente, **kwargs))
+    for nombre, motivo in SIN_ESCENARIO.items():
+        print(f"{'consulta.' + nombre:<45} sin escenario: {motivo}", file=sys.stderr)
+
+    with gpt_falso(latencia=latencia_gpt):
+        for nombre, pregunta in PREGUNTAS.items():
+            registrar(nombre, lambda pregunta=pregunta: process_user_question(cliente, pregunta, "sk-falsa"))
+
+    registrar("dashboard", lambda: escenario_dashboard(cliente))
+
+    # Ingesta fila a fila sobre un cliente vacío (limitada: es O(filas) llamadas)
+    frames_ingest = generar_dataset(min(n_facturas, max_ingest), seed=seed)
+    items = a_items_json(frames_ingest)
+    registrar("ingest_items", lambda: ingest_items(ClienteFalso(latencia=latencia_db), items), reps=1)
+
+    return {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "escala": escala,
+        "n_facturas": n_facturas,
+        "seed": seed,
+        "latencia_db_s": latencia_db,
+        "latencia_gpt_s": latencia_gpt,
+        "motor": motor,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "resultados": resultados,
+        "sin_escenario": SIN_ESCENARIO,
+    }
+
+
+def comparar(actual: dict, base: dict, umbral: float) -> bool:
+    """
+    Imprime la variación de cada escenario frente a una ejecución anterior.
+    Devuelve False si alguno empeora más que `umbral` (0.2 = 20 %).
+    """
+    ok = True
+    for nombre, r in actual["resultados"].items():
+        b = base.get("resultados", {}).get(nombre)
+        if not b or "error" in b or "error" in r:
+            continue
+        ratio = r["mediana_s"] / max(b["mediana_s"], 1e-9)
+        marca = "⚠️" if ratio > 1 + umbral else "  "
+        if ratio > 1 + umbral:
+            ok = False
+        print(f"{marca} {nombre:<45} {b['mediana_s'] * 1000:10.1f} -> {r['mediana_s'] * 1000:10.1f} ms ({ratio:.2f}x)")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escala", choices=list(ESCALAS), default="10k")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--latencia-db", type=float, default=0.0, help="Segundos por llamada a execute()")
+    parser.add_argument("--latencia-gpt", type=float, default=0.0, help="Segundos por llamada a GPT")
+    parser.add_argument("--max-ingest", type=int, default=10_000, help="Facturas máximas en el escenario de ingesta")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--motor", choices=MOTORES, help="Resuelve las consultas con MotorSQL en vez de pandas")
+    parser.add_argument("--salida", help="Guarda los resultados en este JSON")
+    parser.add_argument("--comparar", help="JSON de una ejecución anterior con la que comparar")
+    parser.add_argument("--umbral", type=float, default=0.2, help="Empeoramiento tolerado al comparar")
+    args = parser.parse_args()
+
+    resultado = ejecutar(args.escala, args.repeticiones, args.latencia_db, args.latencia_gpt,
+                         args.max_ingest, args.seed, args.motor)
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            base = json.load(f)
+        if not comparar(resultado, base, args.umbral):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+import pytest
+from rag import trazas
+
+
+@pytest.fixture(autouse=True, scope="session")
+def _log_lentas_temporal(tmp_path_factory):
+    # Las peticiones lentas de los tests no deben acabar en logs/peticiones_lentas.log
+    ruta_anterior = trazas.SLOW_LOG_PATH
+    trazas.configurar(ruta_log=str(tmp_path_factory.mktemp("logs") / "peticiones_lentas.log"))
+    yield
+    trazas.configurar(ruta_log=ruta_anterior)
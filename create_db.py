@@ -1,70 +1,150 @@
 # create_schema.py
 import os
+import sys
+import glob
+import json
+import argparse
 from dotenv import load_dotenv
-from supabase import create_client
+from rag.backends import crear_cliente, ClientePostgres
 
-def create_tables():
-    load_dotenv()
-    url = os.getenv("SUPABASE_URL")
-    key = os.getenv("SUPABASE_KEY")
-    supabase = create_client(url, key)
-
-    # Definir las sentencias SQL de creación
-    # (Cada CREATE TABLE IF NOT EXISTS en SQL “clásico”)
-    sql_statements = [
-        """
-        CREATE TABLE IF NOT EXISTS proveedores (
-            id SERIAL PRIMARY KEY,
-            cif_proveedor VARCHAR(50),
-            nombre_proveedor VARCHAR(255),
-            tipo_servicio VARCHAR(255),
-            created_at TIMESTAMP DEFAULT NOW()
-        );
-        """,
-        """
-        CREATE TABLE IF NOT EXISTS contratos (
-            id SERIAL PRIMARY KEY,
-            proveedor_id INT REFERENCES proveedores (id) ON DELETE CASCADE,
-            centro VARCHAR(255),
-            fecha_contrato DATE,
-            fecha_vencimiento DATE,
-            importe NUMERIC(12,2),
-            created_at TIMESTAMP DEFAULT NOW()
-        );
-        """,
-        """
-        CREATE TABLE IF NOT EXISTS facturas (
-            id SERIAL PRIMARY KEY,
-            contrato_id INT REFERENCES contratos (id) ON DELETE CASCADE,
-            numero_factura VARCHAR(100),
-            fecha_factura DATE,
-            concepto VARCHAR(255),
-            base_exenta NUMERIC(12,2),
-            base_general NUMERIC(12,2),
-            iva_general NUMERIC(12,2),
-            total NUMERIC(12,2),
-            inicio_periodo DATE,
-            fin_periodo DATE,
-            created_at TIMESTAMP DEFAULT NOW()
-        );
-        """,
-        """
-        CREATE TABLE IF NOT EXISTS documentos (
-            id SERIAL PRIMARY KEY,
-            contrato_id INT REFERENCES contratos (id) ON DELETE CASCADE,
-            factura_id INT REFERENCES facturas (id) ON DELETE CASCADE,
-            nombre_archivo VARCHAR(255),
-            created_at TIMESTAMP DEFAULT NOW()
+MIGRACIONES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+# Consultas calientes y el índice que deberían usar (ver migrations/0002_indices_consultas.sql)
+CONSULTAS_CALIENTES = [
+    ("get_or_create_proveedor",
+     "SELECT * FROM proveedores WHERE cif_proveedor = 'X' AND nombre_proveedor = 'Y'",
+     "uq_proveedores_cif_nombre"),
+    ("contratos por proveedor",
+     "SELECT id FROM contratos WHERE proveedor_id = 1",
+     "idx_contratos_proveedor_id"),
+    ("get_gastos_por_residencia",
+     "SELECT id FROM contratos WHERE centro = 'Residencia 1'",
+     "idx_contratos_centro"),
+    ("contratos_vencen_antes_de",
+     "SELECT id FROM contratos WHERE fecha_vencimiento < '2025-01-01'",
+     "idx_contratos_fecha_vencimiento"),
+    ("facturas de un contrato en un año",
+     "SELECT total FROM facturas WHERE contrato_id = 1 AND fecha_factura >= '2024-01-01' AND fecha_factura < '2025-01-01'",
+     "idx_facturas_contrato_fecha"),
+    ("gasto_en_rango_fechas",
+     "SELECT total FROM facturas WHERE fecha_factura >= '2024-01-01' AND fecha_factura <= '2024-12-31'",
+     "idx_facturas_fecha_factura"),
+]
+
+
+def listar_migraciones() -> list:
+    """
+    Migraciones versionadas: migrations/NNNN_nombre.sql, en orden de versión.
+    """
+    migraciones = []
+    for ruta in sorted(glob.glob(os.path.join(MIGRACIONES_DIR, "*.sql"))):
+        nombre = os.path.splitext(os.path.basename(ruta))[0]
+        version = int(nombre.split("_", 1)[0])
+        with open(ruta, "r", encoding="utf-8") as f:
+            migraciones.append((version, nombre, f.read()))
+    return migraciones
+
+
+def aplicar_migraciones_postgres(cliente: ClientePostgres) -> list:
+    """
+    Aplica las migraciones pendientes, cada una en su propia transacción,
+    y las registra en schema_migrations.
+    """
+    with cliente.conexion() as conn, conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INT PRIMARY KEY,
+                nombre VARCHAR(255),
+                aplicada_en TIMESTAMP DEFAULT NOW()
+            )
+        """)
+        cur.execute("SELECT version FROM schema_migrations")
+        aplicadas = {row[0] for row in cur.fetchall()}
+
+    nuevas = []
+    for version, nombre, sql in listar_migraciones():
+        if version in aplicadas:
+            continue
+        with cliente.conexion() as conn, conn.cursor() as cur:
+            cur.execute(sql)
+            cur.execute("INSERT INTO schema_migrations (version, nombre) VALUES (%s, %s)", (version, nombre))
+        nuevas.append(nombre)
+    return nuevas
+
+
+def aplicar_migraciones_rpc(supabase) -> list:
+    """
+    Igual que aplicar_migraciones_postgres, pero a través de la RPC 'execute_sql'.
+    Nota: 'rpc("execute_sql")' es sólo un ejemplo. Si no tienes una función
+    "execute_sql" en tu supabase, usa DATABASE_URL (conexión directa) o la interfaz web.
+    """
+    supabase.rpc("execute_sql", {"sql": """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            nombre VARCHAR(255),
+            aplicada_en TIMESTAMP DEFAULT NOW()
         );
-        """
-    ]
+    """}).execute()
+    resp = supabase.table("schema_migrations").select("version").execute()
+    aplicadas = {row["version"] for row in resp.data or []}
+
+    nuevas = []
+    for version, nombre, sql in listar_migraciones():
+        if version in aplicadas:
+            continue
+        supabase.rpc("execute_sql", {"sql": sql}).execute()
+        supabase.table("schema_migrations").insert({"version": version, "nombre": nombre}).execute()
+        nuevas.append(nombre)
+    return nuevas
+
+
+def _indices_del_plan(nodo: dict) -> set:
+    indices = {nodo["Index Name"]} if "Index Name" in nodo else set()
+    for hijo in nodo.get("Plans", []):
+        indices |= _indices_del_plan(hijo)
+    return indices
+
 
-    for sql in sql_statements:
-        response = supabase.rpc("execute_sql", {"sql": sql}).execute()
-        # Nota: 'rpc("execute_sql")' es sólo un ejemplo. Si no tienes 
-        # una función "execute_sql" en tu supabase, tendrías que usar 
-        # la conexión "raw SQL" de otra forma o la interfaz web.
+def comprobar_indices(cliente: ClientePostgres) -> bool:
+    """
+    Ejecuta EXPLAIN sobre las consultas calientes y comprueba que usan su índice.
+    Se desactiva el seq scan para que el resultado no dependa del tamaño de las tablas.
+    """
+    ok = True
+    with cliente.conexion() as conn, conn.cursor() as cur:
+        cur.execute("SET LOCAL enable_seqscan = off")
+        for nombre, sql, indice in CONSULTAS_CALIENTES:
+            cur.execute("EXPLAIN (FORMAT JSON) " + sql)
+            plan = cur.fetchone()[0]
+            plan = json.loads(plan) if isinstance(plan, str) else plan
+            usados = _indices_del_plan(plan[0]["Plan"])
+            if indice in usados:
+                print(f"✅ {nombre}: usa {indice}")
+            else:
+                ok = False
+                print(f"❌ {nombre}: no usa {indice} (usa: {', '.join(sorted(usados)) or 'ninguno'})")
+    return ok
+
+
+def create_tables():
+    parser = argparse.ArgumentParser(description="Migraciones del esquema")
+    parser.add_argument("--check", action="store_true",
+                        help="Comprueba con EXPLAIN que las consultas calientes usan los índices")
+    args = parser.parse_args()
+
+    load_dotenv()
+    if os.getenv("DATABASE_URL"):
+        cliente = crear_cliente({**os.environ, "DATA_BACKEND": "postgres"})
+        if args.check:
+            sys.exit(0 if comprobar_indices(cliente) else 1)
+        nuevas = aplicar_migraciones_postgres(cliente)
+    else:
+        if args.check:
+            sys.exit("--check necesita conexión directa (DATABASE_URL).")
+        nuevas = aplicar_migraciones_rpc(crear_cliente({**os.environ, "DATA_BACKEND": "supabase"}))
 
+    if nuevas:
+        print("Migraciones aplicadas:", ", ".join(nuevas))
     print("Tablas creadas (o existentes) correctamente.")
 
 if __name__ == "__main__":
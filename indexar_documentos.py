@@ -0,0 +1,50 @@
+"""
+Indexa el texto de los documentos de contratos y facturas (tabla 'documentos') para
+buscarlos desde el chatbot ("busca en los documentos cláusula de penalización").
+
+Uso:
+    python indexar_documentos.py --docs-dir /ruta/a/los/pdf
+    python indexar_documentos.py --docs-dir documentos/ --buscar "revisión del IPC"
+
+Los ficheros se buscan por nombre_archivo en --docs-dir (o DOCS_DIR) y sus subcarpetas.
+Volver a indexar solo extrae los ficheros nuevos o modificados.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from dotenv import load_dotenv
+from rag.backends import crear_cliente
+from rag.indice_documentos import construir_indice, cargar_indice, INDICE_DIR
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs-dir", default=os.getenv("DOCS_DIR"), help="Carpeta con los PDF (por defecto DOCS_DIR)")
+    parser.add_argument("--destino", default=INDICE_DIR, help="Carpeta del índice (por defecto DOCS_INDEX_DIR)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="Procesos para extraer el texto")
+    parser.add_argument("--buscar", help="Tras indexar, prueba una búsqueda y muestra los resultados")
+    args = parser.parse_args()
+
+    load_dotenv()
+    if not args.docs_dir:
+        sys.exit("Indica la carpeta de los documentos con --docs-dir o DOCS_DIR.")
+
+    inicio = time.perf_counter()
+    resumen = construir_indice(crear_cliente(os.environ), args.docs_dir, args.destino, max_workers=args.workers)
+    print(f"Índice {resumen['version']}: {resumen['documentos']} documentos "
+          f"({resumen['ficheros_extraidos']} ficheros extraídos, {resumen['ficheros_reutilizados']} reutilizados, "
+          f"{resumen['sin_fichero']} sin fichero) en {time.perf_counter() - inicio:.1f} s", file=sys.stderr)
+    for ruta, error in resumen["errores"].items():
+        print(f"⚠️ {ruta}: {error}", file=sys.stderr)
+
+    if args.buscar:
+        inicio = time.perf_counter()
+        resultados = cargar_indice(args.destino).buscar(args.buscar)
+        print(json.dumps(resultados, indent=2, ensure_ascii=False, default=str))
+        print(f"Búsqueda en {(time.perf_counter() - inicio) * 1000:.1f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,16 @@
 # ingest_data.py
 
 import os
+import csv
 import json
-from datetime import datetime
+import argparse
+import tempfile
 from dotenv import load_dotenv
-from supabase import create_client, Client
-
-def parse_date(date_str):
-    """
-    Convierte cadenas en formato DD/MM/YYYY a YYYY-MM-DD.
-    Retorna None si la cadena está vacía o es inválida.
-    """
-    if not date_str:
-        return None
-
-    try:
-        # Asume que el string está en DD/MM/YYYY
-        dt = datetime.strptime(date_str, "%d/%m/%Y")
-        # Devuelve en formato ISO (YYYY-MM-DD) válido para Postgres
-        return dt.strftime("%Y-%m-%d")
-    except ValueError:
-        return None
+from supabase import Client
+from rag.backends import crear_cliente, cliente_base, ClientePostgres, NULL_COPY
+from rag.snapshot import exportar_snapshot
+from rag.indice_documentos import construir_indice, INDICE_DIR
+from rag.mapeo import proveedor_row, contrato_row_from_item, factura_row, documento_rows
 
 
 def get_or_create_proveedor(supabase: Client, cif_proveedor, nombre_proveedor, tipo_servicio):
@@ -45,23 +35,11 @@ def get_or_create_proveedor(supabase: Client, cif_proveedor, nombre_proveedor, t
     return insert_resp.data[0]
 
 
-def create_contrato(supabase: Client, proveedor_id, centro, fecha_contrato, fecha_vencimiento, importe):
+def create_contrato(supabase: Client, proveedor_id, item):
     """
-    Inserta un contrato en la tabla 'contratos', vinculado al proveedor.
+    Inserta en la tabla 'contratos' el contrato de un elemento del JSON, vinculado al proveedor.
     """
-    parsed_fecha_contrato = parse_date(fecha_contrato)
-    parsed_fecha_vencimiento = parse_date(fecha_vencimiento)
-
-    if not importe:
-        importe = 0
-
-    insert_resp = supabase.table("contratos").insert({
-        "proveedor_id": proveedor_id,
-        "centro": centro if centro else "",
-        "fecha_contrato": parsed_fecha_contrato,
-        "fecha_vencimiento": parsed_fecha_vencimiento,
-        "importe": float(importe)
-    }).execute()
+    insert_resp = supabase.table("contratos").insert(contrato_row_from_item(proveedor_id, item)).execute()
 
     return insert_resp.data[0]
 
@@ -70,34 +48,7 @@ def create_factura(supabase: Client, contrato_id, factura_item):
     """
     Inserta una factura en la tabla 'facturas', asociada a un contrato dado.
     """
-    numero_factura = factura_item.get("numero", "")
-    fecha_factura_raw = factura_item.get("fecha", None)
-    parsed_fecha_factura = parse_date(fecha_factura_raw)
-
-    concepto = factura_item.get("concepto", "")
-    base_exenta = factura_item.get("base exenta", 0)
-    base_general = factura_item.get("base general", 0)
-    iva_general = factura_item.get("iva general", 0)
-    total = factura_item.get("total", 0)
-
-    inicio_periodo_raw = factura_item.get("inicio periodo", None)
-    parsed_inicio_periodo = parse_date(inicio_periodo_raw)
-
-    fin_periodo_raw = factura_item.get("fin periodo", None)
-    parsed_fin_periodo = parse_date(fin_periodo_raw)
-
-    insert_resp = supabase.table("facturas").insert({
-        "contrato_id": contrato_id,
-        "numero_factura": numero_factura,
-        "fecha_factura": parsed_fecha_factura,
-        "concepto": concepto,
-        "base_exenta": float(base_exenta),
-        "base_general": float(base_general),
-        "iva_general": float(iva_general),
-        "total": float(total),
-        "inicio_periodo": parsed_inicio_periodo,
-        "fin_periodo": parsed_fin_periodo
-    }).execute()
+    insert_resp = supabase.table("facturas").insert(factura_row(contrato_id, factura_item)).execute()
 
     return insert_resp.data[0]
 
@@ -106,60 +57,31 @@ def create_documentos_from_list(supabase: Client, documentos_list, contrato_id=N
     """
     Inserta en la tabla 'documentos' cada fichero asociado a un contrato o factura.
     """
-    if not documentos_list:
-        return
-
-    for doc in documentos_list:
-        nombre_archivo = doc.get("fichero", "")
-        if not nombre_archivo:
-            continue
-
-        supabase.table("documentos").insert({
-            "contrato_id": contrato_id,
-            "factura_id": factura_id,
-            "nombre_archivo": nombre_archivo
-        }).execute()
+    for row in documento_rows(documentos_list, contrato_id=contrato_id, factura_id=factura_id):
+        supabase.table("documentos").insert(row).execute()
 
 
-def main():
-    load_dotenv()
-
-    # 1) Conexión a Supabase
-    url = os.getenv("SUPABASE_URL")
-    key = os.getenv("SUPABASE_KEY")
-    if not url or not key:
-        raise ValueError("Faltan SUPABASE_URL o SUPABASE_KEY en el entorno (.env).")
-
-    supabase: Client = create_client(url, key)
-
-    # 2) Abrir el JSON (ajusta el nombre si difiere)
-    json_file = "residencias_data.json"
-    with open(json_file, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    # 3) Recorrer cada objeto del array
+def ingest_items(supabase: Client, data):
+    """
+    Recorre los elementos de residencias_data.json e inserta proveedores,
+    contratos, facturas y documentos.
+    """
     for item in data:
-        cif_proveedor = item.get("cif_proveedor", "")
-        nombre_proveedor = item.get("nombre proveedor", "")
-        tipo_servicio = item.get("tipo", "")
-        centro = item.get("centro", "")
-        fecha_contrato = item.get("fecha contrato", None)
-        fecha_vencimiento = item.get("fecha vencimiento", None)
-        importe = item.get("importe", 0)
-
-        # 3.1) Crear / Obtener Proveedor
-        proveedor = get_or_create_proveedor(supabase, cif_proveedor, nombre_proveedor, tipo_servicio)
+        prov = proveedor_row(item)
+
+        # 1) Crear / Obtener Proveedor
+        proveedor = get_or_create_proveedor(supabase, prov["cif_proveedor"], prov["nombre_proveedor"], prov["tipo_servicio"])
         proveedor_id = proveedor["id"]
 
-        # 3.2) Crear Contrato
-        contrato = create_contrato(supabase, proveedor_id, centro, fecha_contrato, fecha_vencimiento, importe)
+        # 2) Crear Contrato
+        contrato = create_contrato(supabase, proveedor_id, item)
         contrato_id = contrato["id"]
 
-        # 3.3) Documentos asociados al contrato
+        # 3) Documentos asociados al contrato
         documentos_contrato = item.get("Documentos", [])
         create_documentos_from_list(supabase, documentos_contrato, contrato_id=contrato_id)
 
-        # 3.4) Facturas
+        # 4) Facturas
         facturas_list = item.get("facturas", [])
         for factura_item in facturas_list:
             factura = create_factura(supabase, contrato_id, factura_item)
@@ -169,7 +91,129 @@ def main():
             documentos_factura = factura_item.get("Documentos", [])
             create_documentos_from_list(supabase, documentos_factura, factura_id=factura_id)
 
-    print("Proceso de ingestión completado. ¡Las fechas se han convertido correctamente!")
+
+# 📌 Carga masiva con COPY (primera carga / recuperación ante desastres)
+COLUMNAS_COPY = {
+    "proveedores": ["id", "cif_proveedor", "nombre_proveedor", "tipo_servicio"],
+    "contratos": ["id", "proveedor_id", "centro", "fecha_contrato", "fecha_vencimiento", "importe"],
+    "facturas": ["id", "contrato_id", "numero_factura", "fecha_factura", "concepto", "base_exenta",
+                 "base_general", "iva_general", "total", "inicio_periodo", "fin_periodo"],
+    "documentos": ["id", "contrato_id", "factura_id", "nombre_archivo"],
+}
+
+
+def escribir_streams_copy(data, ficheros: dict, ids_iniciales: dict = None, proveedores_existentes: dict = None) -> dict:
+    """
+    Transforma residencias_data.json en un CSV por tabla (formato de COPY) en una sola pasada.
+    Los ids se asignan aquí, a partir de `ids_iniciales`, para que las claves ajenas
+    queden resueltas sin consultar a la base de datos.
+    `proveedores_existentes` mapea (cif, nombre) -> id para no duplicar proveedores.
+    Devuelve el número de filas escritas por tabla.
+    """
+    siguiente = {t: 1 for t in COLUMNAS_COPY}
+    siguiente.update(ids_iniciales or {})
+    ids_proveedor = dict(proveedores_existentes or {})
+    writers = {t: csv.writer(ficheros[t]) for t in COLUMNAS_COPY}
+    filas = {t: 0 for t in COLUMNAS_COPY}
+
+    def escribir(tabla, row):
+        row_id = siguiente[tabla]
+        siguiente[tabla] += 1
+        row = {"id": row_id, **row}
+        writers[tabla].writerow([NULL_COPY if row[c] is None else row[c] for c in COLUMNAS_COPY[tabla]])
+        filas[tabla] += 1
+        return row_id
+
+    for item in data:
+        prov = proveedor_row(item)
+        clave = (prov["cif_proveedor"], prov["nombre_proveedor"])
+        if clave not in ids_proveedor:
+            ids_proveedor[clave] = escribir("proveedores", prov)
+
+        contrato_id = escribir("contratos", contrato_row_from_item(ids_proveedor[clave], item))
+        for row in documento_rows(item.get("Documentos", []), contrato_id=contrato_id):
+            escribir("documentos", row)
+
+        for factura_item in item.get("facturas", []):
+            factura_id = escribir("facturas", factura_row(contrato_id, factura_item))
+            for row in documento_rows(factura_item.get("Documentos", []), factura_id=factura_id):
+                escribir("documentos", row)
+
+    return filas
+
+
+def ingest_copy(cliente: ClientePostgres, data) -> dict:
+    """
+    Carga todo el JSON con COPY FROM STDIN dentro de una única transacción
+    y reajusta las secuencias SERIAL al final.
+    """
+    ficheros = {t: tempfile.SpooledTemporaryFile(max_size=64 * 1024 * 1024, mode="w+", newline="")
+                for t in COLUMNAS_COPY}
+    try:
+        with cliente.conexion() as conn, conn.cursor() as cur:
+            # Nadie más inserta mientras asignamos ids
+            cur.execute("LOCK TABLE proveedores, contratos, facturas, documentos IN EXCLUSIVE MODE")
+            ids_iniciales = {}
+            for tabla in COLUMNAS_COPY:
+                cur.execute(f"SELECT coalesce(max(id), 0) + 1 FROM {tabla}")
+                ids_iniciales[tabla] = cur.fetchone()[0]
+            cur.execute("SELECT cif_proveedor, nombre_proveedor, id FROM proveedores")
+            existentes = {(cif, nombre): pid for cif, nombre, pid in cur.fetchall()}
+
+            filas = escribir_streams_copy(data, ficheros, ids_iniciales, existentes)
+
+            # Orden de las claves ajenas: proveedores -> contratos -> facturas -> documentos
+            for tabla, columnas in COLUMNAS_COPY.items():
+                ficheros[tabla].seek(0)
+                cliente.copy_from(tabla, columnas, ficheros[tabla], conn=conn)
+
+            for tabla in COLUMNAS_COPY:
+                cur.execute(
+                    f"SELECT setval(pg_get_serial_sequence('{tabla}', 'id'), "
+                    f"coalesce(max(id), 1), max(id) IS NOT NULL) FROM {tabla}")
+        return filas
+    finally:
+        for f in ficheros.values():
+            f.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingesta de residencias_data.json")
+    parser.add_argument("json_file", nargs="?", default="residencias_data.json")
+    parser.add_argument("--copy", action="store_true",
+                        help="Carga masiva con COPY (requiere DATA_BACKEND=postgres y DATABASE_URL)")
+    args = parser.parse_args()
+
+    load_dotenv()
+
+    # 1) Conexión a Supabase (o a Postgres directo con DATA_BACKEND=postgres).
+    #    La ingesta escribe en la base de datos: con SQL_ENGINE se usa el cliente sin MotorSQL
+    supabase: Client = cliente_base(crear_cliente(os.environ))
+
+    # 2) Abrir el JSON (ajusta el nombre si difiere)
+    with open(args.json_file, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    if args.copy:
+        if not isinstance(supabase, ClientePostgres):
+            raise ValueError("--copy requiere DATA_BACKEND=postgres y DATABASE_URL.")
+        filas = ingest_copy(supabase, data)
+        print("Carga con COPY completada:", ", ".join(f"{t}={n}" for t, n in filas.items()))
+    else:
+        # 3) Recorrer cada objeto del array
+        ingest_items(supabase, data)
+        print("Proceso de ingestión completado. ¡Las fechas se han convertido correctamente!")
+
+    # 4) Snapshot local para las lecturas (DATA_BACKEND=snapshot)
+    if os.getenv("SNAPSHOT_DIR"):
+        version = exportar_snapshot(supabase, os.getenv("SNAPSHOT_DIR"))
+        print(f"Snapshot {version} exportada en {os.getenv('SNAPSHOT_DIR')}.")
+
+    # 5) Índice de texto de los documentos (búsqueda desde el chatbot)
+    if os.getenv("DOCS_DIR"):
+        resumen = construir_indice(supabase, os.getenv("DOCS_DIR"), INDICE_DIR)
+        print(f"Índice de documentos {resumen['version']}: {resumen['documentos']} documentos "
+              f"({resumen['ficheros_extraidos']} extraídos, {len(resumen['errores'])} con error).")
 
 
 if __name__ == "__main__":
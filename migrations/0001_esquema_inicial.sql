@@ -0,0 +1,41 @@
+-- Esquema inicial: proveedores, contratos, facturas y documentos
+CREATE TABLE IF NOT EXISTS proveedores (
+    id SERIAL PRIMARY KEY,
+    cif_proveedor VARCHAR(50),
+    nombre_proveedor VARCHAR(255),
+    tipo_servicio VARCHAR(255),
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS contratos (
+    id SERIAL PRIMARY KEY,
+    proveedor_id INT REFERENCES proveedores (id) ON DELETE CASCADE,
+    centro VARCHAR(255),
+    fecha_contrato DATE,
+    fecha_vencimiento DATE,
+    importe NUMERIC(12,2),
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS facturas (
+    id SERIAL PRIMARY KEY,
+    contrato_id INT REFERENCES contratos (id) ON DELETE CASCADE,
+    numero_factura VARCHAR(100),
+    fecha_factura DATE,
+    concepto VARCHAR(255),
+    base_exenta NUMERIC(12,2),
+    base_general NUMERIC(12,2),
+    iva_general NUMERIC(12,2),
+    total NUMERIC(12,2),
+    inicio_periodo DATE,
+    fin_periodo DATE,
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS documentos (
+    id SERIAL PRIMARY KEY,
+    contrato_id INT REFERENCES contratos (id) ON DELETE CASCADE,
+    factura_id INT REFERENCES facturas (id) ON DELETE CASCADE,
+    nombre_archivo VARCHAR(255),
+    created_at TIMESTAMP DEFAULT NOW()
+);
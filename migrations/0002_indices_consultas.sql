@@ -0,0 +1,20 @@
+-- Índices para las consultas de db_queries e ingest_data.
+-- Si ya hay proveedores duplicados por (cif, nombre), el índice único falla
+-- y la migración se revierte entera: hay que deduplicarlos antes.
+
+-- get_or_create_proveedor: búsqueda por (cif_proveedor, nombre_proveedor)
+CREATE UNIQUE INDEX IF NOT EXISTS uq_proveedores_cif_nombre
+    ON proveedores (cif_proveedor, nombre_proveedor);
+
+-- Joins contratos -> proveedores y filtros por centro / vencimiento
+CREATE INDEX IF NOT EXISTS idx_contratos_proveedor_id ON contratos (proveedor_id);
+CREATE INDEX IF NOT EXISTS idx_contratos_centro ON contratos (centro);
+CREATE INDEX IF NOT EXISTS idx_contratos_fecha_vencimiento ON contratos (fecha_vencimiento);
+
+-- Joins facturas -> contratos (con filtro por año) y rangos de fechas
+CREATE INDEX IF NOT EXISTS idx_facturas_contrato_fecha ON facturas (contrato_id, fecha_factura);
+CREATE INDEX IF NOT EXISTS idx_facturas_fecha_factura ON facturas (fecha_factura);
+
+-- ON DELETE CASCADE desde contratos / facturas
+CREATE INDEX IF NOT EXISTS idx_documentos_contrato_id ON documentos (contrato_id);
+CREATE INDEX IF NOT EXISTS idx_documentos_factura_id ON documentos (factura_id);
@@ -0,0 +1,81 @@
+import sys
+import time
+import importlib
+import threading
+from .trazas import span
+
+INICIO = time.perf_counter()  # lo primero que importa app.py: marca el arranque del proceso
+
+PREGUNTA_CALENTAMIENTO = "¿Cuánto se gastó con Iberia en 2024 en la residencia 1?"
+
+_importaciones = {}   # módulo -> ms de la primera importación (la que cuesta)
+_eventos = {}         # evento -> ms desde INICIO (solo la primera vez)
+_calentamiento = []   # pasos del calentamiento en segundo plano
+_lock = threading.Lock()
+
+
+def importar(modulo: str):
+    """
+    importlib.import_module midiendo la primera importación. Las vistas importan
+    así sus dependencias pesadas, de modo que cada una paga solo lo que usa.
+    """
+    if modulo in sys.modules:
+        return sys.modules[modulo]
+    inicio = time.perf_counter()
+    m = importlib.import_module(modulo)
+    with _lock:
+        _importaciones.setdefault(modulo, round((time.perf_counter() - inicio) * 1000, 1))
+    return m
+
+
+def marcar(evento: str):
+    with _lock:
+        _eventos.setdefault(evento, round((time.perf_counter() - INICIO) * 1000, 1))
+
+
+def _paso(nombre: str, fn):
+    inicio = time.perf_counter()
+    resultado, error = None, None
+    try:
+        resultado = fn()
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    with _lock:
+        _calentamiento.append({"paso": nombre, "ms": round((time.perf_counter() - inicio) * 1000, 1),
+                               "error": error or ""})
+    return resultado
+
+
+def calentar(obtener_cliente):
+    """
+    Deja listo lo que necesita la primera pregunta: módulos del pipeline, regex
+    del parser, conexión, snapshot/motor SQL cargados e índice de nombres.
+    Cada paso se mide; un fallo no impide los siguientes.
+    """
+    with span("arranque.calentar"):
+        _paso("importar rag.pipeline", lambda: importar("rag.pipeline"))
+        _paso("parser", lambda: importar("rag.parser").interpret_question(PREGUNTA_CALENTAMIENTO, None))
+        cliente = _paso("conexión", obtener_cliente)
+        if cliente is not None:
+            if hasattr(cliente, "precargar"):
+                _paso("snapshot", cliente.precargar)
+            _paso("índice de nombres", lambda: importar("rag.nombres").indice_nombres(cliente))
+    marcar("calentamiento terminado")
+
+
+def hilo_calentamiento(obtener_cliente) -> threading.Thread:
+    """
+    Hilo (sin arrancar) que ejecuta calentar(); quien lo crea puede adjuntarle contexto antes de start().
+    """
+    return threading.Thread(target=calentar, args=(obtener_cliente,), name="calentamiento", daemon=True)
+
+
+def informe() -> dict:
+    with _lock:
+        return {
+            "importaciones": [{"módulo": m, "ms": ms} for m, ms in
+                              sorted(_importaciones.items(), key=lambda x: -x[1])],
+            "eventos": [{"evento": e, "ms_desde_inicio": ms} for e, ms in
+                        sorted(_eventos.items(), key=lambda x: x[1])],
+            "calentamiento": list(_calentamiento),
+        }
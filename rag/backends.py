@@ -0,0 +1,245 @@
+import io
+import csv
+import threading
+from contextlib import contextmanager
+import pandas as pd
+from .memoria import Respuesta
+
+BACKENDS = ("supabase", "postgres", "snapshot")
+NULL_COPY = "\\N"
+
+
+def crear_cliente(config) -> object:
+    """
+    Crea el cliente de datos según la configuración (st.secrets u os.environ):
+    - DATA_BACKEND=supabase (por defecto): supabase.Client sobre PostgREST.
+    - DATA_BACKEND=postgres: ClientePostgres con pool de conexiones psycopg2 (DATABASE_URL).
+    - DATA_BACKEND=snapshot: ClienteSnapshot, solo lectura sobre la snapshot Arrow local (SNAPSHOT_DIR).
+    Todos exponen table().select().eq().insert().execute(), que es lo que usa db_queries.
+    Con SQL_ENGINE=duckdb|sqlite el cliente se envuelve en MotorSQL: los datos se cargan una
+    vez en un motor embebido y las consultas analíticas se resuelven allí con SQL.
+    Con SHARED_CACHE=sqlite:///... o redis://... las lecturas y las respuestas de GPT se
+    comparten entre réplicas (ver cache_compartida.py). Las lecturas y llamadas a GPT
+    iguales y simultáneas se hacen una sola vez (SINGLE_FLIGHT_TIMEOUT_S) y, con
+    STALE_WHILE_REVALIDATE_S, las lecturas de más de db_queries.FRESCO_S se sirven
+    obsoletas mientras se refrescan (coalescencia.py); las respuestas de GPT, nunca.
+    """
+    if config.get("SHARED_CACHE"):
+        from . import cache_compartida
+        cache_compartida.configurar(config.get("SHARED_CACHE"), config.get("SHARED_CACHE_PREFIX"))
+    if config.get("SINGLE_FLIGHT_TIMEOUT_S") or config.get("STALE_WHILE_REVALIDATE_S"):
+        from . import coalescencia
+        coalescencia.configurar(config.get("SINGLE_FLIGHT_TIMEOUT_S"), config.get("STALE_WHILE_REVALIDATE_S"))
+    cliente = _cliente_base(config)
+    motor = (config.get("SQL_ENGINE") or "").lower()
+    if motor:
+        from .motor_sql import MotorSQL
+        return MotorSQL(cliente, motor)
+    return cliente
+
+
+def cliente_base(cliente) -> object:
+    """
+    El cliente de la base de datos sin el envoltorio de MotorSQL: para escribir (ingesta,
+    COPY) o para leer lo recién escrito sin pasar por los datos ya cargados en el motor.
+    """
+    from .motor_sql import MotorSQL
+
+    return cliente.base if isinstance(cliente, MotorSQL) else cliente
+
+
+def _cliente_base(config) -> object:
+    backend = (config.get("DATA_BACKEND") or "supabase").lower()
+    if backend == "postgres":
+        dsn = config.get("DATABASE_URL")
+        if not dsn:
+            raise ValueError("DATA_BACKEND=postgres requiere DATABASE_URL.")
+        return ClientePostgres(dsn, maxconn=int(config.get("DB_POOL_MAX") or 10))
+
+    if backend == "snapshot":
+        from .snapshot import ClienteSnapshot, SNAPSHOT_DIR
+        return ClienteSnapshot(config.get("SNAPSHOT_DIR") or SNAPSHOT_DIR)
+
+    if backend != "supabase":
+        raise ValueError(f"DATA_BACKEND desconocido: '{backend}'. Opciones: {', '.join(BACKENDS)}")
+
+    from supabase import create_client
+    url = config.get("SUPABASE_URL")
+    key = config.get("SUPABASE_KEY")
+    if not url or not key:
+        raise ValueError("Faltan SUPABASE_URL o SUPABASE_KEY.")
+    return create_client(url, key)
+
+
+class ConsultaPostgres:
+    """
+    Query builder con la misma interfaz que el de supabase, traducido a SQL parametrizado.
+    """
+
+    def __init__(self, cliente, tabla: str):
+        self.cliente = cliente
+        self.tabla = tabla
+        self.columnas = None
+        self.filtros = []
+        self.filas_insert = None
+
+    def select(self, columnas: str = "*"):
+        if columnas and columnas.strip() != "*":
+            self.columnas = [c.strip() for c in columnas.split(",")]
+        return self
+
+    def eq(self, columna: str, valor):
+        self.filtros.append((columna, valor))
+        return self
+
+    def insert(self, filas):
+        self.filas_insert = filas if isinstance(filas, list) else [filas]
+        return self
+
+    def execute(self) -> Respuesta:
+        from psycopg2 import sql
+        from psycopg2.extras import RealDictCursor, execute_values
+
+        tabla = sql.Identifier(self.tabla)
+        with self.cliente.conexion() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            if self.filas_insert is not None:
+                if not self.filas_insert:
+                    return Respuesta([])
+                cols = list(self.filas_insert[0].keys())
+                query = sql.SQL("INSERT INTO {} ({}) VALUES %s RETURNING *").format(
+                    tabla, sql.SQL(", ").join(map(sql.Identifier, cols)))
+                filas = execute_values(cur, query, [[f.get(c) for c in cols] for f in self.filas_insert], fetch=True)
+                return Respuesta([dict(f) for f in filas])
+
+            cols = sql.SQL(", ").join(map(sql.Identifier, self.columnas)) if self.columnas else sql.SQL("*")
+            query = sql.SQL("SELECT {} FROM {}").format(cols, tabla)
+            if self.filtros:
+                query += sql.SQL(" WHERE ") + sql.SQL(" AND ").join(
+                    sql.SQL("{} = %s").format(sql.Identifier(c)) for c, _ in self.filtros)
+            cur.execute(query, [v for _, v in self.filtros])
+            return Respuesta([dict(f) for f in cur.fetchall()])
+
+
+class ClientePostgres:
+    """
+    Acceso directo a Postgres con un pool de conexiones psycopg2, como alternativa
+    al cliente REST de Supabase:
+    - table()...execute(): misma interfaz que supabase para db_queries e ingest_data.
+    - fetch_frame(): lectura en streaming con cursores de servidor.
+    - sql(): consultas parametrizadas (agregaciones en la base de datos).
+    - copy_rows(): cargas masivas con COPY.
+    Los DATE se devuelven como 'YYYY-MM-DD' y los NUMERIC como float, igual que PostgREST.
+    """
+
+    def __init__(self, dsn: str, minconn: int = 1, maxconn: int = 10, tamaño_lote: int = 10000):
+        from psycopg2.pool import ThreadedConnectionPool
+
+        self.pool = ThreadedConnectionPool(minconn, maxconn, dsn)
+        self.tamaño_lote = tamaño_lote
+        self._registradas = set()
+        self._lock = threading.Lock()
+
+    def _preparar(self, conn):
+        # Conversores por conexión: DATE -> str ISO, NUMERIC -> float
+        with self._lock:
+            if id(conn) in self._registradas:
+                return
+            from psycopg2 import extensions
+
+            fecha = extensions.new_type(extensions.DATE.values, "FECHA_ISO", lambda v, cur: v)
+            numero = extensions.new_type(extensions.DECIMAL.values, "NUMERIC_FLOAT",
+                                         lambda v, cur: float(v) if v is not None else None)
+            extensions.register_type(fecha, conn)
+            extensions.register_type(numero, conn)
+            self._registradas.add(id(conn))
+
+    @contextmanager
+    def conexion(self):
+        """
+        Conexión del pool dentro de una transacción: commit al salir, rollback si hay error.
+        """
+        conn = self.pool.getconn()
+        try:
+            self._preparar(conn)
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn)
+
+    def table(self, nombre: str) -> ConsultaPostgres:
+        return ConsultaPostgres(self, nombre)
+
+    def stream(self, tabla: str, columnas: str = "*"):
+        """
+        Genera DataFrames de `tamaño_lote` filas usando un cursor de servidor,
+        sin cargar la tabla entera en el cliente de una vez.
+        """
+        from psycopg2 import sql
+
+        cols = (sql.SQL(", ").join(sql.Identifier(c.strip()) for c in columnas.split(","))
+                if columnas.strip() != "*" else sql.SQL("*"))
+        with self.conexion() as conn, conn.cursor(name=f"stream_{tabla}") as cur:
+            cur.itersize = self.tamaño_lote
+            cur.execute(sql.SQL("SELECT {} FROM {}").format(cols, sql.Identifier(tabla)))
+            while True:
+                filas = cur.fetchmany(self.tamaño_lote)
+                if not filas:
+                    break
+                yield pd.DataFrame(filas, columns=[d.name for d in cur.description])
+
+    def fetch_frame(self, tabla: str, columnas: str = "*") -> pd.DataFrame:
+        lotes = list(self.stream(tabla, columnas))
+        if not lotes:
+            return pd.DataFrame()
+        return pd.concat(lotes, ignore_index=True) if len(lotes) > 1 else lotes[0]
+
+    def sql(self, query: str, params: dict = None) -> pd.DataFrame:
+        """
+        Ejecuta una consulta parametrizada (estilo %(nombre)s) y devuelve un DataFrame.
+        """
+        with self.conexion() as conn, conn.cursor() as cur:
+            cur.execute(query, params or {})
+            return pd.DataFrame(cur.fetchall(), columns=[d.name for d in cur.description])
+
+    def copy_rows(self, tabla: str, columnas: list, filas, conn=None) -> int:
+        """
+        Carga filas (iterable de secuencias) con COPY ... FROM STDIN en formato CSV.
+        Si se pasa `conn`, se usa esa transacción en lugar de abrir una nueva.
+        """
+        buffer = io.StringIO()
+        n = escribir_csv(buffer, filas)
+        buffer.seek(0)
+        self.copy_from(tabla, columnas, buffer, conn=conn)
+        return n
+
+    def copy_from(self, tabla: str, columnas: list, fichero, conn=None):
+        """
+        COPY desde un objeto tipo fichero con CSV escrito por escribir_csv().
+        """
+        from psycopg2 import sql
+
+        query = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv, NULL '\\N')").format(
+            sql.Identifier(tabla), sql.SQL(", ").join(map(sql.Identifier, columnas)))
+
+        if conn is not None:
+            with conn.cursor() as cur:
+                cur.copy_expert(query.as_string(conn), fichero)
+            return
+        with self.conexion() as conn, conn.cursor() as cur:
+            cur.copy_expert(query.as_string(conn), fichero)
+
+
+def escribir_csv(fichero, filas) -> int:
+    """
+    Escribe filas en el CSV que espera COPY: None como \\N sin comillas,
+    para distinguirlo de la cadena vacía.
+    """
+    writer = csv.writer(fichero)
+    n = 0
+    for fila in filas:
+        writer.writerow([NULL_COPY if v is None else v for v in fila])
+        n += 1
+    return n
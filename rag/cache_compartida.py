@@ -0,0 +1,199 @@
+import io
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from urllib.parse import urlparse
+import pandas as pd
+from .trazas import span
+from .versionado import version_datos, TTL_SIN_VERSION_S
+
+# Misma caché para todas las réplicas de Streamlit (y el CLI de lotes):
+#   SHARED_CACHE=sqlite:///.cache/compartida.db  -> fichero SQLite en disco local (mismo host)
+#   SHARED_CACHE=redis://host:6379/0             -> cualquier servidor que hable el protocolo Redis
+TTL_VERSIONADO_S = 24 * 3600  # las entradas de versiones viejas dejan de pedirse y caducan
+TTL_GPT_S = 7 * 24 * 3600
+_FORMATO_ARROW = b"A"
+_FORMATO_JSON = b"J"
+
+_actual = None
+_lock = threading.Lock()
+
+
+# 📌 Serialización: DataFrames como Arrow IPC (comprimido), el resto como JSON
+def serializar(valor) -> bytes:
+    if isinstance(valor, pd.DataFrame):
+        import pyarrow as pa
+        import pyarrow.ipc as ipc
+
+        tabla = pa.Table.from_pandas(valor, preserve_index=False)
+        sink = io.BytesIO()
+        opciones = ipc.IpcWriteOptions(compression="zstd" if pa.Codec.is_available("zstd") else None)
+        with ipc.new_stream(sink, tabla.schema, options=opciones) as writer:
+            writer.write_table(tabla)
+        return _FORMATO_ARROW + sink.getvalue()
+    return _FORMATO_JSON + json.dumps(valor, ensure_ascii=False, default=str).encode("utf-8")
+
+
+def deserializar(datos: bytes):
+    if datos[:1] == _FORMATO_ARROW:
+        import pyarrow.ipc as ipc
+
+        return ipc.open_stream(datos[1:]).read_all().to_pandas(date_as_object=False)
+    return json.loads(datos[1:].decode("utf-8"))
+
+
+# 📌 Backends
+class CacheSQLite:
+    """
+    Caché en un fichero SQLite (modo WAL): la comparten los procesos del mismo host.
+    """
+
+    def __init__(self, ruta: str):
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self.ruta = ruta
+        self._local = threading.local()
+        with self._conexion() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("CREATE TABLE IF NOT EXISTS cache (clave TEXT PRIMARY KEY, valor BLOB NOT NULL, expira REAL)")
+
+    def _conexion(self) -> sqlite3.Connection:
+        # Una conexión por hilo; las escrituras de otros procesos se ven en la siguiente lectura
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.ruta, timeout=10)
+            self._local.con = con
+        return con
+
+    def get(self, clave: str):
+        fila = self._conexion().execute(
+            "SELECT valor FROM cache WHERE clave = ? AND (expira IS NULL OR expira > ?)",
+            (clave, time.time())).fetchone()
+        return fila[0] if fila else None
+
+    def set(self, clave: str, valor: bytes, ttl_s: float = None):
+        expira = time.time() + ttl_s if ttl_s else None
+        with self._conexion() as con:
+            con.execute("INSERT OR REPLACE INTO cache (clave, valor, expira) VALUES (?, ?, ?)", (clave, valor, expira))
+            con.execute("DELETE FROM cache WHERE expira IS NOT NULL AND expira <= ?", (time.time(),))
+
+    def delete(self, clave: str):
+        with self._conexion() as con:
+            con.execute("DELETE FROM cache WHERE clave = ?", (clave,))
+
+
+class CacheRedis:
+    """
+    Caché en un servidor con protocolo Redis (Redis, Valkey, KeyDB...), compartida entre hosts.
+    """
+
+    def __init__(self, url: str):
+        import redis
+
+        # RESP2: lo hablan todos los servidores compatibles, no solo los que aceptan HELLO 3
+        self.redis = redis.Redis.from_url(url, protocol=2, socket_timeout=2, socket_connect_timeout=2)
+
+    def get(self, clave: str):
+        return self.redis.get(clave)
+
+    def set(self, clave: str, valor: bytes, ttl_s: float = None):
+        self.redis.set(clave, valor, px=int(ttl_s * 1000) if ttl_s else None)
+
+    def delete(self, clave: str):
+        self.redis.delete(clave)
+
+
+def crear_cache(url: str):
+    """
+    Backend según la URL: sqlite:///ruta/al/fichero.db o redis://host:puerto/db.
+    """
+    esquema = urlparse(url).scheme
+    if esquema == "sqlite":
+        return CacheSQLite(url[len("sqlite:///"):] if url.startswith("sqlite:///") else urlparse(url).path)
+    if esquema in ("redis", "rediss", "unix"):
+        return CacheRedis(url)
+    raise ValueError(f"SHARED_CACHE desconocida: '{url}'. Usa sqlite:///ruta.db o redis://host:puerto/db")
+
+
+def configurar(url: str = None, prefijo: str = None):
+    """
+    Activa (o, sin url, desactiva) la caché compartida del proceso.
+    El prefijo separa entornos que compartan servidor (p. ej. producción y pruebas).
+    """
+    global _actual
+    with _lock:
+        _actual = (crear_cache(url), prefijo or "rag") if url else None
+
+
+def actual():
+    return _actual
+
+
+# 📌 Claves y uso
+def clave(espacio: str, version, *partes) -> str:
+    """
+    'prefijo:espacio:version:hash(partes)'. Una versión de datos nueva cambia
+    todas las claves: no hay que invalidar nada, lo viejo caduca solo.
+    """
+    huella = hashlib.sha256(json.dumps(partes, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()[:32]
+    prefijo = _actual[1] if _actual else "rag"
+    return f"{prefijo}:{espacio}:{version}:{huella}"
+
+
+def obtener(clave_cache: str):
+    """
+    Valor cacheado o None. Un fallo de la caché nunca rompe la consulta: se trata como un fallo de caché.
+    """
+    if _actual is None:
+        return None
+    with span("cache.obtener") as s:
+        try:
+            datos = _actual[0].get(clave_cache)
+        except Exception as e:
+            s.set(error=f"{type(e).__name__}: {e}")
+            return None
+        s.set(acierto=datos is not None, bytes=len(datos or b""))
+        return deserializar(datos) if datos is not None else None
+
+
+def guardar(clave_cache: str, valor, ttl_s: float = None):
+    if _actual is None or valor is None:
+        return
+    with span("cache.guardar") as s:
+        try:
+            datos = serializar(valor)
+            _actual[0].set(clave_cache, datos, ttl_s)
+            s.set(bytes=len(datos))
+        except Exception as e:
+            s.set(error=f"{type(e).__name__}: {e}")
+
+
+def version_o_ventana(supabase_client) -> tuple:
+    """
+    (versión, ttl) para las claves de datos. Sin versión (Supabase, Postgres) se usa una
+    ventana de tiempo común a todas las réplicas y las entradas caducan con ella.
+    """
+    version = version_datos(supabase_client)
+    if version is not None:
+        return f"v{version}", TTL_VERSIONADO_S
+    return f"t{int(time.time() // TTL_SIN_VERSION_S)}", TTL_SIN_VERSION_S
+
+
+def datos(supabase_client, partes: tuple, construir):
+    """
+    Resultado de construir() compartido entre procesos por cliente + versión de datos.
+    Los clientes con los datos ya en local (memoria, snapshot mapeada, MotorSQL) no la usan.
+    """
+    if _actual is None or getattr(supabase_client, "datos_locales", False):
+        return construir()
+    version, ttl_s = version_o_ventana(supabase_client)
+    clave_cache = clave("datos", version, *partes)
+    valor = obtener(clave_cache)
+    if valor is None:
+        valor = construir()
+        guardar(clave_cache, valor, ttl_s)
+    return valor
@@ -0,0 +1,112 @@
+import time
+import threading
+from .trazas import span
+
+# Single-flight: peticiones concurrentes con la misma clave comparten una sola ejecución.
+TIMEOUT_S = 60.0    # lo que espera un seguidor a que termine la llamada en vuelo
+OBSOLETO_S = 0.0    # stale-while-revalidate: 0 = desactivado (cada petición ve datos recientes)
+MAX_ULTIMOS = 256   # resultados guardados para servir obsoletos
+
+_lock = threading.Lock()
+_en_vuelo = {}   # clave -> _Vuelo
+_ultimos = {}    # clave -> (terminado, valor), en orden de uso
+
+
+class _Vuelo:
+    __slots__ = ("listo", "valor", "error")
+
+    def __init__(self):
+        self.listo = threading.Event()
+        self.valor = None
+        self.error = None
+
+
+def configurar(timeout_s: float = None, obsoleto_s: float = None):
+    """
+    Valores por defecto del proceso (p. ej. SINGLE_FLIGHT_TIMEOUT_S y STALE_WHILE_REVALIDATE_S).
+    """
+    global TIMEOUT_S, OBSOLETO_S
+    if timeout_s is not None:
+        TIMEOUT_S = float(timeout_s)
+    if obsoleto_s is not None:
+        OBSOLETO_S = float(obsoleto_s)
+
+
+def _ejecutar(clave, vuelo: _Vuelo, construir, recordar: bool):
+    try:
+        vuelo.valor = construir()
+    except Exception as e:
+        vuelo.error = e
+    finally:
+        with _lock:
+            _en_vuelo.pop(clave, None)
+            if recordar and vuelo.error is None:
+                _ultimos.pop(clave, None)
+                _ultimos[clave] = (time.monotonic(), vuelo.valor)
+                while len(_ultimos) > MAX_ULTIMOS:
+                    del _ultimos[next(iter(_ultimos))]
+        vuelo.listo.set()
+
+
+def _revalidar(clave, vuelo: _Vuelo, construir):
+    with span("coalescencia.revalidar") as s:
+        _ejecutar(clave, vuelo, construir, recordar=True)
+        if vuelo.error is not None:
+            s.error = f"{type(vuelo.error).__name__}: {vuelo.error}"
+
+
+def compartir(clave, construir, timeout_s: float = None, fresco_s: float = 0.0, obsoleto_s: float = None):
+    """
+    Devuelve construir() garantizando una sola ejecución en vuelo por clave:
+    - El primero que llega (líder) la ejecuta; los demás esperan su resultado (o su
+      excepción) hasta timeout_s y, si no llega, reciben TimeoutError (el líder sigue).
+    - Un resultado de hace menos de fresco_s se devuelve sin volver a ejecutar.
+    - Con obsoleto_s > 0 (stale-while-revalidate), un resultado de hasta fresco_s +
+      obsoleto_s se devuelve al momento y se refresca en segundo plano, una sola vez.
+    El valor es el mismo objeto para todos: quien lo vaya a modificar debe copiarlo.
+    """
+    timeout_s = TIMEOUT_S if timeout_s is None else timeout_s
+    obsoleto_s = OBSOLETO_S if obsoleto_s is None else obsoleto_s
+    recordar = fresco_s > 0 or obsoleto_s > 0
+
+    with _lock:
+        ultimo = _ultimos.get(clave) if recordar else None
+        if ultimo is not None:
+            _ultimos[clave] = _ultimos.pop(clave)  # usado ahora: el último en expulsarse
+            edad = time.monotonic() - ultimo[0]
+            if edad < fresco_s:
+                return ultimo[1]
+            if edad < fresco_s + obsoleto_s:
+                if clave not in _en_vuelo:
+                    vuelo = _en_vuelo[clave] = _Vuelo()
+                    threading.Thread(target=_revalidar, args=(clave, vuelo, construir),
+                                     name="revalidar", daemon=True).start()
+                return ultimo[1]
+        vuelo = _en_vuelo.get(clave)
+        lider = vuelo is None
+        if lider:
+            vuelo = _en_vuelo[clave] = _Vuelo()
+
+    if lider:
+        _ejecutar(clave, vuelo, construir, recordar)
+    else:
+        with span("coalescencia.esperar") as s:
+            if not vuelo.listo.wait(timeout_s):
+                raise TimeoutError(f"Sin respuesta en {timeout_s:.0f} s para la petición en curso {clave!r}")
+            s.set(compartida=True)
+    if vuelo.error is not None:
+        raise vuelo.error
+    return vuelo.valor
+
+
+def en_vuelo() -> int:
+    with _lock:
+        return len(_en_vuelo)
+
+
+def olvidar():
+    """
+    Descarta los resultados guardados para servir obsoletos (tests, cambio de datos).
+    """
+    with _lock:
+        _ultimos.clear()
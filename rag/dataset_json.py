@@ -0,0 +1,55 @@
+import pandas as pd
+from .mapeo import proveedor_row, contrato_row_from_item, factura_row, documento_rows
+from .memoria import ClienteMemoria
+
+TABLAS = ("proveedores", "contratos", "facturas", "documentos")
+
+
+def es_formato_residencias(data) -> bool:
+    """
+    Comprueba si el JSON tiene la forma de residencias_data.json
+    (lista de contratos con proveedor y facturas).
+    """
+    return (isinstance(data, list) and len(data) > 0
+            and all(isinstance(item, dict) for item in data)
+            and any("nombre proveedor" in item or "facturas" in item for item in data))
+
+
+def normalizar_residencias(data) -> dict:
+    """
+    Convierte un JSON con la forma de residencias_data.json en los DataFrames
+    proveedores/contratos/facturas/documentos, con el mismo mapeo de campos que
+    ingest_data.py y con ids asignados como lo haría la base de datos.
+    """
+    proveedores, contratos, facturas, documentos = [], [], [], []
+    ids_proveedor = {}
+
+    for item in data:
+        # Proveedor: se reutiliza si coincide (cif, nombre), como get_or_create_proveedor
+        prov = proveedor_row(item)
+        clave = (prov["cif_proveedor"], prov["nombre_proveedor"])
+        if clave not in ids_proveedor:
+            ids_proveedor[clave] = len(proveedores) + 1
+            proveedores.append({"id": ids_proveedor[clave], **prov})
+
+        contrato_id = len(contratos) + 1
+        contratos.append({"id": contrato_id, **contrato_row_from_item(ids_proveedor[clave], item)})
+        documentos.extend(documento_rows(item.get("Documentos", []), contrato_id=contrato_id))
+
+        for factura_item in item.get("facturas", []):
+            factura_id = len(facturas) + 1
+            facturas.append({"id": factura_id, **factura_row(contrato_id, factura_item)})
+            documentos.extend(documento_rows(factura_item.get("Documentos", []), factura_id=factura_id))
+
+    documentos = [{"id": i, **doc} for i, doc in enumerate(documentos, start=1)]
+
+    filas = dict(zip(TABLAS, (proveedores, contratos, facturas, documentos)))
+    return {tabla: pd.DataFrame(rows) for tabla, rows in filas.items()}
+
+
+def cliente_desde_json(data) -> ClienteMemoria:
+    """
+    Cliente en memoria sobre el JSON normalizado, utilizable por db_queries
+    en lugar del cliente de Supabase.
+    """
+    return ClienteMemoria(normalizar_residencias(data))
@@ -1,63 +1,190 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+import math
 import pandas as pd
-from supabase import Client
 from datetime import datetime
 from datetime import timedelta
-
-def get_contratos(supabase_client: Client) -> pd.DataFrame:
-    resp = supabase_client.table("contratos").select("*").execute()
+import json
+from .trazas import span
+from .nombres import indice_nombres
+from .intervalos import indice_intervalos
+from .indice_documentos import cargar_indice, tokenizar
+from .dinero import COLUMNAS_DINERO, centimos_frame, a_euros, formatear
+from . import cache_compartida
+from . import coalescencia
+
+if TYPE_CHECKING:
+    # Solo para las anotaciones: importar supabase cuesta ~0,3 s en frío
+    from supabase import Client
+
+def _tabla(supabase_client: Client, nombre: str, columnas: str = "*", centimos: bool = False) -> pd.DataFrame:
+    """
+    Lee una tabla completa. Los backends que saben construir el DataFrame
+    directamente (fetch_frame) se saltan la conversión desde registros JSON.
+    Con centimos=True las columnas de dinero llegan como céntimos int64 (ver dinero.py);
+    la snapshot y MotorSQL las convierten una sola vez por versión de datos.
+    Las lecturas remotas pasan por _compartido().
+    """
+    with span(f"db.{nombre}") as s:
+        if centimos and getattr(supabase_client, "admite_centimos", False):
+            df = supabase_client.fetch_frame(nombre, columnas, centimos=True)
+        else:
+            df = _compartido(supabase_client, ("tabla", nombre, columnas),
+                             lambda: _leer_tabla(supabase_client, nombre, columnas))
+        if centimos:
+            df = centimos_frame(df, nombre)
+        s.set(filas=len(df), bytes=int(df.memory_usage(index=False).sum()))
+        return df
+
+FRESCO_S = 30.0  # con STALE_WHILE_REVALIDATE_S: edad hasta la que una lectura se sirve sin refrescarla
+
+def _compartido(supabase_client: Client, partes: tuple, construir) -> pd.DataFrame:
+    """
+    Lecturas contra el servidor (Supabase, Postgres): una sola en vuelo por consulta
+    aunque la pidan varias sesiones a la vez (coalescencia.py) y, con SHARED_CACHE,
+    compartidas entre procesos (cache_compartida.py). Los clientes con los datos en
+    local no pasan por aquí.
+    Con stale-while-revalidate activado, una lectura de menos de FRESCO_S se reutiliza
+    tal cual y solo las más viejas se refrescan en segundo plano; sin él, cada petición lee.
+    """
+    if getattr(supabase_client, "datos_locales", False):
+        return construir()
+    clave = (id(supabase_client), getattr(supabase_client, "version", None),
+             json.dumps(partes, sort_keys=True, default=str))
+    fresco_s = FRESCO_S if coalescencia.OBSOLETO_S > 0 else 0.0
+    df = coalescencia.compartir(clave, lambda: cache_compartida.datos(supabase_client, partes, construir),
+                                fresco_s=fresco_s)
+    # Todas las sesiones reciben el mismo DataFrame y las funciones lo modifican: copia para cada una
+    return df.copy()
+
+def _leer_tabla(supabase_client: Client, nombre: str, columnas: str) -> pd.DataFrame:
+    if hasattr(supabase_client, "fetch_frame"):
+        return supabase_client.fetch_frame(nombre, columnas)
+    resp = supabase_client.table(nombre).select(columnas).execute()
     return pd.DataFrame(resp.data or [])
 
-def get_facturas(supabase_client: Client) -> pd.DataFrame:
-    resp = supabase_client.table("facturas").select("*").execute()
-    return pd.DataFrame(resp.data or [])
+def _sql(supabase_client: Client, query: str, params: dict = None) -> pd.DataFrame:
+    with span("db.sql") as s:
+        df = _compartido(supabase_client, ("sql", query, params or {}),
+                         lambda: supabase_client.sql(query, params))
+        s.set(filas=len(df), bytes=int(df.memory_usage(index=False).sum()))
+        return df
+
+def _usa_sql(supabase_client: Client) -> bool:
+    # Backends con SQL parametrizado: las agregaciones se hacen en la base de datos
+    return hasattr(supabase_client, "sql")
+
+def _centimos_sql(columna: str) -> str:
+    # Dinero como céntimos enteros ya en la consulta: las sumas son exactas en todos los motores,
+    # también en SQLite, que guarda REAL
+    return f"CAST(round({columna} * 100) AS BIGINT)"
+
+def _enteros(valores) -> pd.Series:
+    # Céntimos que devuelve el motor (int, float o Decimal según el driver) -> int64; NULL cuenta como 0
+    return pd.to_numeric(pd.Series(valores), errors="coerce").fillna(0).round().astype("int64")
+
+def _vacia(supabase_client: Client, tabla: str) -> bool:
+    # Solo para distinguir los mensajes de "no hay datos" cuando la consulta no devuelve filas
+    return _sql(supabase_client, f"SELECT count(*) AS n FROM {tabla}").to_dict("records")[0]["n"] == 0
+
+def _rango_year(year) -> tuple:
+    """
+    [1 de enero, 1 de enero del año siguiente) en ISO, para filtrar por año con índices.
+    """
+    if not year:
+        return "0001-01-01", "0001-01-01"
+    year = int(year)
+    return f"{year:04d}-01-01", f"{year + 1:04d}-01-01"
+
+def _en_lista(prefijo: str, valores: list) -> tuple:
+    # IN (...) que vale igual en psycopg2, DuckDB y SQLite: un parámetro por valor
+    nombres = [f"{prefijo}{i}" for i in range(len(valores))]
+    return ", ".join(f"%({n})s" for n in nombres), dict(zip(nombres, valores))
+
+def _fecha_iso(valor) -> str:
+    # Las fechas llegan como 'YYYY-MM-DD' (REST) o como Timestamp (snapshot Arrow)
+    return valor.strftime("%Y-%m-%d") if hasattr(valor, "strftime") else str(valor)
+
+def get_contratos(supabase_client: Client, columnas: str = "*", centimos: bool = False) -> pd.DataFrame:
+    return _tabla(supabase_client, "contratos", columnas, centimos)
+
+def get_facturas(supabase_client: Client, columnas: str = "*", centimos: bool = False) -> pd.DataFrame:
+    return _tabla(supabase_client, "facturas", columnas, centimos)
+
+def get_proveedores(supabase_client: Client) -> pd.DataFrame:
+    return _tabla(supabase_client, "proveedores")
 
 def facturas_importe_mayor(supabase_client: Client, importe: float) -> str:
-    df_fact = get_facturas(supabase_client)
-    if df_fact.empty:
+    if _usa_sql(supabase_client):
+        row = _sql(supabase_client,
+            "SELECT count(*) AS n_total, "
+            "count(*) FILTER (WHERE total > %(importe)s) AS n, "
+            f"coalesce(sum({_centimos_sql('total')}) FILTER (WHERE total > %(importe)s), 0) AS suma "
+            "FROM facturas",
+            {"importe": importe}).to_dict("records")[0]
+        n_total, n, suma = row["n_total"], row["n"], _enteros([row["suma"]])[0]
+    else:
+        total = get_facturas(supabase_client, "total", centimos=True).get("total", pd.Series(dtype="int64")).to_numpy()
+        # total > importe  <=>  céntimos > floor(importe * 100)
+        mayores = total[total > math.floor(round(float(importe) * 100, 6))]
+        n_total, n, suma = len(total), len(mayores), mayores.sum()
+
+    if n_total == 0:
         return "No hay facturas registradas."
-
-    df_fact["total"] = pd.to_numeric(df_fact["total"], errors="coerce").fillna(0)
-    df_fil = df_fact[df_fact["total"] > importe]
-    if df_fil.empty:
+    if n == 0:
         return f"No hay facturas con importe mayor a {importe:.2f}."
-    suma = df_fil["total"].sum()
-    return (f"Encontré {len(df_fil)} facturas con importe mayor a {importe:.2f}. "
-            f"La suma de esas facturas es {suma:.2f}.")
+    return (f"Encontré {n} facturas con importe mayor a {importe:.2f}. "
+            f"La suma de esas facturas es {formatear(suma)}.")
 
 def proveedor_mas_contratos(supabase_client: Client) -> str:
-    df_contr = get_contratos(supabase_client)
-    if df_contr.empty:
+    if _usa_sql(supabase_client):
+        df_rank = _sql(supabase_client,
+            "SELECT p.nombre_proveedor, count(*) AS num_contratos "
+            "FROM contratos c JOIN proveedores p ON c.proveedor_id = p.id "
+            "GROUP BY c.proveedor_id, p.nombre_proveedor "
+            "ORDER BY num_contratos DESC, p.nombre_proveedor")
+        hay_contratos = not df_rank.empty or not _vacia(supabase_client, "contratos")
+    else:
+        df_contr = get_contratos(supabase_client, "id,proveedor_id")
+        hay_contratos = not df_contr.empty
+        df_rank = pd.DataFrame(columns=["nombre_proveedor", "num_contratos"])
+        if hay_contratos:
+            df_group = df_contr.groupby("proveedor_id").size().reset_index(name="num_contratos")
+            df_rank = df_group.merge(get_proveedores(supabase_client), left_on="proveedor_id", right_on="id")
+            df_rank = df_rank.sort_values("num_contratos", ascending=False)
+
+    if not hay_contratos:
         return "No hay contratos registrados."
-
-    df_group = df_contr.groupby("proveedor_id").size().reset_index(name="num_contratos")
-    resp_prov = supabase_client.table("proveedores").select("*").execute()
-    df_prov = pd.DataFrame(resp_prov.data or [])
-    df_merge = df_group.merge(df_prov, left_on="proveedor_id", right_on="id")
-    df_merge = df_merge.sort_values("num_contratos", ascending=False)
-    if df_merge.empty:
+    if df_rank.empty:
         return "No encontré proveedores."
-
-    lines = []
-    for _, row in df_merge.iterrows():
-        lines.append(f"- {row['nombre_proveedor']}: {row['num_contratos']} contratos")
-    top = df_merge.iloc[0]
+    lines = [f"- {row['nombre_proveedor']}: {row['num_contratos']} contratos" for _, row in df_rank.iterrows()]
+    top = df_rank.iloc[0]
     return ("Ranking de proveedores por número de contratos:\n"
             + "\n".join(lines)
             + f"\n\nEl que más tiene es {top['nombre_proveedor']} con {top['num_contratos']}.")
 
 def factura_mas_reciente(supabase_client: Client) -> str:
-    df_fact = get_facturas(supabase_client)
-    if df_fact.empty:
+    if _usa_sql(supabase_client):
+        df_fact = _sql(supabase_client,
+            f"SELECT numero_factura, fecha_factura, {_centimos_sql('total')} AS total, concepto FROM facturas "
+            "WHERE fecha_factura IS NOT NULL ORDER BY fecha_factura DESC, id LIMIT 1")
+        hay_facturas = not df_fact.empty or not _vacia(supabase_client, "facturas")
+        df_fact = df_fact.assign(total=_enteros(df_fact["total"]))
+    else:
+        df_fact = get_facturas(supabase_client, centimos=True)
+        hay_facturas = not df_fact.empty
+        if hay_facturas:
+            df_fact["fecha_factura"] = pd.to_datetime(df_fact["fecha_factura"], errors="coerce")
+            df_fact = df_fact.dropna(subset=["fecha_factura"])
+            df_fact = df_fact.loc[[df_fact["fecha_factura"].idxmax()]] if not df_fact.empty else df_fact
+
+    if not hay_facturas:
         return "No hay facturas registradas."
-
-    df_fact["fecha_factura"] = pd.to_datetime(df_fact["fecha_factura"], errors="coerce")
-    df_fact = df_fact.dropna(subset=["fecha_factura"])
     if df_fact.empty:
         return "No hay facturas con fecha válida."
-
-    row = df_fact.loc[df_fact["fecha_factura"].idxmax()]
+    row = df_fact.iloc[0]
     return (f"La factura más reciente es '{row['numero_factura']}' "
-            f"(fecha: {row['fecha_factura']}) con total {row['total']}. "
+            f"(fecha: {pd.Timestamp(row['fecha_factura'])}) con total {formatear(row['total'])}. "
             f"Concepto: {row.get('concepto','(sin concepto)')}")
 
 def gasto_en_rango_fechas(supabase_client: Client, fecha_inicio: str, fecha_fin: str) -> str:
@@ -68,17 +195,23 @@ def gasto_en_rango_fechas(supabase_client: Client, fecha_inicio: str, fecha_fin:
     except ValueError:
         return "No pude parsear las fechas. Usa dd/mm/yyyy."
 
-    df_fact = get_facturas(supabase_client)
-    if df_fact.empty:
+    if _usa_sql(supabase_client):
+        row = _sql(supabase_client,
+            "SELECT count(*) AS n_total, "
+            f"coalesce(sum({_centimos_sql('total')}) FILTER (WHERE fecha_factura >= %(fi)s AND fecha_factura <= %(ff)s), 0) AS suma "
+            "FROM facturas",
+            {"fi": fi.strftime("%Y-%m-%d"), "ff": ff.strftime("%Y-%m-%d")}).to_dict("records")[0]
+        n_total, suma = row["n_total"], _enteros([row["suma"]])[0]
+    else:
+        df_fact = get_facturas(supabase_client, "fecha_factura,total", centimos=True)
+        n_total, suma = len(df_fact), 0
+        if n_total:
+            fechas = pd.to_datetime(df_fact["fecha_factura"], errors="coerce")
+            suma = df_fact["total"].to_numpy()[((fechas >= fi) & (fechas <= ff)).to_numpy()].sum()
+
+    if n_total == 0:
         return "No hay facturas."
-
-    df_fact["fecha_factura"] = pd.to_datetime(df_fact["fecha_factura"], errors="coerce")
-    df_fact["total"] = pd.to_numeric(df_fact["total"], errors="coerce").fillna(0)
-    df_fact = df_fact.dropna(subset=["fecha_factura"])
-
-    df_fil = df_fact[(df_fact["fecha_factura"] >= fi) & (df_fact["fecha_factura"] <= ff)]
-    suma = df_fil["total"].sum()
-    return f"El gasto total entre {fecha_inicio} y {fecha_fin} es {suma:.2f}."
+    return f"El gasto total entre {fecha_inicio} y {fecha_fin} es {formatear(suma)}."
 
 def contratos_vencen_antes_de(supabase_client: Client, fecha_limite: str) -> str:
     fmt = "%d/%m/%Y"
@@ -87,74 +220,108 @@ def contratos_vencen_antes_de(supabase_client: Client, fecha_limite: str) -> str
     except ValueError:
         return "No pude parsear la fecha (dd/mm/yyyy)."
 
-    df_contr = get_contratos(supabase_client)
-    if df_contr.empty:
+    if _usa_sql(supabase_client):
+        df_fil = _sql(supabase_client,
+            "SELECT id, centro, fecha_vencimiento FROM contratos "
+            "WHERE fecha_vencimiento < %(fl)s ORDER BY id",
+            {"fl": fl.strftime("%Y-%m-%d")})
+        hay_contratos = not df_fil.empty or not _vacia(supabase_client, "contratos")
+    else:
+        indice = indice_intervalos(supabase_client)
+        hay_contratos = bool(indice.n_contratos)
+        df_fil = indice.vencen_antes_de(fl).copy() if hay_contratos else pd.DataFrame()
+
+    if not hay_contratos:
         return "No hay contratos."
-
-    df_contr["fecha_vencimiento"] = pd.to_datetime(df_contr["fecha_vencimiento"], errors="coerce")
-    df_contr = df_contr.dropna(subset=["fecha_vencimiento"])
-    df_fil = df_contr[df_contr["fecha_vencimiento"] < fl]
     if df_fil.empty:
         return f"Ningún contrato vence antes de {fecha_limite}."
-    lines = []
-    for _, row in df_fil.iterrows():
-        lines.append(f"- Contrato ID {row['id']}, centro={row['centro']}, vence={row['fecha_vencimiento']}")
+    df_fil["fecha_vencimiento"] = pd.to_datetime(df_fil["fecha_vencimiento"])
+    lines = [f"- Contrato ID {row['id']}, centro={row['centro']}, vence={row['fecha_vencimiento']}"
+             for _, row in df_fil.iterrows()]
     return (f"Hay {len(df_fil)} contratos que vencen antes de {fecha_limite}:\n" + "\n".join(lines))
 
+MAX_CANDIDATOS = 8  # los que se listan cuando un nombre es ambiguo
+
+def _entidad(supabase_client: Client, tipo: str, texto: str):
+    """
+    Resuelve un proveedor/centro con el índice de nombres. Devuelve (resolucion, None)
+    si hay una sola entidad posible, o (None, mensaje) para pedir al usuario que elija
+    entre los candidatos o avisar de que no existe: nunca se suma sobre varias a la vez.
+    Las respuestas nombran res.nombre, que es la entidad resuelta y no lo que se escribió.
+    """
+    res = indice_nombres(supabase_client).resolucion(tipo, texto)
+    if res.ids:
+        return res, None
+    varios, ninguno = {"proveedor": ("varios proveedores", "ningún proveedor"),
+                       "centro": ("varias residencias", "ninguna residencia")}[tipo]
+    nombres = [c.nombre for c in res.candidatos]
+    if res.ambigua:
+        lista = ", ".join(nombres[:MAX_CANDIDATOS])
+        if len(nombres) > MAX_CANDIDATOS:
+            lista += f" (y {len(nombres) - MAX_CANDIDATOS} más)"
+        return None, f"Hay {varios} que coinciden con '{texto}': {lista}. ¿A cuál te refieres?"
+    mensaje = f"No encontré {ninguno} que coincida con '{texto}'."
+    if nombres:
+        sugerencias = " o ".join([", ".join(nombres[:-1]), nombres[-1]] if len(nombres) > 1 else nombres)
+        mensaje += f" ¿Quizá te refieres a {sugerencias}?"
+    return None, mensaje
+
 def gasto_proveedor_en_year(supabase_client: Client, proveedor: str, year: int) -> str:
     """
-    Filtra facturas de un proveedor (buscando substring en 'nombre_proveedor')
-    y el año (en 'fecha_factura'), sumando 'total'.
+    Filtra facturas de un proveedor (resuelto con el índice de nombres: exacto,
+    o una única entidad por substring o erratas) y el año (en 'fecha_factura'), sumando 'total'.
     """
-    # 1) Buscar ID del proveedor por substring
-    resp_prov = supabase_client.table("proveedores").select("*").execute()
-    df_prov = pd.DataFrame(resp_prov.data or [])
-    if df_prov.empty:
+    # 1) Resolver el proveedor (un mismo nombre puede tener varios ids)
+    if not indice_nombres(supabase_client).n_entradas("proveedor"):
         return "No hay proveedores."
-
-    df_prov["nombre_lower"] = df_prov["nombre_proveedor"].str.lower()
-    match = df_prov[df_prov["nombre_lower"].str.contains(proveedor.lower())]
-    if match.empty:
-        return f"No encontré un proveedor que coincida con '{proveedor}'."
-
-    # Podría haber varios, cogemos todos
-    prov_ids = match["id"].unique().tolist()
-
-    # 2) Contratos con esos proveedores
-    df_contr = get_contratos(supabase_client)
-    df_contr = df_contr[df_contr["proveedor_id"].isin(prov_ids)]
-    if df_contr.empty:
+    res, aviso = _entidad(supabase_client, "proveedor", proveedor)
+    if aviso:
+        return aviso
+    prov_ids, proveedor = res.ids, res.nombre
+
+    # 2) Contratos con esos proveedores y 3) sus facturas del año
+    if _usa_sql(supabase_client):
+        desde, hasta = _rango_year(year)
+        en_prov, params = _en_lista("p", prov_ids)
+        row = _sql(supabase_client,
+            f"WITH c AS (SELECT id FROM contratos WHERE proveedor_id IN ({en_prov})), "
+            f"f AS (SELECT {_centimos_sql('total')} AS total FROM facturas WHERE contrato_id IN (SELECT id FROM c) "
+            "      AND fecha_factura >= %(desde)s AND fecha_factura < %(hasta)s) "
+            "SELECT (SELECT count(*) FROM c) AS n_contr, "
+            "(SELECT count(*) FROM f) AS n_fact, (SELECT coalesce(sum(total), 0) FROM f) AS suma",
+            {**params, "desde": desde, "hasta": hasta}).to_dict("records")[0]
+        n_contr, n_fact, suma = row["n_contr"], row["n_fact"], _enteros([row["suma"]])[0]
+    else:
+        df_contr = get_contratos(supabase_client, "id,proveedor_id")
+        cids = df_contr.loc[df_contr["proveedor_id"].isin(prov_ids), "id"].unique()
+        df_fact = _facturas_del_year(supabase_client, cids, year, "total")
+        n_contr, n_fact, suma = len(cids), len(df_fact), df_fact["total"].sum()
+
+    if n_contr == 0:
         return f"No hay contratos con proveedor '{proveedor}'."
-
-    cids = df_contr["id"].unique().tolist()
-
-    # 3) Facturas de esos contratos en el year
-    df_fact = get_facturas(supabase_client)
-    df_fact = df_fact[df_fact["contrato_id"].isin(cids)]
-    df_fact["fecha_factura"] = pd.to_datetime(df_fact["fecha_factura"], errors="coerce")
-    df_fact["year"] = df_fact["fecha_factura"].dt.year
-    df_fact["total"] = pd.to_numeric(df_fact["total"], errors="coerce").fillna(0)
-    df_fact = df_fact[df_fact["year"] == year]
-
-    if df_fact.empty:
+    if n_fact == 0:
         return f"No hay facturas de '{proveedor}' en el año {year}."
-
-    suma = df_fact["total"].sum()
     return (f"En {year}, para el proveedor '{proveedor}', "
-            f"hay {len(df_fact)} facturas con un total de {suma:.2f}.")
+            f"hay {n_fact} facturas con un total de {formatear(suma)}.")
 
 def facturas_mas_elevadas(supabase_client: Client, top_n: int=5) -> str:
     """
     Retorna las facturas con mayor 'total' (por defecto, top 5).
     """
-    df_fact = get_facturas(supabase_client)
+    if _usa_sql(supabase_client):
+        df_fact = _sql(supabase_client,
+            f"SELECT numero_factura, coalesce({_centimos_sql('total')}, 0) AS total FROM facturas "
+            "ORDER BY coalesce(total, 0) DESC, id LIMIT %(top_n)s",
+            {"top_n": int(top_n)})
+        df_fact = df_fact.assign(total=_enteros(df_fact["total"]))
+    else:
+        df_fact = get_facturas(supabase_client, "numero_factura,total", centimos=True)
+        if not df_fact.empty:
+            df_fact = df_fact.sort_values("total", ascending=False).head(top_n)
+
     if df_fact.empty:
         return "No hay facturas."
-    df_fact["total"] = pd.to_numeric(df_fact["total"], errors="coerce").fillna(0)
-    df_fact = df_fact.sort_values("total", ascending=False).head(top_n)
-    lines = []
-    for _, row in df_fact.iterrows():
-        lines.append(f"- Factura '{row['numero_factura']}' total={row['total']}")
+    lines = [f"- Factura '{row['numero_factura']}' total={formatear(row['total'])}" for _, row in df_fact.iterrows()]
     return (f"Las {top_n} facturas más elevadas son:\n" + "\n".join(lines))
 
 def ranking_proveedores_por_importe(supabase_client: Client, limit: int=5, year: int=None) -> str:
@@ -163,54 +330,60 @@ def ranking_proveedores_por_importe(supabase_client: Client, limit: int=5, year:
     - limit: cuántos mostrar
     - year: si se especifica, filtra por ese año
     """
-    df_fact = get_facturas(supabase_client)
-    if df_fact.empty:
-        return "No hay facturas."
-    df_fact["fecha_factura"] = pd.to_datetime(df_fact["fecha_factura"], errors="coerce")
-    df_fact["total"] = pd.to_numeric(df_fact["total"], errors="coerce").fillna(0)
-    if year:
-        df_fact["year"] = df_fact["fecha_factura"].dt.year
-        df_fact = df_fact[df_fact["year"] == year]
-
-    # Contratos => para vincular a proveedores
-    df_contr = get_contratos(supabase_client)
-    df_merge = df_fact.merge(df_contr, left_on="contrato_id", right_on="id", suffixes=("_fact","_contr"))
-    if df_merge.empty:
+    if _usa_sql(supabase_client):
+        desde, hasta = _rango_year(year)
+        filtro = "WHERE f.fecha_factura >= %(desde)s AND f.fecha_factura < %(hasta)s " if year else ""
+        df_rank = _sql(supabase_client,
+            f"SELECT p.nombre_proveedor, sum({_centimos_sql('f.total')}) AS total "
+            "FROM facturas f JOIN contratos c ON f.contrato_id = c.id "
+            "JOIN proveedores p ON c.proveedor_id = p.id "
+            + filtro +
+            "GROUP BY p.nombre_proveedor ORDER BY total DESC, p.nombre_proveedor LIMIT %(limit)s",
+            {"desde": desde, "hasta": hasta, "limit": int(limit)})
+        df_rank = df_rank.assign(total=_enteros(df_rank["total"]))
+    else:
+        df_fact = get_facturas(supabase_client, "contrato_id,fecha_factura,total", centimos=True)
+        df_rank = pd.DataFrame()
+        if not df_fact.empty:
+            if year:
+                df_fact = df_fact[pd.to_datetime(df_fact["fecha_factura"], errors="coerce").dt.year == year]
+            # Facturas -> contratos -> proveedores
+            df_merge = df_fact.merge(get_contratos(supabase_client, "id,proveedor_id"),
+                                     left_on="contrato_id", right_on="id", suffixes=("_fact", "_contr"))
+            df_prov = get_proveedores(supabase_client)[["id", "nombre_proveedor"]]
+            df_merge = df_merge.merge(df_prov, left_on="proveedor_id", right_on="id", suffixes=("_ctr", "_prov"))
+            df_rank = df_merge.groupby("nombre_proveedor")["total"].sum().reset_index()
+            df_rank = df_rank.sort_values("total", ascending=False).head(limit)
+
+    if df_rank.empty:
         return "No encontré facturas con contratos asociados."
-
-    # Merge con proveedores
-    resp_prov = supabase_client.table("proveedores").select("*").execute()
-    df_prov = pd.DataFrame(resp_prov.data or [])
-    df_merge = df_merge.merge(df_prov, left_on="proveedor_id", right_on="id", suffixes=("_ctr","_prov"))
-    if df_merge.empty:
-        return "No encontré proveedores asociados a estas facturas."
-
-    # Agrupar por 'nombre_proveedor', sum de total
-    df_rank = df_merge.groupby("nombre_proveedor")["total"].sum().reset_index()
-    df_rank = df_rank.sort_values("total", ascending=False).head(limit)
-    lines = []
-    for _, row in df_rank.iterrows():
-        lines.append(f"- {row['nombre_proveedor']}: {row['total']:.2f}")
+    lines = [f"- {row['nombre_proveedor']}: {formatear(row['total'])}" for _, row in df_rank.iterrows()]
     return ("Ranking de proveedores por importe:\n" + "\n".join(lines))
 
 def top_conceptos_global(supabase_client: Client) -> pd.DataFrame:
     """
     Retorna un ranking de conceptos con sum(total).
     """
-    df_fact = get_facturas(supabase_client)
-    if df_fact.empty:
-        return pd.DataFrame()
-
-    df_fact["total"] = pd.to_numeric(df_fact["total"], errors="coerce").fillna(0)
-    df_group = df_fact.groupby("concepto")["total"].sum().reset_index()
-    df_group = df_group.sort_values("total", ascending=False)
-    return df_group
+    if _usa_sql(supabase_client):
+        df_group = _sql(supabase_client,
+            f"SELECT concepto, sum({_centimos_sql('total')}) AS total FROM facturas "
+            "WHERE concepto IS NOT NULL GROUP BY concepto ORDER BY total DESC")
+        df_group = df_group.assign(total=_enteros(df_group["total"]))
+    else:
+        df_fact = get_facturas(supabase_client, "concepto,total", centimos=True)
+        if df_fact.empty:
+            return pd.DataFrame()
+        df_group = df_fact.groupby("concepto")["total"].sum().reset_index()
+        df_group = df_group.sort_values("total", ascending=False)
+
+    # Se suma en céntimos; el DataFrame que se muestra va en euros
+    return df_group.assign(total=a_euros(df_group["total"]))
 
 def get_facturas_pendientes(supabase_client: Client) -> str:
     """
     Devuelve las facturas pendientes de pago.
     """
-    df_fact = get_facturas(supabase_client)
+    df_fact = get_facturas(supabase_client, centimos=True)
     if df_fact.empty:
         return "No hay facturas registradas."
     
@@ -219,13 +392,13 @@ def get_facturas_pendientes(supabase_client: Client) -> str:
         return "No hay facturas pendientes de pago."
     
     total_pendiente = df_fact["total"].sum()
-    return f"Hay {len(df_fact)} facturas pendientes con un total de {total_pendiente:.2f} €."
+    return f"Hay {len(df_fact)} facturas pendientes con un total de {formatear(total_pendiente)} €."
 
 def get_gastos_por_mes_categoria(supabase_client: Client) -> pd.DataFrame:
     """
     Devuelve un resumen de gastos agrupados por mes y categoría.
     """
-    df_fact = get_facturas(supabase_client)
+    df_fact = get_facturas(supabase_client, centimos=True)
     if df_fact.empty:
         return "No hay facturas registradas."
     
@@ -234,30 +407,39 @@ def get_gastos_por_mes_categoria(supabase_client: Client) -> pd.DataFrame:
     df_fact["mes"] = df_fact["fecha_factura"].dt.strftime("%Y-%m")
     
     df_resumen = df_fact.groupby(["mes", "categoria"])["total"].sum().reset_index()
+    df_resumen["total"] = a_euros(df_resumen["total"])
     return df_resumen
 
 def get_gastos_por_residencia(supabase_client: Client, residencia: str) -> str:
     """
     Devuelve el gasto total de una residencia específica.
     """
-    df_fact = get_facturas(supabase_client)
-    df_contr = get_contratos(supabase_client)
-    
-    df_merge = df_fact.merge(df_contr, left_on="contrato_id", right_on="id")
-    df_merge = df_merge[df_merge["centro"] == residencia]
-    
-    if df_merge.empty:
+    res, aviso = _entidad(supabase_client, "centro", residencia)
+    if aviso:
+        return aviso
+    cids, residencia = res.ids, res.nombre
+
+    if _usa_sql(supabase_client):
+        en_contr, params = _en_lista("c", cids)
+        row = _sql(supabase_client,
+            f"SELECT count(*) AS n, coalesce(sum({_centimos_sql('total')}), 0) AS suma FROM facturas "
+            f"WHERE contrato_id IN ({en_contr})",
+            params).to_dict("records")[0]
+        n, total_gasto = row["n"], _enteros([row["suma"]])[0]
+    else:
+        df_fact = get_facturas(supabase_client, "contrato_id,total", centimos=True)
+        df_fact = df_fact[df_fact["contrato_id"].isin(cids)] if not df_fact.empty else df_fact
+        n, total_gasto = len(df_fact), df_fact.get("total", pd.Series(dtype="int64")).sum()
+
+    if n == 0:
         return f"No se encontraron gastos para la residencia {residencia}."
-    
-    total_gasto = df_merge["total"].sum()
-    return f"El gasto total para la residencia {residencia} es de {total_gasto:.2f} €."
+    return f"El gasto total para la residencia {residencia} es de {formatear(total_gasto)} €."
 
 def get_mantenimientos_pendientes(supabase_client: Client) -> str:
     """
     Retorna los mantenimientos programados en los próximos 30 días.
     """
-    df_mant = supabase_client.table("mantenimientos").select("*").execute()
-    df_mant = pd.DataFrame(df_mant.data or [])
+    df_mant = _tabla(supabase_client, "mantenimientos")
     
     if df_mant.empty:
         return "No hay mantenimientos programados."
@@ -273,35 +455,48 @@ def get_proveedores_con_contratos_vigentes(supabase_client: Client) -> pd.DataFr
     """
     Devuelve un listado de proveedores con contratos activos.
     """
-    df_contr = get_contratos(supabase_client)
-    df_prov = supabase_client.table("proveedores").select("*").execute()
-    df_prov = pd.DataFrame(df_prov.data or [])
+    if _usa_sql(supabase_client):
+        return _sql(supabase_client,
+            "SELECT p.nombre_proveedor, c.fecha_vencimiento "
+            "FROM contratos c JOIN proveedores p ON c.proveedor_id = p.id "
+            "WHERE (c.fecha_contrato IS NULL OR c.fecha_contrato <= %(hoy)s) "
+            "AND c.fecha_vencimiento > %(hoy)s ORDER BY c.id",
+            {"hoy": datetime.today().strftime("%Y-%m-%d")})
+
+    # Vigente hoy: fecha_contrato <= hoy < fecha_vencimiento (búsqueda binaria en el índice de fechas)
+    df_contr = indice_intervalos(supabase_client).vigentes_en(datetime.today())
+    df_prov = get_proveedores(supabase_client)
     
     df_merge = df_contr.merge(df_prov, left_on="proveedor_id", right_on="id")
-    df_merge = df_merge[df_merge["fecha_vencimiento"] > datetime.today().strftime("%Y-%m-%d")]
     return df_merge[["nombre_proveedor", "fecha_vencimiento"]]
 
 def get_facturas_por_proveedor(supabase_client: Client, proveedor: str, year: int) -> str:
     """
     Retorna las facturas de un proveedor específico en un año.
     """
-    df_fact = get_facturas(supabase_client)
-    df_fact["fecha_factura"] = pd.to_datetime(df_fact["fecha_factura"], errors="coerce")
-    df_fact["year"] = df_fact["fecha_factura"].dt.year
-    df_fact = df_fact[(df_fact["year"] == year) & (df_fact["proveedor"] == proveedor)]
-    
+    res, aviso = _entidad(supabase_client, "proveedor", proveedor)
+    if aviso:
+        return aviso
+    proveedor = res.nombre
+    df_fact = _facturas_de_proveedores(supabase_client, res.ids, year, "total")
     if df_fact.empty:
         return f"No hay facturas de {proveedor} en {year}."
     
     total = df_fact["total"].sum()
-    return f"El total facturado por {proveedor} en {year} es de {total:.2f} €."
+    return f"El total facturado por {proveedor} en {year} es de {formatear(total)} €."
 
 def get_contratos_vencen_proximos_meses(supabase_client: Client) -> str:
-    df_contr = get_contratos(supabase_client)
-    df_contr["fecha_vencimiento"] = pd.to_datetime(df_contr["fecha_vencimiento"], errors="coerce")
-    df_contr.dropna(subset=["fecha_vencimiento"], inplace=True)
-    fecha_limite = datetime.today() + timedelta(days=180)
-    df_contr = df_contr[df_contr["fecha_vencimiento"] <= fecha_limite]
+    # Entre hoy y dentro de 180 días (los ya vencidos no "vencen en los próximos meses")
+    hoy = datetime.today()
+    fecha_limite = hoy + timedelta(days=180)
+    if _usa_sql(supabase_client):
+        df_contr = _sql(supabase_client,
+            "SELECT id, centro, fecha_vencimiento FROM contratos "
+            "WHERE fecha_vencimiento >= %(hoy)s AND fecha_vencimiento <= %(limite)s ORDER BY id",
+            {"hoy": hoy.strftime("%Y-%m-%d"), "limite": fecha_limite.strftime("%Y-%m-%d")})
+    else:
+        df_contr = indice_intervalos(supabase_client).vencen_entre(hoy, fecha_limite).copy()
+    df_contr["fecha_vencimiento"] = pd.to_datetime(df_contr["fecha_vencimiento"])
     
     if df_contr.empty:
         return "No hay contratos próximos a vencer."
@@ -315,45 +510,105 @@ def get_top_centros_mayores_gastos(supabase_client: Client, year: int) -> pd.Dat
     """
     Retorna los 5 centros con mayores gastos en un año.
     """
-    df_fact = get_facturas(supabase_client)
-    df_contr = get_contratos(supabase_client)
-    df_fact["fecha_factura"] = pd.to_datetime(df_fact["fecha_factura"], errors="coerce")
-    df_fact["year"] = df_fact["fecha_factura"].dt.year
-    
-    df_merge = df_fact.merge(df_contr, left_on="contrato_id", right_on="id")
-    df_merge = df_merge[df_merge["year"] == year]
-    df_top = df_merge.groupby("centro")["total"].sum().reset_index().sort_values("total", ascending=False).head(5)
-    return df_top
+    if _usa_sql(supabase_client):
+        desde, hasta = _rango_year(year)
+        df_top = _sql(supabase_client,
+            f"SELECT c.centro, sum({_centimos_sql('f.total')}) AS total "
+            "FROM facturas f JOIN contratos c ON f.contrato_id = c.id "
+            "WHERE f.fecha_factura >= %(desde)s AND f.fecha_factura < %(hasta)s "
+            "GROUP BY c.centro ORDER BY total DESC, c.centro LIMIT 5",
+            {"desde": desde, "hasta": hasta})
+        df_top = df_top.assign(total=_enteros(df_top["total"]))
+    else:
+        df_fact = get_facturas(supabase_client, "contrato_id,fecha_factura,total", centimos=True)
+        df_contr = get_contratos(supabase_client, "id,centro")
+        df_fact["fecha_factura"] = pd.to_datetime(df_fact["fecha_factura"], errors="coerce")
+        df_fact["year"] = df_fact["fecha_factura"].dt.year
+
+        df_merge = df_fact.merge(df_contr, left_on="contrato_id", right_on="id")
+        df_merge = df_merge[df_merge["year"] == year]
+        df_top = df_merge.groupby("centro")["total"].sum().reset_index().sort_values("total", ascending=False).head(5)
+
+    return df_top.assign(total=a_euros(df_top["total"]))
+
+def _contratos_mas_costosos(supabase_client: Client, n: int) -> pd.DataFrame:
+    """
+    Los n contratos de mayor importe (centro, importe en céntimos, fecha_vencimiento).
+    """
+    if _usa_sql(supabase_client):
+        df_top = _sql(supabase_client,
+            f"SELECT centro, coalesce({_centimos_sql('importe')}, 0) AS importe, fecha_vencimiento FROM contratos "
+            "ORDER BY coalesce(importe, 0) DESC, id LIMIT %(n)s",
+            {"n": int(n)})
+        return df_top.assign(importe=_enteros(df_top["importe"]))
+
+    df_contr = get_contratos(supabase_client, "id,centro,importe,fecha_vencimiento", centimos=True)
+    if df_contr.empty:
+        return df_contr
+    # Estable: entre importes iguales gana el primero, como ORDER BY importe DESC, id
+    return df_contr.sort_values("importe", ascending=False, kind="stable").head(n)
 
 def contrato_mas_costoso(supabase_client: Client) -> str:
     """
     Retorna el contrato con el importe más alto.
     """
-    df_contr = get_contratos(supabase_client)
-    if df_contr.empty:
+    df_top = _contratos_mas_costosos(supabase_client, 1)
+    if df_top.empty:
         return "No hay contratos registrados."
 
-    df_contr["importe"] = pd.to_numeric(df_contr["importe"], errors="coerce").fillna(0)
-    contrato_top = df_contr.loc[df_contr["importe"].idxmax()]
-
+    contrato_top = df_top.iloc[0]
     return (f"El contrato más costoso es con {contrato_top['centro']} por un importe de "
-            f"{contrato_top['importe']:.2f} € y vence el {contrato_top['fecha_vencimiento']}.")
+            f"{formatear(contrato_top['importe'])} € y vence el {_fecha_iso(contrato_top['fecha_vencimiento'])}.")
+
+def _facturas_del_year(supabase_client: Client, contrato_ids, year: int, columnas: str) -> pd.DataFrame:
+    """
+    Facturas del año de esos contratos, con el dinero en céntimos (rama pandas).
+    """
+    df_fact = get_facturas(supabase_client, f"contrato_id,fecha_factura,{columnas}", centimos=True)
+    if df_fact.empty:
+        return pd.DataFrame(columns=columnas.split(","))
+    df_fact = df_fact[df_fact["contrato_id"].isin(contrato_ids)]
+    years = pd.to_datetime(df_fact["fecha_factura"], errors="coerce").dt.year
+    return df_fact[years == year][columnas.split(",")]
+
+def _facturas_de_proveedores(supabase_client: Client, prov_ids: list, year: int, columnas: str) -> pd.DataFrame:
+    """
+    Facturas del año de los proveedores dados (ya resueltos con _entidad;
+    facturas no tiene columna de proveedor: se llega por contratos).
+    El dinero vuelve en céntimos int64, también por SQL.
+    """
+    if _usa_sql(supabase_client):
+        desde, hasta = _rango_year(year)
+        en_prov, params = _en_lista("p", prov_ids)
+        dinero = set(COLUMNAS_DINERO["facturas"])
+        seleccion = ", ".join(f"{_centimos_sql('f.' + c)} AS {c}" if c in dinero else f"f.{c}" for c in columnas.split(","))
+        df = _sql(supabase_client,
+            f"SELECT {seleccion} FROM facturas f "
+            "JOIN contratos c ON f.contrato_id = c.id "
+            f"WHERE c.proveedor_id IN ({en_prov}) "
+            "AND f.fecha_factura >= %(desde)s AND f.fecha_factura < %(hasta)s ORDER BY f.id",
+            {**params, "desde": desde, "hasta": hasta})
+        return df.assign(**{c: _enteros(df[c]) for c in df.columns if c in dinero})
+
+    df_contr = get_contratos(supabase_client, "id,proveedor_id")
+    cids = df_contr.loc[df_contr["proveedor_id"].isin(prov_ids), "id"]
+    return _facturas_del_year(supabase_client, cids, year, columnas)
 
 def facturas_de_proveedor(supabase_client: Client, proveedor: str, year: int) -> str:
     """
     Devuelve todas las facturas de un proveedor en un año específico.
     """
-    df_fact = get_facturas(supabase_client)
-    df_fact["fecha_factura"] = pd.to_datetime(df_fact["fecha_factura"], errors="coerce")
-    df_fact["year"] = df_fact["fecha_factura"].dt.year
-
-    df_filtradas = df_fact[(df_fact["year"] == year) & (df_fact["proveedor"] == proveedor)]
+    res, aviso = _entidad(supabase_client, "proveedor", proveedor)
+    if aviso:
+        return aviso
+    proveedor = res.nombre
+    df_filtradas = _facturas_de_proveedores(supabase_client, res.ids, year, "numero_factura,total")
     
     if df_filtradas.empty:
         return f"No hay facturas para {proveedor} en {year}."
 
     facturas_list = "\n".join(
-        [f"- Factura {row['numero_factura']}: {row['total']} €" for _, row in df_filtradas.iterrows()]
+        [f"- Factura {row['numero_factura']}: {formatear(row['total'])} €" for _, row in df_filtradas.iterrows()]
     )
     
     return f"Facturas de {proveedor} en {year}:\n{facturas_list}"
@@ -362,7 +617,7 @@ def gasto_por_tipo_servicio(supabase_client: Client, tipo_servicio: str) -> str:
     """
     Calcula el total gastado en un tipo de servicio específico (ejemplo: 'electricidad', 'limpieza').
     """
-    df_fact = get_facturas(supabase_client)
+    df_fact = get_facturas(supabase_client, centimos=True)
     df_contr = get_contratos(supabase_client)
     
     df_merge = df_fact.merge(df_contr, left_on="contrato_id", right_on="id")
@@ -372,13 +627,13 @@ def gasto_por_tipo_servicio(supabase_client: Client, tipo_servicio: str) -> str:
         return f"No hay gastos registrados en {tipo_servicio}."
 
     total_gasto = df_filtrados["total"].sum()
-    return f"El total gastado en {tipo_servicio} es de {total_gasto:.2f} €."
+    return f"El total gastado en {tipo_servicio} es de {formatear(total_gasto)} €."
 
 def ranking_tipos_servicios(supabase_client: Client) -> str:
     """
     Muestra los tipos de servicio con mayor gasto total.
     """
-    df_fact = get_facturas(supabase_client)
+    df_fact = get_facturas(supabase_client, centimos=True)
     df_contr = get_contratos(supabase_client)
 
     df_merge = df_fact.merge(df_contr, left_on="contrato_id", right_on="id")
@@ -389,7 +644,7 @@ def ranking_tipos_servicios(supabase_client: Client) -> str:
         return "No hay datos suficientes para generar el ranking de servicios."
 
     ranking_list = "\n".join(
-        [f"- {row['tipo_servicio']}: {row['total']:.2f} €" for _, row in df_ranking.iterrows()]
+        [f"- {row['tipo_servicio']}: {formatear(row['total'])} €" for _, row in df_ranking.iterrows()]
     )
     
     return f"Ranking de tipos de servicios más costosos:\n{ranking_list}"
@@ -398,15 +653,41 @@ def top_contratos_mas_costosos(supabase_client: Client) -> str:
     """
     Retorna los 3 contratos activos con mayor importe.
     """
-    df_contr = get_contratos(supabase_client)
-    if df_contr.empty:
+    df_top = _contratos_mas_costosos(supabase_client, 3)
+    if df_top.empty:
         return "No hay contratos registrados."
 
-    df_contr["importe"] = pd.to_numeric(df_contr["importe"], errors="coerce").fillna(0)
-    df_top = df_contr.sort_values("importe", ascending=False).head(3)
-
     contratos_list = "\n".join(
-        [f"- {row['centro']}: {row['importe']} € (Vence: {row['fecha_vencimiento']})" for _, row in df_top.iterrows()]
+        [f"- {row['centro']}: {formatear(row['importe'])} € (Vence: {_fecha_iso(row['fecha_vencimiento'])})" for _, row in df_top.iterrows()]
     )
     
     return f"Top 3 contratos más costosos:\n{contratos_list}"
+
+def buscar_documentos(supabase_client: Client, consulta: str, top_n: int = 5) -> str:
+    """
+    Busca texto en los documentos de contratos y facturas (índice de indexar_documentos.py)
+    y devuelve los más relevantes con el contrato o la factura a la que pertenecen.
+    """
+    indice = cargar_indice()
+    if indice is None or not len(indice):
+        return "Todavía no hay documentos indexados (ejecuta indexar_documentos.py)."
+    if not tokenizar(consulta or ""):
+        return "Indica qué quieres buscar en los documentos."
+
+    try:
+        resultados = indice.buscar(consulta, top_n)
+    except FileNotFoundError:
+        # Otro proceso publicó versiones nuevas y borró esta mientras se buscaba
+        resultados = cargar_indice().buscar(consulta, top_n)
+    if not resultados:
+        return f"No encontré documentos que mencionen '{consulta}'."
+
+    lines = []
+    for r in resultados:
+        if r["factura_id"] is not None:
+            vinculo = f"factura {r['numero_factura']} (contrato {r['contrato_id']})"
+        else:
+            vinculo = f"contrato {r['contrato_id']}"
+        centro = f", {r['centro']}" if isinstance(r.get("centro"), str) else ""
+        lines.append(f"- {r['nombre_archivo']} · {vinculo}{centro}: {r['fragmento']}")
+    return f"Documentos más relevantes para '{consulta}':\n" + "\n".join(lines)
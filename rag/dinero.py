@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+# Columnas NUMERIC(12,2) del esquema: en memoria van como céntimos int64
+COLUMNAS_DINERO = {
+    "contratos": ("importe",),
+    "facturas": ("base_exenta", "base_general", "iva_general", "total"),
+}
+
+
+def a_centimos(valores) -> np.ndarray:
+    """
+    Euros (float, Decimal o texto) -> céntimos int64. Los vacíos cuentan como 0,
+    igual que el fillna(0) que se hacía antes de sumar.
+    """
+    serie = pd.Series(valores) if not isinstance(valores, pd.Series) else valores
+    if serie.dtype == np.int64:
+        return serie.to_numpy()
+    if serie.dtype != np.float64:
+        serie = pd.to_numeric(serie, errors="coerce")
+    euros = serie.to_numpy(dtype=np.float64, na_value=np.nan)
+    return np.rint(np.nan_to_num(euros, nan=0.0) * 100).astype(np.int64)
+
+
+def centimos_frame(df: pd.DataFrame, tabla: str) -> pd.DataFrame:
+    """
+    Convierte (en el mismo DataFrame) las columnas de dinero de la tabla a céntimos.
+    """
+    for columna in COLUMNAS_DINERO.get(tabla, ()):
+        if columna in df.columns and df[columna].dtype != np.int64:
+            df[columna] = a_centimos(df[columna])
+    return df
+
+
+def euros_frame(df: pd.DataFrame, tabla: str) -> pd.DataFrame:
+    """
+    Copia del DataFrame con el dinero otra vez en euros, para st.dataframe y gráficos.
+    """
+    dinero = {c: a_euros(df[c]) for c in COLUMNAS_DINERO.get(tabla, ())
+              if c in df.columns and df[c].dtype == np.int64}
+    return df.assign(**dinero)
+
+
+def a_euros(centimos):
+    """
+    Céntimos -> euros float, solo para mostrar (tablas, gráficos, repr de un importe).
+    """
+    if isinstance(centimos, (pd.Series, np.ndarray)):
+        return centimos / 100
+    return int(centimos) / 100
+
+
+def formatear(centimos, miles: bool = False) -> str:
+    """
+    '1234.56' (o '1,234.56' con miles=True) sin pasar por float.
+    """
+    centimos = int(centimos)
+    signo = "-" if centimos < 0 else ""
+    euros, cent = divmod(abs(centimos), 100)
+    return f"{signo}{euros:,}.{cent:02d}" if miles else f"{signo}{euros}.{cent:02d}"
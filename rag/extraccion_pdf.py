@@ -0,0 +1,247 @@
+import os
+import json
+import math
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+CACHE_DIR = os.getenv("PDF_CACHE_DIR", os.path.join(".cache", "pdf_texto"))
+CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_MB", "200")) * 1024 * 1024
+PAGINAS_POR_TAREA = 16
+
+
+def hash_contenido(data: bytes) -> str:
+    """
+    Clave de caché de un fichero: SHA-256 de su contenido.
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def _extraer_rango(ruta_pdf: str, inicio: int, fin: int) -> list:
+    """
+    Extrae el texto de las páginas [inicio, fin) de un PDF.
+    Se ejecuta en un proceso del pool, por eso abre el fichero por ruta.
+    """
+    import fitz
+
+    with fitz.open(ruta_pdf) as doc:
+        return [(i, doc[i].get_text("text")) for i in range(inicio, fin)]
+
+
+def extraer_texto(ruta: str) -> str:
+    """
+    Texto completo de un documento (PDF con PyMuPDF, o texto plano), con las páginas
+    separadas por saltos de línea. Pensada para ejecutarse en un proceso del pool.
+    """
+    if ruta.lower().endswith(".pdf"):
+        import fitz
+
+        with fitz.open(ruta) as doc:
+            return "\n".join(pagina.get_text("text") for pagina in doc)
+    with open(ruta, "r", encoding="utf-8", errors="replace") as f:
+        return f.read()
+
+
+class Extraccion:
+    """
+    Estado de la extracción de un PDF. Las páginas se van añadiendo según
+    terminan los procesos, en cualquier orden.
+    """
+
+    def __init__(self, clave: str, num_paginas: int):
+        self.clave = clave
+        self.num_paginas = num_paginas
+        self.paginas = {}
+        self.error = None
+        self.terminada = False
+        self._offsets = None
+        self._cond = threading.Condition()
+
+    def _añadir(self, lote):
+        with self._cond:
+            self.paginas.update(lote)
+            self._cond.notify_all()
+
+    def _terminar(self, error=None):
+        with self._cond:
+            self.error = error
+            self.terminada = True
+            self._cond.notify_all()
+
+    def iterar(self):
+        """
+        Genera (num_pagina, texto) según van terminando, empezando por las
+        que ya estaban extraídas. Acaba cuando termina la extracción.
+        """
+        vistas = set()
+        while True:
+            with self._cond:
+                nuevas = [(n, t) for n, t in self.paginas.items() if n not in vistas]
+                if not nuevas:
+                    if self.terminada:
+                        return
+                    self._cond.wait(timeout=0.5)
+                    continue
+            for n, t in nuevas:
+                vistas.add(n)
+                yield n, t
+
+    def texto(self) -> str:
+        return "\n".join(self.paginas.get(i, "") for i in range(self.num_paginas))
+
+    def offsets(self) -> list:
+        """
+        Posición en texto() donde empieza cada página (para citar la página de un fragmento).
+        """
+        if self._offsets is not None:
+            return self._offsets
+        offsets, posicion = [], 0
+        for i in range(self.num_paginas):
+            offsets.append(posicion)
+            posicion += len(self.paginas.get(i, "")) + 1
+        return offsets
+
+
+class ExtractorPDF:
+    """
+    Servicio de extracción de texto de PDFs:
+    - Resultados indexados por hash del contenido (no se repite en cada rerun).
+    - Páginas extraídas en paralelo en un pool de procesos, en segundo plano.
+    - Texto por página y offsets de página persistidos en disco, con expulsión por tamaño (LRU por mtime).
+    El lock solo protege el registro de trabajos: leer la caché y abrir el PDF van fuera,
+    para que una extracción no espere a otra.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES, max_workers: int = None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_workers = max_workers or os.cpu_count() or 2
+        self._pool = None
+        self._trabajos = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._pool
+
+    def extraer(self, data: bytes) -> Extraccion:
+        """
+        Devuelve la extracción del PDF: desde la caché, la que ya está en curso
+        para ese mismo contenido, o una nueva lanzada en segundo plano.
+        """
+        clave = hash_contenido(data)
+        with self._lock:
+            if clave in self._trabajos:
+                return self._trabajos[clave]
+
+        cacheada = self._leer_cache(clave)
+        if cacheada:
+            return cacheada
+
+        import fitz
+        with fitz.open(stream=data, filetype="pdf") as doc:
+            num_paginas = doc.page_count
+
+        with self._lock:
+            # Otro hilo pudo lanzar el mismo contenido mientras tanto
+            if clave in self._trabajos:
+                return self._trabajos[clave]
+            trabajo = Extraccion(clave, num_paginas)
+            self._trabajos[clave] = trabajo
+
+        threading.Thread(target=self._ejecutar, args=(trabajo, data), daemon=True).start()
+        return trabajo
+
+    def _ejecutar(self, trabajo: Extraccion, data: bytes):
+        ruta = os.path.join(self.cache_dir, f"{trabajo.clave}.pdf.tmp")
+        error = None
+        try:
+            with open(ruta, "wb") as f:
+                f.write(data)
+
+            n = trabajo.num_paginas
+            if n <= PAGINAS_POR_TAREA:
+                # Para PDFs pequeños no compensa repartir entre procesos
+                trabajo._añadir(_extraer_rango(ruta, 0, n))
+            else:
+                paso = max(1, min(PAGINAS_POR_TAREA, math.ceil(n / (self.max_workers * 2))))
+                futuros = [self._executor().submit(_extraer_rango, ruta, i, min(i + paso, n))
+                           for i in range(0, n, paso)]
+                for fut in as_completed(futuros):
+                    trabajo._añadir(fut.result())
+
+            self._guardar_cache(trabajo)
+        except Exception as e:
+            error = e
+        finally:
+            if os.path.exists(ruta):
+                os.remove(ruta)
+            with self._lock:
+                self._trabajos.pop(trabajo.clave, None)
+        trabajo._terminar(error)
+
+    # 📌 Caché en disco
+    def _ruta_cache(self, clave: str) -> str:
+        return os.path.join(self.cache_dir, f"{clave}.json")
+
+    def _leer_cache(self, clave: str):
+        ruta = self._ruta_cache(clave)
+        try:
+            with open(ruta, "r", encoding="utf-8") as f:
+                datos = json.load(f)
+            paginas, offsets = datos["paginas"], datos["offsets"]
+            if not isinstance(paginas, list) or not isinstance(offsets, list) or len(offsets) != len(paginas):
+                raise ValueError("'paginas' y 'offsets' no son listas del mismo largo")
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError):
+            # Entrada corrupta (escritura a medias, disco lleno...): se descarta y se vuelve a extraer
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+            return None
+
+        os.utime(ruta)  # marca de uso reciente para la expulsión LRU
+        trabajo = Extraccion(clave, len(paginas))
+        trabajo.paginas = dict(enumerate(paginas))
+        trabajo.terminada = True
+        trabajo._offsets = offsets
+        return trabajo
+
+    def _guardar_cache(self, trabajo: Extraccion):
+        datos = {"paginas": [trabajo.paginas.get(i, "") for i in range(trabajo.num_paginas)],
+                 "offsets": trabajo.offsets()}
+        ruta = self._ruta_cache(trabajo.clave)
+        tmp = ruta + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(datos, f, ensure_ascii=False)
+        os.replace(tmp, ruta)
+        self._expulsar()
+
+    def _expulsar(self):
+        """
+        Borra las entradas usadas hace más tiempo hasta quedar por debajo de max_bytes.
+        """
+        entradas = []
+        for nombre in os.listdir(self.cache_dir):
+            if not nombre.endswith(".json"):
+                continue
+            ruta = os.path.join(self.cache_dir, nombre)
+            try:
+                st = os.stat(ruta)
+            except OSError:
+                continue
+            entradas.append((st.st_mtime, st.st_size, ruta))
+
+        total = sum(size for _, size, _ in entradas)
+        for _, size, ruta in sorted(entradas):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(ruta)
+                total -= size
+            except OSError:
+                pass
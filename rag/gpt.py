@@ -1,7 +1,30 @@
-from openai import OpenAI
+import re
+import json
+import hashlib
+from types import SimpleNamespace
+from .trazas import span
+from . import cache_compartida
+from . import coalescencia
+
+MODELO = "gpt-4"
+
+
+def normalizar_pregunta(texto: str) -> str:
+    # Mayúsculas y espacios no cambian la intención: misma clave de caché
+    return re.sub(r"\s+", " ", (texto or "").strip().casefold())
+
+
+def _respuesta_step_1(datos: dict):
+    # Misma forma que la respuesta de openai en lo que usa pipeline.resolver_intencion
+    fn_call = SimpleNamespace(**datos["function_call"]) if datos.get("function_call") else None
+    mensaje = SimpleNamespace(content=datos.get("content"), function_call=fn_call)
+    return SimpleNamespace(choices=[SimpleNamespace(message=mensaje)], usage=None)
+
 
 class GPTFunctionCaller:
     def __init__(self, api_key: str):
+        # openai tarda ~0,5 s en importarse: solo se paga si de verdad se llama a GPT
+        from openai import OpenAI
         self.client = OpenAI(api_key=api_key)
         self.functions_spec = [
             # Consultas generales
@@ -33,25 +56,68 @@ class GPTFunctionCaller:
             {"name": "facturas_de_proveedor", "description": "Lista de facturas de un proveedor en un año.", "parameters": {"type": "object", "properties": {"proveedor": {"type": "string"}, "year": {"type": "number"}}, "required": ["proveedor", "year"]}},
             {"name": "gasto_por_tipo_servicio", "description": "Gasto total en un tipo de servicio específico.", "parameters": {"type": "object", "properties": {"tipo_servicio": {"type": "string"}}, "required": ["tipo_servicio"]}},
             {"name": "ranking_tipos_servicios", "description": "Muestra el ranking de tipos de servicio con mayor gasto total.", "parameters": {"type": "object", "properties": {}}},
-            {"name": "top_contratos_mas_costosos", "description": "Lista de los contratos más costosos actualmente activos.", "parameters": {"type": "object", "properties": {}}}
+            {"name": "top_contratos_mas_costosos", "description": "Lista de los contratos más costosos actualmente activos.", "parameters": {"type": "object", "properties": {}}},
+
+            # Documentos
+            {"name": "buscar_documentos", "description": "Busca en el texto de los documentos (PDF) de contratos y facturas y devuelve los más relevantes.", "parameters": {"type": "object", "properties": {"consulta": {"type": "string"}, "top_n": {"type": "number"}}, "required": ["consulta"]}}
         ]
 
+    def _version(self) -> str:
+        # Cambiar de modelo o de funciones invalida las respuestas cacheadas
+        return hashlib.sha256(json.dumps([MODELO, self.functions_spec], sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
     def call_step_1(self, user_message: str):
-        response = self.client.chat.completions.create(
-            model="gpt-4",
-            messages=[{"role": "user", "content": user_message}],
-            functions=self.functions_spec,
-            temperature=0
-        )
+        """
+        Elige función y argumentos. Con temperature=0 la respuesta solo depende de la
+        pregunta: la misma pregunta normalizada hace una sola llamada aunque la envíen
+        varias sesiones a la vez, y se comparte entre réplicas vía la caché compartida.
+        """
+        clave = cache_compartida.clave("gpt.step_1", self._version(), normalizar_pregunta(user_message))
+        # Solo las llamadas en vuelo: las repetidas las sirve la caché compartida (sin
+        # stale-while-revalidate, que haría otra llamada a OpenAI en segundo plano por cada acierto)
+        return coalescencia.compartir(clave, lambda: self._step_1(clave, user_message), obsoleto_s=0)
+
+    def _step_1(self, clave: str, user_message: str):
+        cacheada = cache_compartida.obtener(clave)
+        if cacheada is not None:
+            return _respuesta_step_1(cacheada)
+
+        with span("gpt.call_step_1") as s:
+            response = self.client.chat.completions.create(
+                model=MODELO,
+                messages=[{"role": "user", "content": user_message}],
+                functions=self.functions_spec,
+                temperature=0
+            )
+            if getattr(response, "usage", None):
+                s.set(tokens=response.usage.total_tokens)
+
+        mensaje = response.choices[0].message
+        fn_call = mensaje.function_call
+        cache_compartida.guardar(clave, {
+            "content": mensaje.content,
+            "function_call": {"name": fn_call.name, "arguments": fn_call.arguments} if fn_call else None,
+        }, cache_compartida.TTL_GPT_S)
         return response
 
     def call_step_2(self, function_name: str, function_result: str) -> str:
-        response = self.client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "Este es el resultado de la función local. Devuélvelo de forma clara al usuario."},
-                {"role": "assistant", "name": function_name, "content": function_result}
-            ],
-            temperature=0
-        )
-        return response.choices[0].message.content.strip()
+        clave = cache_compartida.clave("gpt.step_2", self._version(), function_name, function_result)
+        return coalescencia.compartir(clave, lambda: self._step_2(clave, function_name, function_result), obsoleto_s=0)
+
+    def _step_2(self, clave: str, function_name: str, function_result: str) -> str:
+        cacheada = cache_compartida.obtener(clave)
+        if cacheada is not None:
+            return cacheada
+
+        with span("gpt.call_step_2"):
+            response = self.client.chat.completions.create(
+                model=MODELO,
+                messages=[
+                    {"role": "system", "content": "Este es el resultado de la función local. Devuélvelo de forma clara al usuario."},
+                    {"role": "assistant", "name": function_name, "content": function_result}
+                ],
+                temperature=0
+            )
+            texto = response.choices[0].message.content.strip()
+        cache_compartida.guardar(clave, texto, cache_compartida.TTL_GPT_S)
+        return texto
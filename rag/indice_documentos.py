@@ -0,0 +1,315 @@
+import os
+import re
+import json
+import math
+import shutil
+import threading
+from functools import lru_cache
+from collections import Counter
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from .nombres import normalizar
+from .trazas import span
+
+INDICE_DIR = os.getenv("DOCS_INDEX_DIR", os.path.join(".cache", "indice_documentos"))
+VERSIONES_A_CONSERVAR = 2
+EXTENSIONES = (".pdf", ".txt")
+K1, B = 1.2, 0.75  # BM25 con los valores habituales
+LARGO_FRAGMENTO = 160
+
+# Palabras que aparecen en casi todos los documentos y no ayudan a ordenar
+STOPWORDS = set("""
+a al algo ante con contra de del desde donde durante e el en entre es esta este ha hay la las le les lo los
+mas me mi muy no o os para pero por que se sea segun si sin sobre son su sus tras un una uno unos unas y ya
+""".split())
+
+_PALABRA = re.compile(r"\w+")
+
+_cargado = {}  # directorio -> (version, IndiceDocumentos)
+_lock = threading.Lock()
+
+
+@lru_cache(maxsize=200_000)
+def _terminos_de(trozo: str) -> tuple:
+    return tuple(t for t in normalizar(trozo).split() if len(t) > 1 and t not in STOPWORDS)
+
+
+def tokenizar(texto: str) -> list:
+    """
+    Términos normalizados (sin tildes ni mayúsculas) de al menos 2 caracteres, sin stopwords.
+    Se normaliza cada palabra distinta una sola vez: en un documento largo se repiten casi todas.
+    """
+    return [t for trozo in texto.split() for t in _terminos_de(trozo)]
+
+
+def _procesar(ruta: str) -> tuple:
+    """
+    Extrae y tokeniza un documento. Se ejecuta en un proceso del pool.
+    """
+    from .extraccion_pdf import extraer_texto
+
+    try:
+        texto = extraer_texto(ruta)
+    except Exception as e:
+        return None, None, f"{type(e).__name__}: {e}"
+    return texto, Counter(tokenizar(texto)), None
+
+
+def _firma(ruta: str) -> str:
+    st = os.stat(ruta)
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+def _localizar(docs_dir: str, nombres: list) -> dict:
+    """
+    nombre_archivo -> ruta. Primero directamente bajo docs_dir y, si no está, por nombre
+    en cualquier subcarpeta (los ficheros suelen ir organizados por residencia o año).
+    """
+    por_nombre = {}
+    for raiz, _, ficheros in os.walk(docs_dir):
+        for f in ficheros:
+            por_nombre.setdefault(f, os.path.join(raiz, f))
+    rutas = {}
+    for nombre in nombres:
+        directa = os.path.join(docs_dir, nombre)
+        ruta = directa if os.path.isfile(directa) else por_nombre.get(os.path.basename(nombre))
+        if ruta and ruta.lower().endswith(EXTENSIONES):
+            rutas[nombre] = ruta
+    return rutas
+
+
+def version_actual(directorio: str = INDICE_DIR):
+    try:
+        with open(os.path.join(directorio, "ACTUAL"), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+class IndiceDocumentos:
+    """
+    Índice invertido en disco sobre el texto de los documentos de contratos y facturas:
+    - postings término -> (documentos, frecuencias) en arrays numpy contiguos,
+    - ranking BM25 vectorizado: solo se tocan los postings de los términos buscados,
+    - el texto completo queda en textos.txt y solo se lee para los fragmentos del top-n.
+    Cada documento conserva su documento_id, contrato_id y factura_id.
+    """
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        with open(os.path.join(ruta, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.documentos = meta["documentos"]
+        self.creado = meta.get("creado")
+        self._terminos = {t: i for i, t in enumerate(meta["terminos"])}
+        arrays = np.load(os.path.join(ruta, "postings.npz"))
+        self._offsets = arrays["offsets"]
+        self._docs = arrays["docs"]
+        self._tfs = arrays["tfs"]
+        self._longitudes = arrays["longitudes"].astype(np.float32)
+        self._off_textos = arrays["off_textos"]
+        self._media = float(self._longitudes.mean()) if len(self._longitudes) else 0.0
+
+    def __len__(self):
+        return len(self.documentos)
+
+    def texto(self, i: int) -> str:
+        # FileNotFoundError si otro proceso ya borró esta versión (ver cargar_indice)
+        with open(os.path.join(self.ruta, "textos.txt"), "rb") as f:
+            f.seek(int(self._off_textos[i]))
+            return f.read(int(self._off_textos[i + 1] - self._off_textos[i])).decode("utf-8")
+
+    def _fragmento(self, i: int, terminos: set) -> str:
+        texto = self.texto(i)
+        for m in _PALABRA.finditer(texto):
+            if normalizar(m.group()) in terminos:
+                inicio = max(0, m.start() - LARGO_FRAGMENTO // 2)
+                fragmento = " ".join(texto[inicio:inicio + LARGO_FRAGMENTO].split())
+                return ("…" if inicio else "") + fragmento + "…"
+        return " ".join(texto[:LARGO_FRAGMENTO].split())
+
+    def buscar(self, consulta: str, top_n: int = 5, fragmentos: bool = True) -> list:
+        """
+        Documentos más relevantes para la consulta (BM25), de mayor a menor puntuación.
+        """
+        terminos = set(tokenizar(consulta))
+        top_n = max(1, int(top_n or 5))
+        puntuacion = np.zeros(len(self.documentos), dtype=np.float32)
+        n = len(self.documentos)
+        for t in terminos:
+            i = self._terminos.get(t)
+            if i is None:
+                continue
+            docs = self._docs[self._offsets[i]:self._offsets[i + 1]]
+            tfs = self._tfs[self._offsets[i]:self._offsets[i + 1]].astype(np.float32)
+            idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            norma = K1 * (1 - B + B * self._longitudes[docs] / self._media)
+            # Un documento aparece una sola vez en los postings de cada término
+            puntuacion[docs] += idf * tfs * (K1 + 1) / (tfs + norma)
+
+        candidatos = np.flatnonzero(puntuacion)
+        if len(candidatos) > top_n:
+            candidatos = candidatos[np.argpartition(-puntuacion[candidatos], top_n - 1)[:top_n]]
+        candidatos = candidatos[np.lexsort((candidatos, -puntuacion[candidatos]))]
+
+        resultados = []
+        for i in candidatos:
+            r = {**self.documentos[i], "puntuacion": round(float(puntuacion[i]), 3)}
+            if fragmentos:
+                r["fragmento"] = self._fragmento(int(i), terminos)
+            resultados.append(r)
+        return resultados
+
+
+def construir_indice(supabase_client, docs_dir: str, directorio: str = None, max_workers: int = None) -> dict:
+    """
+    Indexa los ficheros de la tabla 'documentos' que se encuentran en docs_dir:
+    extracción en un pool de procesos (PyMuPDF), reutilizando el texto de la versión
+    anterior si el fichero no ha cambiado (tamaño y fecha), y publica una versión
+    nueva del índice cambiando el puntero ACTUAL de forma atómica. Devuelve un resumen.
+    Lee las tablas sin caché (como exportar_snapshot): suele ir justo después de ingestar.
+    """
+    from .db_queries import _leer_tabla
+    from .backends import cliente_base
+
+    directorio = directorio or INDICE_DIR
+    cliente = cliente_base(supabase_client)
+    with span("documentos.indexar") as s:
+        df_docs = _leer_tabla(cliente, "documentos", "*")
+        df_fact = _leer_tabla(cliente, "facturas", "id,contrato_id,numero_factura")
+        df_contr = _leer_tabla(cliente, "contratos", "id,centro")
+        facturas = {int(r["id"]): r for r in df_fact.to_dict("records")} if not df_fact.empty else {}
+        centros = dict(zip(df_contr["id"], df_contr["centro"])) if not df_contr.empty else {}
+
+        rutas = _localizar(docs_dir, df_docs["nombre_archivo"].dropna().unique().tolist() if not df_docs.empty else [])
+        anterior = cargar_indice(directorio)
+        previos = {(d["ruta"], d["firma"]): i for i, d in enumerate(anterior.documentos)} if anterior else {}
+
+        documentos, sin_fichero = [], 0
+        for fila in (df_docs.to_dict("records") if not df_docs.empty else []):
+            ruta = rutas.get(fila.get("nombre_archivo"))
+            if ruta is None:
+                sin_fichero += 1
+                continue
+            factura = facturas.get(int(fila["factura_id"])) if _es_id(fila.get("factura_id")) else None
+            contrato_id = fila.get("contrato_id") if _es_id(fila.get("contrato_id")) else (
+                factura["contrato_id"] if factura else None)
+            documentos.append({
+                "documento_id": int(fila["id"]),
+                "contrato_id": int(contrato_id) if _es_id(contrato_id) else None,
+                "factura_id": int(fila["factura_id"]) if factura else None,
+                "numero_factura": factura["numero_factura"] if factura else None,
+                "centro": centros.get(contrato_id),
+                "nombre_archivo": fila["nombre_archivo"],
+                "ruta": ruta,
+                "firma": _firma(ruta),
+            })
+
+        # Un mismo fichero se extrae una sola vez aunque lo referencien varios documentos
+        textos, terminos, errores, pendientes = {}, {}, {}, []
+        for clave in dict.fromkeys((d["ruta"], d["firma"]) for d in documentos):
+            try:
+                if clave in previos:
+                    textos[clave] = anterior.texto(previos[clave])
+                    terminos[clave] = Counter(tokenizar(textos[clave]))
+                    continue
+            except FileNotFoundError:
+                # Otro proceso indexando a la vez borró la versión anterior: se vuelve a extraer
+                previos = {}
+            pendientes.append(clave)
+        reutilizados = len(textos)
+
+        if pendientes:
+            with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count() or 2) as pool:
+                procesados = pool.map(_procesar, [ruta for ruta, _ in pendientes], chunksize=8)
+                for clave, (texto, tf, error) in zip(pendientes, procesados):
+                    if error:
+                        errores[clave[0]] = error
+                    else:
+                        textos[clave], terminos[clave] = texto, tf
+
+        documentos = [d for d in documentos if (d["ruta"], d["firma"]) in textos]
+        version = _escribir(directorio, documentos, textos, terminos)
+        s.set(filas=len(documentos))
+        return {"version": version, "documentos": len(documentos), "ficheros_extraidos": len(pendientes) - len(errores),
+                "ficheros_reutilizados": reutilizados, "sin_fichero": sin_fichero, "errores": errores}
+
+
+def _es_id(valor) -> bool:
+    return valor is not None and not (isinstance(valor, float) and math.isnan(valor))
+
+
+def _escribir(directorio: str, documentos: list, textos: dict, terminos: dict) -> str:
+    version = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    destino = os.path.join(directorio, version)
+    os.makedirs(destino, exist_ok=True)
+
+    vocabulario = sorted({t for d in documentos for t in terminos[(d["ruta"], d["firma"])]})
+    ids = {t: i for i, t in enumerate(vocabulario)}
+    por_termino, frecuencias, distintos, off_textos = [], [], [], [0]
+    with open(os.path.join(destino, "textos.txt"), "wb") as f:
+        for d in documentos:
+            clave = (d["ruta"], d["firma"])
+            tf = terminos[clave]
+            por_termino.append(np.fromiter(map(ids.__getitem__, tf), dtype=np.int32, count=len(tf)))
+            frecuencias.append(np.fromiter(tf.values(), dtype=np.int32, count=len(tf)))
+            distintos.append(len(tf))
+            datos = textos[clave].encode("utf-8")
+            f.write(datos)
+            off_textos.append(off_textos[-1] + len(datos))
+
+    # Postings agrupados por término (orden estable: dentro de cada término, por documento)
+    vacio = np.zeros(0, dtype=np.int32)
+    por_termino = np.concatenate(por_termino) if por_termino else vacio
+    frecuencias = np.concatenate(frecuencias) if frecuencias else vacio
+    por_doc = np.repeat(np.arange(len(documentos), dtype=np.int32), distintos)
+    longitudes = np.bincount(por_doc, weights=frecuencias, minlength=len(documentos)).astype(np.int32)
+    orden = np.argsort(por_termino, kind="stable")
+    offsets = np.zeros(len(vocabulario) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(por_termino, minlength=len(vocabulario)), out=offsets[1:])
+    np.savez(os.path.join(destino, "postings.npz"), offsets=offsets, docs=por_doc[orden], tfs=frecuencias[orden],
+             longitudes=longitudes, off_textos=np.asarray(off_textos, dtype=np.int64))
+    with open(os.path.join(destino, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"creado": datetime.now().isoformat(timespec="seconds"), "documentos": documentos,
+                   "terminos": vocabulario}, f, ensure_ascii=False)
+
+    tmp = os.path.join(directorio, "ACTUAL.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp, os.path.join(directorio, "ACTUAL"))
+
+    versiones = sorted(d for d in os.listdir(directorio) if os.path.isdir(os.path.join(directorio, d)))
+    for antigua in versiones[:-VERSIONES_A_CONSERVAR]:
+        shutil.rmtree(os.path.join(directorio, antigua), ignore_errors=True)
+    return version
+
+
+def cargar_indice(directorio: str = None):
+    """
+    Última versión publicada del índice (None si no se ha indexado nada). Se carga una
+    vez por versión y proceso: una búsqueda solo lee postings ya en memoria.
+    Solo se conservan VERSIONES_A_CONSERVAR: un índice cargado puede perder su carpeta
+    si otro proceso publica dos versiones más; quien reciba FileNotFoundError al leer
+    textos vuelve a llamar aquí y obtiene la actual.
+    """
+    directorio = directorio or INDICE_DIR
+    version = version_actual(directorio)
+    if version is None:
+        return None
+    with _lock:
+        cargado = _cargado.get(directorio)
+        if cargado is not None and cargado[0] == version:
+            return cargado[1]
+    try:
+        with span("documentos.cargar_indice") as s:
+            indice = IndiceDocumentos(os.path.join(directorio, version))
+            s.set(filas=len(indice))
+    except FileNotFoundError:
+        # Se borró entre leer ACTUAL y abrirla: ya hay otra publicada
+        if version_actual(directorio) == version:
+            raise
+        return cargar_indice(directorio)
+    with _lock:
+        _cargado[directorio] = (version, indice)
+    return indice
@@ -0,0 +1,163 @@
+import numpy as np
+import pandas as pd
+from .trazas import span
+from .versionado import por_version
+from .dinero import a_centimos, a_euros
+
+COLUMNAS = "id,proveedor_id,centro,fecha_contrato,fecha_vencimiento,importe"
+_DESDE_SIEMPRE = np.datetime64("0001-01-01", "D")  # contrato sin fecha_contrato: vigente desde siempre
+
+
+def _dia(valor) -> np.datetime64:
+    return np.datetime64(pd.Timestamp(valor).date(), "D")
+
+
+def _fechas(df: pd.DataFrame, columna: str) -> np.ndarray:
+    if columna not in df.columns:
+        return np.full(len(df), np.datetime64("NaT"), dtype="datetime64[D]")
+    return pd.to_datetime(df[columna], errors="coerce").to_numpy("datetime64[D]")
+
+
+class IndiceIntervalos:
+    """
+    Contratos como intervalos [fecha_contrato, fecha_vencimiento) sobre arrays numpy
+    ordenados. Las consultas son búsquedas binarias: O(log n + k) para listar los k
+    contratos que vencen en un rango y O(log n) por fecha para contar los vigentes
+    (series as-of). Para listar los vigentes en una fecha hay un árbol de intervalos
+    centrado: O(log n) nodos con una búsqueda binaria en cada uno, O(log² n + k),
+    sin tocar los contratos que no salen.
+    Los contratos sin fecha_vencimiento no entran (igual que el dropna de pandas).
+    """
+
+    def __init__(self, df_contr: pd.DataFrame):
+        self.n_contratos = len(df_contr)
+        venc = _fechas(df_contr, "fecha_vencimiento")
+        validos = ~np.isnat(venc)
+        # Las filas conservan el orden original: los listados salen igual que con pandas
+        self.contratos = df_contr[validos].reset_index(drop=True)
+        self._venc = venc[validos]
+        inicio = _fechas(self.contratos, "fecha_contrato")
+        self._inicio = np.where(np.isnat(inicio), _DESDE_SIEMPRE, inicio)
+
+        self._orden_venc = np.argsort(self._venc, kind="stable")
+        self._venc_ord = self._venc[self._orden_venc]
+
+        # Para contar vigentes en una fecha: empezados - vencidos, sobre los intervalos no vacíos
+        no_vacios = self._inicio < self._venc
+        # Importes en céntimos: las sumas acumuladas (y sus restas) son exactas
+        importe = (a_centimos(self.contratos["importe"])
+                   if "importe" in self.contratos.columns else np.zeros(len(self.contratos), dtype=np.int64))
+        orden_i = np.argsort(self._inicio[no_vacios], kind="stable")
+        orden_v = np.argsort(self._venc[no_vacios], kind="stable")
+        self._cnt_inicio = self._inicio[no_vacios][orden_i]
+        self._cnt_venc = self._venc[no_vacios][orden_v]
+        self._imp_inicio = np.concatenate([[0], np.cumsum(importe[no_vacios][orden_i])])
+        self._imp_venc = np.concatenate([[0], np.cumsum(importe[no_vacios][orden_v])])
+
+        # Árbol de intervalos centrado (solo los no vacíos: los vacíos nunca están vigentes)
+        self._centro, self._izq, self._der = [], [], []
+        self._nodo_inicio, self._nodo_pos_inicio = [], []
+        self._nodo_venc, self._nodo_pos_venc = [], []
+        self._nodo(np.flatnonzero(no_vacios))
+
+    def __len__(self):
+        return len(self._venc)
+
+    def _nodo(self, posiciones: np.ndarray) -> int:
+        """
+        Construye el subárbol de esas posiciones y devuelve su nodo (-1 si no hay).
+        El centro es la mediana de los inicios: cada hijo se queda con menos de la mitad.
+        """
+        if len(posiciones) == 0:
+            return -1
+        inicio, venc = self._inicio[posiciones], self._venc[posiciones]
+        centro = np.partition(inicio, len(inicio) // 2)[len(inicio) // 2]
+        aqui = posiciones[(inicio <= centro) & (venc > centro)]
+
+        n = len(self._centro)
+        self._centro.append(centro)
+        orden = np.argsort(self._inicio[aqui], kind="stable")
+        self._nodo_pos_inicio.append(aqui[orden])
+        self._nodo_inicio.append(self._inicio[aqui][orden])
+        orden = np.argsort(self._venc[aqui], kind="stable")
+        self._nodo_pos_venc.append(aqui[orden])
+        self._nodo_venc.append(self._venc[aqui][orden])
+        self._izq.append(-1)
+        self._der.append(-1)
+        self._izq[n] = self._nodo(posiciones[venc <= centro])
+        self._der[n] = self._nodo(posiciones[inicio > centro])
+        return n
+
+    def _filas(self, posiciones: np.ndarray) -> pd.DataFrame:
+        return self.contratos.iloc[np.sort(posiciones)]
+
+    def vencen_antes_de(self, fecha) -> pd.DataFrame:
+        """
+        Contratos con fecha_vencimiento < fecha.
+        """
+        k = np.searchsorted(self._venc_ord, _dia(fecha), side="left")
+        return self._filas(self._orden_venc[:k])
+
+    def vencen_entre(self, desde, hasta) -> pd.DataFrame:
+        """
+        Contratos con desde <= fecha_vencimiento <= hasta.
+        """
+        lo = np.searchsorted(self._venc_ord, _dia(desde), side="left")
+        hi = np.searchsorted(self._venc_ord, _dia(hasta), side="right")
+        return self._filas(self._orden_venc[lo:hi])
+
+    def vigentes_en(self, fecha) -> pd.DataFrame:
+        """
+        Contratos vigentes en la fecha: fecha_contrato <= fecha < fecha_vencimiento.
+        """
+        d = _dia(fecha)
+        trozos, nodo = [], 0 if self._centro else -1
+        while nodo >= 0:
+            if d < self._centro[nodo]:
+                # Todos los del nodo vencen después del centro: valen los que ya han empezado
+                k = np.searchsorted(self._nodo_inicio[nodo], d, side="right")
+                trozos.append(self._nodo_pos_inicio[nodo][:k])
+                nodo = self._izq[nodo]
+            else:
+                # Todos los del nodo empezaron antes del centro: valen los que aún no han vencido
+                k = np.searchsorted(self._nodo_venc[nodo], d, side="right")
+                trozos.append(self._nodo_pos_venc[nodo][k:])
+                nodo = self._der[nodo]
+        return self._filas(np.concatenate(trozos) if trozos else np.empty(0, dtype=np.intp))
+
+    def n_vigentes(self, fechas) -> np.ndarray:
+        """
+        Número de contratos vigentes en cada fecha, sin recorrer los contratos.
+        """
+        d = np.asarray(pd.to_datetime(fechas).to_numpy("datetime64[D]"))
+        return (np.searchsorted(self._cnt_inicio, d, side="right")
+                - np.searchsorted(self._cnt_venc, d, side="right"))
+
+    def serie_vigentes(self, desde, hasta, freq: str = "MS") -> pd.DataFrame:
+        """
+        Serie as-of para el dashboard: contratos vigentes e importe vigente en cada fecha.
+        """
+        fechas = pd.date_range(pd.Timestamp(desde), pd.Timestamp(hasta), freq=freq)
+        d = fechas.to_numpy("datetime64[D]")
+        empezados = np.searchsorted(self._cnt_inicio, d, side="right")
+        vencidos = np.searchsorted(self._cnt_venc, d, side="right")
+        return pd.DataFrame({
+            "fecha": fechas,
+            "contratos_vigentes": empezados - vencidos,
+            "importe_vigente": a_euros(self._imp_inicio[empezados] - self._imp_venc[vencidos]),
+        })
+
+
+def indice_intervalos(supabase_client) -> IndiceIntervalos:
+    """
+    Índice de fechas de los contratos, construido una vez por versión de snapshot.
+    """
+    from .db_queries import _tabla
+
+    def construir():
+        with span("intervalos.construir_indice") as s:
+            indice = IndiceIntervalos(_tabla(supabase_client, "contratos", COLUMNAS))
+            s.set(filas=len(indice))
+        return indice
+
+    return por_version(supabase_client, "intervalos", construir)
@@ -0,0 +1,152 @@
+import os
+import csv
+import json
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from .pipeline import resolver_intencion, ejecutar_intencion, argumentos_intencion
+from .trazas import span
+
+CAMPOS_SALIDA = ["n", "pregunta", "plantilla", "centro", "year", "intent", "respuesta",
+                 "ms_intencion", "ms_consulta", "reutilizada", "error"]
+
+
+def leer_preguntas(ruta: str) -> list:
+    """
+    Preguntas de un fichero:
+    - .txt: una por línea (se ignoran las vacías y las que empiezan por '#')
+    - .json: lista de textos o de objetos {"pregunta", "centro"?, "year"?}
+    - .csv: columna 'pregunta' y, opcionalmente, 'centro' y 'year'
+    Pueden llevar {centro} y {year} para expandirse con expandir_plantillas().
+    """
+    extension = os.path.splitext(ruta)[1].lower()
+    with open(ruta, "r", encoding="utf-8") as f:
+        if extension == ".json":
+            filas = json.load(f)
+        elif extension == ".csv":
+            filas = list(csv.DictReader(f))
+        else:
+            filas = [linea.strip() for linea in f if linea.strip() and not linea.lstrip().startswith("#")]
+
+    preguntas = []
+    for fila in filas:
+        if isinstance(fila, str):
+            fila = {"pregunta": fila}
+        if not (fila.get("pregunta") or "").strip():
+            continue
+        preguntas.append({"pregunta": fila["pregunta"].strip(),
+                          "centro": fila.get("centro") or None,
+                          "year": int(fila["year"]) if fila.get("year") else None})
+    return preguntas
+
+
+def expandir_plantillas(preguntas: list, centros: list = None, years: list = None) -> list:
+    """
+    Una pregunta por cada combinación centro × año que use la plantilla. Si la
+    fila ya trae centro/year, se usan esos en vez de las listas.
+    """
+    resultado = []
+    for p in preguntas:
+        texto = p["pregunta"]
+        usa_centro, usa_year = "{centro}" in texto, "{year}" in texto
+        lista_centros = [p["centro"]] if p.get("centro") else (centros or [None]) if usa_centro else [None]
+        lista_years = [p["year"]] if p.get("year") else (years or [None]) if usa_year else [None]
+        for centro in lista_centros:
+            for year in lista_years:
+                pregunta = texto
+                if centro is not None:
+                    pregunta = pregunta.replace("{centro}", str(centro))
+                if year is not None:
+                    pregunta = pregunta.replace("{year}", str(year))
+                resultado.append({"pregunta": pregunta, "plantilla": texto if usa_centro or usa_year else None,
+                                  "centro": centro, "year": year})
+    return resultado
+
+
+def _medir(fn, *args):
+    inicio = time.perf_counter()
+    try:
+        return fn(*args), round((time.perf_counter() - inicio) * 1000, 2), None
+    except Exception as e:
+        return None, round((time.perf_counter() - inicio) * 1000, 2), f"{type(e).__name__}: {e}"
+
+
+def _con_valores_de_la_fila(parsed_intent: dict, pregunta: dict) -> dict:
+    """
+    El centro y el año de la fila (o de la plantilla expandida) mandan sobre lo que
+    saque el regex del texto, que no reconoce cualquier nombre de centro. Solo en las
+    intenciones que los usan: en las demás separarían en grupos consultas iguales.
+    """
+    usados = argumentos_intencion(parsed_intent.get("intent"))
+    if pregunta.get("centro") is not None:
+        # GPT usa 'residencia' y el regex 'centro': se fijan los que lea la intención
+        for argumento in ("centro", "residencia"):
+            if argumento in usados:
+                parsed_intent[argumento] = pregunta["centro"]
+    if pregunta.get("year") is not None and "year" in usados:
+        parsed_intent["year"] = int(pregunta["year"])
+    return parsed_intent
+
+
+def _clave(parsed_intent: dict) -> str:
+    # Preguntas distintas con la misma intención y argumentos dan la misma respuesta
+    return json.dumps(parsed_intent, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def responder_lote(supabase_client, preguntas: list, openai_api_key: str = None, workers: int = 4) -> list:
+    """
+    Responde una lista de preguntas (dicts de expandir_plantillas) en tres fases:
+    1) resuelve todas las intenciones (regex; GPT solo si no se reconoce y hay clave)
+       con el centro y el año de la fila si los trae,
+    2) agrupa por intención + argumentos y ejecuta cada consulta distinta una sola vez,
+       ordenadas por intención, repartidas en un pool de hilos,
+    3) devuelve una fila por pregunta con su respuesta y tiempos.
+    Conviene pasar un cliente con los datos ya cargados (snapshot o MotorSQL) para
+    que ninguna consulta vuelva a leer las tablas.
+    """
+    with span("lote.responder", preguntas=len(preguntas)) as s, \
+            ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="lote") as pool:
+        intenciones = list(pool.map(lambda p: _medir(resolver_intencion, p["pregunta"], openai_api_key), preguntas))
+
+        grupos = defaultdict(list)
+        for i, (parsed_intent, _, error) in enumerate(intenciones):
+            if error is None:
+                _con_valores_de_la_fila(parsed_intent, preguntas[i])
+                grupos[_clave(parsed_intent)].append(i)
+
+        orden = sorted(grupos.items(), key=lambda g: (str(intenciones[g[1][0]][0].get("intent")), g[0]))
+        futuros = {clave: pool.submit(_medir, ejecutar_intencion, supabase_client, intenciones[indices[0]][0])
+                   for clave, indices in orden}
+        s.set(consultas=len(futuros))
+
+        filas = []
+        for n, (p, (parsed_intent, ms_intencion, error)) in enumerate(zip(preguntas, intenciones), start=1):
+            fila = {"n": n, "pregunta": p["pregunta"], "plantilla": p.get("plantilla"),
+                    "centro": p.get("centro"), "year": p.get("year"),
+                    "intent": (parsed_intent or {}).get("intent"), "respuesta": None,
+                    "ms_intencion": ms_intencion, "ms_consulta": 0.0, "reutilizada": False, "error": error}
+            if error is None:
+                clave = _clave(parsed_intent)
+                respuesta, ms_consulta, error = futuros[clave].result()
+                primera = grupos[clave][0] == n - 1
+                fila.update(respuesta=None if respuesta is None else str(respuesta), error=error,
+                            ms_consulta=ms_consulta if primera else 0.0, reutilizada=not primera)
+            filas.append(fila)
+        return filas
+
+
+def guardar_resultados(filas: list, ruta: str, resumen: dict = None):
+    """
+    CSV (una fila por pregunta) o JSON ({"resumen", "preguntas"}) según la extensión.
+    """
+    directorio = os.path.dirname(ruta)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    if ruta.lower().endswith(".json"):
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump({"resumen": resumen or {}, "preguntas": filas}, f, indent=2, ensure_ascii=False, default=str)
+        return
+    with open(ruta, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CAMPOS_SALIDA)
+        writer.writeheader()
+        writer.writerows(filas)
@@ -0,0 +1,91 @@
+from datetime import datetime
+
+
+def parse_date(date_str):
+    """
+    Convierte cadenas en formato DD/MM/YYYY a YYYY-MM-DD.
+    Retorna None si la cadena está vacía o es inválida.
+    """
+    if not date_str:
+        return None
+
+    try:
+        # Asume que el string está en DD/MM/YYYY
+        dt = datetime.strptime(date_str, "%d/%m/%Y")
+        # Devuelve en formato ISO (YYYY-MM-DD) válido para Postgres
+        return dt.strftime("%Y-%m-%d")
+    except ValueError:
+        return None
+
+
+def proveedor_row(item) -> dict:
+    """
+    Campos de 'proveedores' a partir de un elemento de residencias_data.json.
+    """
+    tipo_servicio = item.get("tipo", "")
+    return {
+        "cif_proveedor": item.get("cif_proveedor", ""),
+        "nombre_proveedor": item.get("nombre proveedor", ""),
+        "tipo_servicio": tipo_servicio if tipo_servicio else ""
+    }
+
+
+def contrato_row(proveedor_id, centro, fecha_contrato, fecha_vencimiento, importe) -> dict:
+    """
+    Campos de 'contratos', con las fechas ya convertidas a ISO.
+    """
+    if not importe:
+        importe = 0
+
+    return {
+        "proveedor_id": proveedor_id,
+        "centro": centro if centro else "",
+        "fecha_contrato": parse_date(fecha_contrato),
+        "fecha_vencimiento": parse_date(fecha_vencimiento),
+        "importe": float(importe)
+    }
+
+
+def contrato_row_from_item(proveedor_id, item) -> dict:
+    return contrato_row(
+        proveedor_id,
+        item.get("centro", ""),
+        item.get("fecha contrato", None),
+        item.get("fecha vencimiento", None),
+        item.get("importe", 0)
+    )
+
+
+def factura_row(contrato_id, factura_item) -> dict:
+    """
+    Campos de 'facturas' a partir de un elemento de la lista 'facturas' del JSON.
+    """
+    return {
+        "contrato_id": contrato_id,
+        "numero_factura": factura_item.get("numero", ""),
+        "fecha_factura": parse_date(factura_item.get("fecha", None)),
+        "concepto": factura_item.get("concepto", ""),
+        "base_exenta": float(factura_item.get("base exenta", 0)),
+        "base_general": float(factura_item.get("base general", 0)),
+        "iva_general": float(factura_item.get("iva general", 0)),
+        "total": float(factura_item.get("total", 0)),
+        "inicio_periodo": parse_date(factura_item.get("inicio periodo", None)),
+        "fin_periodo": parse_date(factura_item.get("fin periodo", None))
+    }
+
+
+def documento_rows(documentos_list, contrato_id=None, factura_id=None) -> list:
+    """
+    Filas de 'documentos' para cada fichero asociado a un contrato o factura.
+    """
+    rows = []
+    for doc in documentos_list or []:
+        nombre_archivo = doc.get("fichero", "")
+        if not nombre_archivo:
+            continue
+        rows.append({
+            "contrato_id": contrato_id,
+            "factura_id": factura_id,
+            "nombre_archivo": nombre_archivo
+        })
+    return rows
@@ -0,0 +1,107 @@
+import threading
+import pandas as pd
+
+
+class Respuesta:
+    """
+    Imita la respuesta de supabase: los registros van en `.data`.
+    """
+
+    def __init__(self, data):
+        self.data = data
+
+
+def _registros(df: pd.DataFrame) -> list:
+    # NaN -> None para que los registros sean iguales a los de Supabase
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+class ConsultaMemoria:
+    """
+    Subconjunto del query builder de supabase: select().eq().insert().execute().
+    """
+
+    def __init__(self, cliente, tabla: str):
+        self.cliente = cliente
+        self.tabla = tabla
+        self.columnas = None
+        self.filtros = []
+        self.filas_insert = None
+
+    def select(self, columnas: str = "*"):
+        if columnas and columnas.strip() != "*":
+            self.columnas = [c.strip() for c in columnas.split(",")]
+        return self
+
+    def eq(self, columna: str, valor):
+        self.filtros.append((columna, valor))
+        return self
+
+    def insert(self, filas):
+        self.filas_insert = filas if isinstance(filas, list) else [filas]
+        return self
+
+    def execute(self) -> Respuesta:
+        if self.filas_insert is not None:
+            return Respuesta(self.cliente._insertar(self.tabla, self.filas_insert))
+
+        df = self.cliente.frame(self.tabla)
+        for columna, valor in self.filtros:
+            if columna not in df.columns:
+                return Respuesta([])
+            df = df[df[columna] == valor]
+        if self.columnas:
+            df = df[[c for c in self.columnas if c in df.columns]]
+        return Respuesta(_registros(df))
+
+
+class ClienteMemoria:
+    """
+    Cliente con la misma interfaz que supabase.Client sobre DataFrames en memoria.
+    Permite ejecutar las funciones de db_queries sobre un dataset cargado localmente.
+    """
+
+    datos_locales = True  # ya está en memoria: la caché compartida no aporta nada
+
+    def __init__(self, frames: dict = None):
+        self.frames = dict(frames or {})
+        self._pendientes = {}
+        self._siguiente_id = {}
+        # Las consultas de un lote se ejecutan en varios hilos (ver lote.py)
+        self._lock = threading.Lock()
+
+    def table(self, nombre: str) -> ConsultaMemoria:
+        return ConsultaMemoria(self, nombre)
+
+    def frame(self, tabla: str) -> pd.DataFrame:
+        """
+        DataFrame completo de una tabla, incluidas las filas insertadas.
+        """
+        with self._lock:
+            pendientes = self._pendientes.pop(tabla, None)
+            if pendientes:
+                df = self.frames.get(tabla)
+                df_nuevas = pd.DataFrame(pendientes)
+                self.frames[tabla] = df_nuevas if df is None or df.empty else pd.concat([df, df_nuevas], ignore_index=True)
+            return self.frames.get(tabla, pd.DataFrame())
+
+    def _insertar(self, tabla: str, filas: list) -> list:
+        # Las filas se acumulan y se convierten a DataFrame en la siguiente lectura
+        with self._lock:
+            return self._insertar_sin_lock(tabla, filas)
+
+    def _insertar_sin_lock(self, tabla: str, filas: list) -> list:
+        if tabla not in self._siguiente_id:
+            df = self.frames.get(tabla)
+            ids = df["id"] if df is not None and "id" in df.columns else []
+            self._siguiente_id[tabla] = int(max(ids)) + 1 if len(ids) else 1
+
+        nuevas = []
+        for fila in filas:
+            fila = dict(fila)
+            if fila.get("id") is None:
+                fila["id"] = self._siguiente_id[tabla]
+            self._siguiente_id[tabla] = max(self._siguiente_id[tabla], int(fila["id"]) + 1)
+            nuevas.append(fila)
+        self._pendientes.setdefault(tabla, []).extend(nuevas)
+        return nuevas
@@ -0,0 +1,192 @@
+import re
+import time
+import threading
+import pandas as pd
+from .db_queries import _tabla
+from .trazas import span
+from .versionado import TTL_SIN_VERSION_S
+from .dinero import COLUMNAS_DINERO, a_centimos
+
+TABLAS = ("proveedores", "contratos", "facturas", "documentos")
+MOTORES = ("duckdb", "sqlite")
+
+_PARAM = re.compile(r"%\((\w+)\)s")
+
+
+class MotorSQL:
+    """
+    Backend analítico embebido: carga proveedores/contratos/facturas/documentos del
+    cliente base una vez por versión (o cada TTL_SIN_VERSION_S si el cliente base no tiene
+    versión) y los registra en DuckDB (multihilo, columnar, vectorizado)
+    o, si DuckDB no está instalado, en SQLite. Expone sql() con el mismo estilo de
+    parámetros que ClientePostgres (%(nombre)s), de modo que las funciones de db_queries
+    se resuelven con una única sentencia SQL. Las lecturas de tablas completas
+    (dashboard) se sirven desde los mismos datos ya cargados.
+    En DuckDB las columnas de dinero se guardan como DECIMAL(18,2): las sumas son exactas.
+    """
+
+    admite_centimos = True
+    datos_locales = True
+
+    def __init__(self, cliente_base, motor: str = "duckdb"):
+        if motor not in MOTORES:
+            raise ValueError(f"Motor SQL desconocido: '{motor}'. Opciones: {', '.join(MOTORES)}")
+        if motor == "duckdb":
+            try:
+                import duckdb  # noqa: F401
+            except ImportError:
+                motor = "sqlite"
+
+        self.base = cliente_base
+        self.motor = motor
+        self._frames = None
+        self._centimos = {}
+        self._version = None
+        self._cargado = 0.0
+        self._con = None
+        self._usos = {}  # id(conexión) -> consultas en curso; una conexión sustituida se cierra al quedar libre
+        self._lock = threading.Lock()
+
+    # 📌 Carga de datos
+    def _version_base(self):
+        return getattr(self.base, "version", None)
+
+    @property
+    def version(self):
+        # La del cliente base: quien cachee por versión (p. ej. el índice de nombres) ve los cambios de snapshot
+        return self._version_base()
+
+    def _cargar(self) -> tuple:
+        """
+        (frames, céntimos, conexión) de la versión cargada, leídos bajo el lock: un refrescar()
+        concurrente no puede dejar a quien consulta con self._frames = None a medias.
+        Si el cliente base no tiene versión (Supabase, Postgres), se recarga cada
+        TTL_SIN_VERSION_S, como los índices de versionado.por_version.
+        """
+        with self._lock:
+            version = self._version_base()
+            if self._frames is not None and self._version == version and (
+                    version is not None or time.monotonic() - self._cargado < TTL_SIN_VERSION_S):
+                return self._frames, self._centimos, self._con
+            with span("motor_sql.cargar", motor=self.motor):
+                if hasattr(self.base, "tabla_arrow"):
+                    # Snapshot Arrow: se cargan directamente las tablas mapeadas en memoria
+                    fuentes = {t: self.base.tabla_arrow(t) for t in TABLAS}
+                    frames = {}
+                else:
+                    fuentes = frames = {t: _tabla(self.base, t) for t in TABLAS}
+                anterior = self._con
+                self._con = self._registrar({t: f for t, f in fuentes.items() if f is not None and len(f.columns)})
+                self._frames = frames
+                self._centimos = {}
+                self._version = version
+                self._cargado = time.monotonic()
+                if anterior is not None and not self._usos.get(id(anterior)):
+                    anterior.close()
+            return self._frames, self._centimos, self._con
+
+    def precargar(self):
+        self._cargar()
+
+    def _usar(self):
+        """
+        Conexión actual marcada como en uso hasta _soltar(): cerrarla cerraría también
+        los cursores de DuckDB de las consultas en curso.
+        """
+        self._cargar()
+        with self._lock:
+            con = self._con
+            self._usos[id(con)] = self._usos.get(id(con), 0) + 1
+        return con
+
+    def _soltar(self, con):
+        with self._lock:
+            n = self._usos.pop(id(con)) - 1
+            if n:
+                self._usos[id(con)] = n
+            elif con is not self._con:
+                con.close()
+
+    def refrescar(self):
+        """
+        Descarta los datos cargados; la siguiente consulta los vuelve a leer del cliente base.
+        """
+        with self._lock:
+            self._frames = None
+
+    def _registrar(self, frames: dict):
+        """
+        Crea la conexión del motor con una tabla por cada DataFrame / tabla Arrow.
+        """
+        if self.motor == "duckdb":
+            import duckdb
+
+            # Se copian una vez al almacenamiento columnar de DuckDB: escanear DataFrames
+            # con columnas object en cada consulta es mucho más lento
+            con = duckdb.connect()
+            for tabla, fuente in frames.items():
+                columnas = list(fuente.column_names if hasattr(fuente, "column_names") else fuente.columns)
+                decimales = [f'CAST("{c}" AS DECIMAL(18,2)) AS "{c}"'
+                             for c in COLUMNAS_DINERO.get(tabla, ()) if c in columnas]
+                reemplazos = f" REPLACE ({', '.join(decimales)})" if decimales else ""
+                con.register("_fuente", fuente)
+                con.execute(f'CREATE TABLE "{tabla}" AS SELECT *{reemplazos} FROM _fuente')
+                con.unregister("_fuente")
+            return con
+
+        import sqlite3
+
+        con = sqlite3.connect(":memory:", check_same_thread=False)
+        for tabla, df in frames.items():
+            df = df.to_pandas(date_as_object=False) if hasattr(df, "to_pandas") else df.copy()
+            for col in df.columns:
+                # SQLite no tiene tipo fecha: ISO 'YYYY-MM-DD' compara bien como texto
+                if pd.api.types.is_datetime64_any_dtype(df[col]):
+                    df[col] = df[col].dt.strftime("%Y-%m-%d")
+            df.to_sql(tabla, con, index=False)
+        return con
+
+    # 📌 Interfaz de cliente
+    def sql(self, query: str, params: dict = None) -> pd.DataFrame:
+        """
+        Ejecuta una consulta parametrizada (estilo %(nombre)s) y devuelve un DataFrame.
+        """
+        params = params or {}
+        usados = set(_PARAM.findall(query))
+        params = {k: v for k, v in params.items() if k in usados}
+
+        con = self._usar()
+        try:
+            if self.motor == "duckdb":
+                # Un cursor por llamada: DuckDB paraleliza dentro de la consulta y admite hilos concurrentes
+                cur = con.cursor()
+                try:
+                    return cur.execute(_PARAM.sub(r"$\1", query), params).df()
+                finally:
+                    cur.close()
+
+            with self._lock:
+                return pd.read_sql_query(_PARAM.sub(r":\1", query), con, params=params)
+        finally:
+            self._soltar(con)
+
+    def fetch_frame(self, tabla: str, columnas: str = "*", centimos: bool = False) -> pd.DataFrame:
+        frames, cache_centimos, _ = self._cargar()
+        df = frames.get(tabla)
+        if df is None:
+            # Tablas no cargadas aquí (o snapshot Arrow): las lee el cliente base
+            return _tabla(self.base, tabla, columnas, centimos)
+        if columnas.strip() != "*":
+            df = df[[c.strip() for c in columnas.split(",") if c.strip() in df.columns]]
+        df = df.copy()
+        if centimos:
+            for columna in COLUMNAS_DINERO.get(tabla, ()):
+                if columna in df.columns:
+                    clave = (tabla, columna)
+                    if clave not in cache_centimos:
+                        cache_centimos[clave] = a_centimos(frames[tabla][columna])
+                    df[columna] = cache_centimos[clave]
+        return df
+
+    def table(self, nombre: str):
+        return self.base.table(nombre)
@@ -0,0 +1,249 @@
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from .trazas import span
+from .versionado import por_version
+
+UMBRAL_SIMILITUD = 0.3  # el mismo que usa pg_trgm por defecto
+MARGEN_AMBIGUEDAD = 0.1  # una errata solo se da por resuelta si el mejor candidato saca esta ventaja al siguiente
+TIPOS = ("proveedor", "centro")
+
+_NO_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def normalizar(texto) -> str:
+    """
+    Minúsculas, sin tildes ni signos: 'Lavandería  S.L.' -> 'lavanderia s l'.
+    """
+    if texto is None:
+        return ""
+    descompuesto = unicodedata.normalize("NFKD", str(texto).casefold())
+    sin_tildes = "".join(c for c in descompuesto if not unicodedata.combining(c))
+    return _NO_ALNUM.sub(" ", sin_tildes).strip()
+
+
+def trigramas(normalizado: str) -> set:
+    """
+    Trigramas por palabra con el relleno de pg_trgm ('  pal', ' pa', ..., 'al ').
+    """
+    resultado = set()
+    for palabra in normalizado.split():
+        p = f"  {palabra} "
+        resultado.update(p[i:i + 3] for i in range(len(p) - 2))
+    return resultado
+
+
+class Coincidencia:
+    __slots__ = ("tipo", "nombre", "ids", "similitud")
+
+    def __init__(self, tipo: str, nombre: str, ids: list, similitud: float):
+        self.tipo = tipo
+        self.nombre = nombre
+        self.ids = ids
+        self.similitud = similitud
+
+    def __repr__(self):
+        return f"Coincidencia({self.tipo!r}, {self.nombre!r}, ids={self.ids}, similitud={self.similitud:.2f})"
+
+
+class Resolucion:
+    """
+    Resultado de resolver un nombre: ids y nombre de la entidad si es exacta o no hay duda;
+    si no, los candidatos (ambigua) o, como sugerencia, los más parecidos (no encontrada).
+    """
+    __slots__ = ("texto", "ids", "nombre", "exacta", "ambigua", "candidatos")
+
+    def __init__(self, texto: str, coincidencia: Coincidencia = None, exacta: bool = False,
+                 ambigua: bool = False, candidatos: list = None):
+        self.texto = texto
+        self.ids = list(coincidencia.ids) if coincidencia else []
+        self.nombre = coincidencia.nombre if coincidencia else None
+        self.exacta = exacta
+        self.ambigua = ambigua
+        self.candidatos = candidatos or []
+
+    def __repr__(self):
+        return (f"Resolucion({self.texto!r}, ids={self.ids}, nombre={self.nombre!r}, exacta={self.exacta}, "
+                f"ambigua={self.ambigua}, candidatos={[c.nombre for c in self.candidatos]})")
+
+
+def _numeros(normalizado: str) -> set:
+    return {p for p in normalizado.split() if p.isdigit()}
+
+
+class IndiceNombres:
+    """
+    Índice en memoria para resolver nombres escritos por el usuario a ids:
+    - proveedor: nombre_proveedor y cif_proveedor -> ids de proveedores
+    - centro: centro de los contratos -> ids de contratos
+    Cada entrada guarda su forma normalizada y sus trigramas; un índice invertido
+    trigrama -> entradas da los candidatos sin recorrer toda la tabla.
+    """
+
+    def __init__(self):
+        self._entradas = {t: [] for t in TIPOS}        # (normalizado, nombre, ids, trigramas, alias)
+        self._exactas = {t: {} for t in TIPOS}         # normalizado -> posición
+        self._invertido = {t: defaultdict(set) for t in TIPOS}
+        self._principal = {t: {} for t in TIPOS}       # id -> nombre con el que se muestra (no el CIF)
+
+    @classmethod
+    def desde_frames(cls, df_prov, df_contr) -> "IndiceNombres":
+        indice = cls()
+        if df_prov is not None and not df_prov.empty:
+            for pid, cif, nombre in zip(df_prov["id"], df_prov.get("cif_proveedor", [None] * len(df_prov)),
+                                        df_prov["nombre_proveedor"]):
+                indice._añadir("proveedor", nombre, int(pid))
+                indice._añadir("proveedor", cif, int(pid), alias=True)
+        if df_contr is not None and not df_contr.empty:
+            for cid, centro in zip(df_contr["id"], df_contr["centro"]):
+                indice._añadir("centro", centro, int(cid))
+        return indice
+
+    def _añadir(self, tipo: str, nombre, id_, alias: bool = False):
+        clave = normalizar(nombre)
+        if not clave:
+            return
+        if not alias:
+            self._principal[tipo].setdefault(id_, str(nombre))
+        pos = self._exactas[tipo].get(clave)
+        if pos is None:
+            pos = len(self._entradas[tipo])
+            tri = trigramas(clave)
+            self._entradas[tipo].append((clave, str(nombre), [], tri, alias))
+            self._exactas[tipo][clave] = pos
+            for t in tri:
+                self._invertido[tipo][t].add(pos)
+        ids = self._entradas[tipo][pos][2]
+        if id_ not in ids:
+            ids.append(id_)
+
+    def __len__(self):
+        return sum(len(e) for e in self._entradas.values())
+
+    def n_entradas(self, tipo: str) -> int:
+        return len(self._entradas.get(tipo, ()))
+
+    def _contienen(self, tipo: str, q: str) -> list:
+        """
+        Posiciones de las entradas que contienen q (lo que hacía str.contains), por orden alfabético.
+        """
+        entradas, invertido = self._entradas[tipo], self._invertido[tipo]
+        # Todo nombre que contiene q contiene los trigramas interiores de sus palabras
+        # (los de relleno solo valen en los bordes)
+        interiores = {p[i:i + 3] for p in q.split() for i in range(len(p) - 2)}
+        if interiores:
+            conjuntos = sorted((invertido.get(t, set()) for t in interiores), key=len)
+            candidatos = set.intersection(*conjuntos)
+        else:
+            candidatos = range(len(entradas))
+        return sorted((p for p in candidatos if q in entradas[p][0]), key=lambda p: entradas[p][0])
+
+    def _parecidos(self, tipo: str, q: str) -> list:
+        """
+        (similitud, posición) de las entradas con similitud de trigramas (Jaccard) >= UMBRAL_SIMILITUD.
+        """
+        entradas, invertido = self._entradas[tipo], self._invertido[tipo]
+        tq = trigramas(q)
+        comunes = Counter()
+        for t in tq:
+            comunes.update(invertido.get(t, ()))
+        puntuados = []
+        for p, n in comunes.items():
+            sim = n / (len(tq) + len(entradas[p][3]) - n)
+            if sim >= UMBRAL_SIMILITUD:
+                puntuados.append((sim, p))
+        puntuados.sort(key=lambda x: (-x[0], entradas[x[1]][0]))
+        return puntuados
+
+    def buscar(self, tipo: str, texto: str, limite: int = 5) -> list:
+        """
+        Candidatos ordenados por similitud (1.0 = coincidencia exacta o por substring).
+        """
+        q = normalizar(texto)
+        if not q or tipo not in TIPOS:
+            return []
+
+        pos = self._exactas[tipo].get(q)
+        if pos is not None:
+            return [self._coincidencia(tipo, pos, 1.0)]
+        contienen = self._contienen(tipo, q)
+        if contienen:
+            return [self._coincidencia(tipo, p, 1.0) for p in contienen[:limite or None]]
+        return [self._coincidencia(tipo, p, sim) for sim, p in self._parecidos(tipo, q)[:limite or None]]
+
+    def resolucion(self, tipo: str, texto: str) -> Resolucion:
+        """
+        Resuelve lo que escribió el usuario a una sola entidad, o explica por qué no:
+        - coincidencia exacta (sin tildes ni mayúsculas) -> resuelta, exacta;
+        - substring o errata que apunta a una única entidad -> resuelta, no exacta
+          (quien responda debe decir a qué entidad se refiere);
+        - varias entidades posibles -> ambigua, con los candidatos para que el usuario elija;
+        - nada -> no encontrada, con los nombres más parecidos como sugerencia.
+        Los números son identificadores: 'Residencia 999' no se resuelve a 'Residencia 99'.
+        """
+        q = normalizar(texto)
+        if not q or tipo not in TIPOS:
+            return Resolucion(texto)
+
+        pos = self._exactas[tipo].get(q)
+        if pos is not None:
+            return Resolucion(texto, self._coincidencia(tipo, pos, 1.0), exacta=True)
+
+        entradas = self._entradas[tipo]
+        numeros = _numeros(q)
+        con_numeros = lambda p: numeros <= _numeros(entradas[p][0])
+
+        contienen = self._por_entidad(tipo, [(1.0, p) for p in self._contienen(tipo, q) if con_numeros(p)])
+        if len(contienen) == 1:
+            return Resolucion(texto, contienen[0])
+        if contienen:
+            return Resolucion(texto, ambigua=True, candidatos=contienen)
+
+        parecidos = self._parecidos(tipo, q)
+        validos = self._por_entidad(tipo, [(sim, p) for sim, p in parecidos if con_numeros(p)])
+        if len(validos) == 1 or (validos and validos[0].similitud - validos[1].similitud >= MARGEN_AMBIGUEDAD):
+            return Resolucion(texto, validos[0])
+        if validos:
+            cercanos = [c for c in validos if validos[0].similitud - c.similitud < MARGEN_AMBIGUEDAD]
+            return Resolucion(texto, ambigua=True, candidatos=cercanos)
+        return Resolucion(texto, candidatos=self._por_entidad(tipo, parecidos[:10])[:3])
+
+    def resolver(self, tipo: str, texto: str) -> list:
+        """
+        Ids de la entidad si la resolución no deja dudas; [] si no se encontró o es ambigua.
+        """
+        return self.resolucion(tipo, texto).ids
+
+    def _por_entidad(self, tipo: str, puntuados: list) -> list:
+        # Un candidato por entidad (el nombre y el CIF de un proveedor son la misma), en el orden dado
+        vistos, coincidencias = set(), []
+        for sim, p in puntuados:
+            c = self._coincidencia(tipo, p, sim)
+            if tuple(c.ids) not in vistos:
+                vistos.add(tuple(c.ids))
+                coincidencias.append(c)
+        return coincidencias
+
+    def _coincidencia(self, tipo: str, pos: int, similitud: float) -> Coincidencia:
+        _, nombre, ids, _, alias = self._entradas[tipo][pos]
+        if alias:
+            nombre = self._principal[tipo].get(ids[0], nombre)
+        return Coincidencia(tipo, nombre, list(ids), similitud)
+
+
+def indice_nombres(supabase_client) -> IndiceNombres:
+    """
+    Índice del cliente, construido una vez por versión de snapshot
+    (o cada pocos minutos si el backend no tiene versión).
+    """
+    from .db_queries import _tabla
+
+    def construir():
+        with span("nombres.construir_indice") as s:
+            indice = IndiceNombres.desde_frames(
+                _tabla(supabase_client, "proveedores", "id,cif_proveedor,nombre_proveedor"),
+                _tabla(supabase_client, "contratos", "id,centro"))
+            s.set(filas=len(indice))
+        return indice
+
+    return por_version(supabase_client, "nombres", construir)
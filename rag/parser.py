@@ -1,9 +1,10 @@
 import re
 import json
 from datetime import datetime
-from openai import OpenAI
 from .gpt import GPTFunctionCaller
+from .trazas import traza
 
+@traza("parser.interpret_question")
 def interpret_question(user_input: str, api_key: str) -> dict:
     """
     Detección de intenciones combinando regex y GPT.
@@ -34,8 +35,16 @@ def interpret_question(user_input: str, api_key: str) -> dict:
     match_servicio = re.search(servicio_pattern, text)
     servicio_str = match_servicio.group(1).strip() if match_servicio else None
 
+    # 📌 Detección de Búsqueda en documentos ("busca en los documentos cláusula de penalización")
+    busqueda_pattern = r"documentos\s+(?:(?:que\s+(?:mencionen|hablen\s+de|contengan)|sobre|con)\s+)?(.+)"
+    match_busqueda = re.search(busqueda_pattern, text)
+    busqueda_str = match_busqueda.group(1).strip(" ?¿.") if match_busqueda else None
+
     # 📌 Mapeo de Intenciones
     intent_mapping = {
+        # Primero: la búsqueda puede contener cualquier otra frase ("documentos sobre facturas de...")
+        "buscar_documentos": ["busca en los documentos", "buscar en los documentos", "documentos que mencionen",
+                              "documentos que hablen de", "documentos que contengan", "documentos sobre"],
         "get_contratos": ["muéstrame los contratos", "lista de contratos"],
         "get_facturas": ["muéstrame las facturas", "todas las facturas registradas"],
         "facturas_importe_mayor": ["facturas mayores a", "facturas superiores a"],
@@ -67,10 +76,14 @@ def interpret_question(user_input: str, api_key: str) -> dict:
                 "year": year,
                 "centro": centro_str,
                 "proveedor": proveedor_str,
-                "tipo_servicio": servicio_str
+                "tipo_servicio": servicio_str,
+                "consulta": busqueda_str
             }
 
     # 📌 Si no se encuentra una coincidencia, usamos GPT para interpretar
+    if not api_key:
+        return {"intent": "fallback"}
+
     gpt_caller = GPTFunctionCaller(api_key)
     response = gpt_caller.call_step_1(user_input)
     choice = response.choices[0]
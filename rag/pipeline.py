@@ -1,21 +1,35 @@
 import json
 import pandas as pd
-from supabase import Client
 from datetime import datetime, timedelta
 from .parser import interpret_question
 from .gpt import GPTFunctionCaller
 from . import db_queries
+from .trazas import span
 
 def process_user_question(supabase_client, user_input: str, openai_api_key: str) -> str:
     """
     Procesa la pregunta del usuario, detectando la intención y llamando la función correspondiente.
     """
+    with span("pipeline.process_user_question") as s:
+        result_str = _process_user_question(supabase_client, user_input, openai_api_key)
+        s.set(bytes=len(str(result_str).encode("utf-8")))
+        return result_str
+
+def _process_user_question(supabase_client, user_input: str, openai_api_key: str) -> str:
+    parsed_intent = resolver_intencion(user_input, openai_api_key)
+    return ejecutar_intencion(supabase_client, parsed_intent)
+
+def resolver_intencion(user_input: str, openai_api_key: str) -> dict:
+    """
+    Intención y argumentos de la pregunta (regex y, si no basta y hay clave, GPT).
+    Separado de la ejecución para poder agrupar preguntas iguales (ver rag/lote.py).
+    """
     # Intentamos interpretar la intención del usuario con regex
     parsed_intent = interpret_question(user_input, openai_api_key)
     fn_name = parsed_intent.get("intent")
 
     # Si no se detectó una intención válida, intentamos con GPT
-    if fn_name == "fallback":
+    if fn_name == "fallback" and openai_api_key:
         gpt_caller = GPTFunctionCaller(api_key=openai_api_key)
         step1 = gpt_caller.call_step_1(user_input)
         choice = step1.choices[0]
@@ -29,8 +43,55 @@ def process_user_question(supabase_client, user_input: str, openai_api_key: str)
             except:
                 pass
 
+    parsed_intent["intent"] = fn_name
+    return parsed_intent
+
+def ejecutar_intencion(supabase_client, parsed_intent: dict) -> str:
+    """
+    Llama a la función de db_queries que corresponde a la intención ya resuelta.
+    """
+    fn_name = parsed_intent.get("intent")
+    function_mapping = _mapeo(supabase_client, parsed_intent)
+
+    # Ejecutamos la función correspondiente si está en el mapeo
+    # El parser usa los nombres de gpt.py ("get_..."); el mapeo, a veces sin el prefijo
+    fn = function_mapping.get(fn_name) or function_mapping.get((fn_name or "").removeprefix("get_"))
+    if fn is None:
+        fn = lambda: "Lo siento, no entendí tu pregunta. Intenta reformularla o pregunta sobre facturas, contratos o gastos."
+    with span(f"consulta.{fn_name}"):
+        result_str = fn()
+
+    return result_str
+
+# Argumentos de parsed_intent que lee cada intención de _mapeo (quien los rellene
+# desde fuera del texto, como lote.py, solo debe tocar estos)
+ARGUMENTOS_INTENCION = {
+    "facturas_importe_mayor": ("importe",),
+    "gasto_en_rango_fechas": ("fecha_inicio", "fecha_fin"),
+    "contratos_vencen_antes_de": ("fecha_limite",),
+    "gasto_proveedor_en_year": ("proveedor", "year"),
+    "facturas_mas_elevadas": ("top_n",),
+    "ranking_proveedores_por_importe": ("limit", "year"),
+    "gastos_por_residencia": ("residencia", "centro"),
+    "facturas_por_proveedor": ("proveedor", "year"),
+    "top_centros_mayores_gastos": ("year",),
+    "ranking_gastos_centros": ("year",),
+    "get_total_year": ("year",),
+    "facturas_de_proveedor": ("proveedor", "year"),
+    "gasto_por_tipo_servicio": ("tipo_servicio",),
+    "buscar_documentos": ("consulta", "top_n"),
+}
+
+def argumentos_intencion(fn_name: str) -> tuple:
+    """
+    Argumentos que usa una intención (con o sin el prefijo get_, como en ejecutar_intencion).
+    """
+    fn_name = fn_name or ""
+    return ARGUMENTOS_INTENCION.get(fn_name) or ARGUMENTOS_INTENCION.get(fn_name.removeprefix("get_"), ())
+
+def _mapeo(supabase_client, parsed_intent: dict) -> dict:
     # Mapeo de funciones disponibles
-    function_mapping = {
+    return {
         "facturas_importe_mayor": lambda: db_queries.facturas_importe_mayor(supabase_client, parsed_intent.get("importe", 0)),
         "proveedor_mas_contratos": lambda: db_queries.proveedor_mas_contratos(supabase_client),
         "factura_mas_reciente": lambda: db_queries.factura_mas_reciente(supabase_client),
@@ -41,7 +102,7 @@ def process_user_question(supabase_client, user_input: str, openai_api_key: str)
         "ranking_proveedores_por_importe": lambda: db_queries.ranking_proveedores_por_importe(supabase_client, parsed_intent.get("limit", 5), parsed_intent.get("year", None)),
         "facturas_pendientes": lambda: db_queries.get_facturas_pendientes(supabase_client),
         "gastos_por_mes_categoria": lambda: db_queries.get_gastos_por_mes_categoria(supabase_client).to_string(),
-        "gastos_por_residencia": lambda: db_queries.get_gastos_por_residencia(supabase_client, parsed_intent.get("residencia", "")),
+        "gastos_por_residencia": lambda: db_queries.get_gastos_por_residencia(supabase_client, parsed_intent.get("residencia") or parsed_intent.get("centro") or ""),
         "mantenimientos_pendientes": lambda: db_queries.get_mantenimientos_pendientes(supabase_client),
         "proveedores_con_contratos_vigentes": lambda: db_queries.get_proveedores_con_contratos_vigentes(supabase_client).to_string(),
         "facturas_por_proveedor": lambda: db_queries.get_facturas_por_proveedor(supabase_client, parsed_intent.get("proveedor", ""), parsed_intent.get("year", 0)),
@@ -54,9 +115,5 @@ def process_user_question(supabase_client, user_input: str, openai_api_key: str)
         "gasto_por_tipo_servicio": lambda: db_queries.gasto_por_tipo_servicio(supabase_client, parsed_intent.get("tipo_servicio", "")),
         "ranking_tipos_servicios": lambda: db_queries.ranking_tipos_servicios(supabase_client),
         "top_contratos_mas_costosos": lambda: db_queries.top_contratos_mas_costosos(supabase_client),
+        "buscar_documentos": lambda: db_queries.buscar_documentos(supabase_client, parsed_intent.get("consulta") or "", parsed_intent.get("top_n", 5)),
     }
-
-    # Ejecutamos la función correspondiente si está en el mapeo
-    result_str = function_mapping.get(fn_name, lambda: "Lo siento, no entendí tu pregunta. Intenta reformularla o pregunta sobre facturas, contratos o gastos.")()
-
-    return result_str
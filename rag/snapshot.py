@@ -0,0 +1,207 @@
+import os
+import time
+import shutil
+from datetime import datetime
+import pandas as pd
+from .memoria import ClienteMemoria
+from .trazas import span
+from .dinero import COLUMNAS_DINERO, a_centimos
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", os.path.join(".cache", "snapshot"))
+VERSIONES_A_CONSERVAR = 2
+COMPROBAR_VERSION_S = 2.0  # cada cuánto se vuelve a leer ACTUAL como mucho
+TABLAS = ("proveedores", "contratos", "facturas", "documentos")
+
+
+def _esquemas() -> dict:
+    import pyarrow as pa
+
+    return {
+        "proveedores": pa.schema([
+            ("id", pa.int64()), ("cif_proveedor", pa.string()), ("nombre_proveedor", pa.string()),
+            ("tipo_servicio", pa.string())]),
+        "contratos": pa.schema([
+            ("id", pa.int64()), ("proveedor_id", pa.int64()), ("centro", pa.string()),
+            ("fecha_contrato", pa.date32()), ("fecha_vencimiento", pa.date32()), ("importe", pa.float64())]),
+        "facturas": pa.schema([
+            ("id", pa.int64()), ("contrato_id", pa.int64()), ("numero_factura", pa.string()),
+            ("fecha_factura", pa.date32()), ("concepto", pa.string()), ("base_exenta", pa.float64()),
+            ("base_general", pa.float64()), ("iva_general", pa.float64()), ("total", pa.float64()),
+            ("inicio_periodo", pa.date32()), ("fin_periodo", pa.date32())]),
+        "documentos": pa.schema([
+            ("id", pa.int64()), ("contrato_id", pa.int64()), ("factura_id", pa.int64()),
+            ("nombre_archivo", pa.string())]),
+    }
+
+
+def _a_arrow(df: pd.DataFrame, esquema):
+    """
+    Convierte el DataFrame leído de la base de datos (fechas ISO, NUMERIC como float)
+    a una tabla Arrow con tipos fijos.
+    """
+    import pyarrow as pa
+
+    columnas = {}
+    for campo in esquema:
+        serie = df[campo.name] if campo.name in df.columns else pd.Series([None] * len(df), dtype=object)
+        if pa.types.is_date32(campo.type):
+            serie = pd.to_datetime(serie, errors="coerce").dt.date
+        elif pa.types.is_integer(campo.type):
+            serie = pd.to_numeric(serie, errors="coerce").astype("Int64")
+        elif pa.types.is_floating(campo.type):
+            serie = pd.to_numeric(serie, errors="coerce")
+        columnas[campo.name] = pa.array(serie, type=campo.type, from_pandas=True)
+    return pa.table(columnas, schema=esquema)
+
+
+def version_actual(directorio: str = SNAPSHOT_DIR):
+    try:
+        with open(os.path.join(directorio, "ACTUAL"), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def exportar_snapshot(supabase_client, directorio: str = SNAPSHOT_DIR) -> str:
+    """
+    Escribe proveedores/contratos/facturas/documentos como Arrow IPC sin comprimir
+    (para memory-map) y Parquet (intercambio) en una versión nueva, y la publica
+    cambiando el puntero ACTUAL de forma atómica. Devuelve la versión.
+    Lee directamente de la base de datos, sin la caché compartida ni MotorSQL: tras una
+    ingesta, lo cacheado puede ser de antes.
+    """
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+    from .db_queries import _leer_tabla
+    from .backends import cliente_base
+
+    cliente = cliente_base(supabase_client)
+
+    version = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    destino = os.path.join(directorio, version)
+    os.makedirs(destino, exist_ok=True)
+
+    with span("snapshot.exportar"):
+        for tabla, esquema in _esquemas().items():
+            t = _a_arrow(_leer_tabla(cliente, tabla, "*"), esquema)
+            with ipc.new_file(os.path.join(destino, f"{tabla}.arrow"), esquema) as writer:
+                writer.write_table(t)
+            pq.write_table(t, os.path.join(destino, f"{tabla}.parquet"))
+
+    tmp = os.path.join(directorio, "ACTUAL.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp, os.path.join(directorio, "ACTUAL"))
+
+    # Las versiones antiguas pueden seguir mapeadas por otros procesos un rato; conservamos alguna
+    versiones = sorted(d for d in os.listdir(directorio) if os.path.isdir(os.path.join(directorio, d)))
+    for antigua in versiones[:-VERSIONES_A_CONSERVAR]:
+        shutil.rmtree(os.path.join(directorio, antigua), ignore_errors=True)
+    return version
+
+
+class _Version:
+    """
+    Tablas mapeadas y céntimos de una versión. Se sustituye entera al cambiar de versión:
+    quien ya la tiene sigue trabajando sobre la suya, completa.
+    """
+    __slots__ = ("version", "tablas", "centimos")
+
+    def __init__(self, version: str):
+        self.version = version
+        self.tablas = {}
+        self.centimos = {}  # (tabla, columna) -> céntimos int64, una conversión por versión
+
+
+class ClienteSnapshot(ClienteMemoria):
+    """
+    Backend de solo lectura sobre la última snapshot exportada. Los ficheros Arrow se
+    abren con memory-map: arrancar no copia datos y varios procesos comparten las
+    mismas páginas del sistema de ficheros. fetch_frame() lee solo las columnas pedidas.
+    Un mismo cliente lo comparten todas las sesiones de la app: cada llamada toma la
+    versión una vez (bajo el lock) y trabaja solo con ella.
+    """
+
+    admite_centimos = True
+
+    def __init__(self, directorio: str = SNAPSHOT_DIR, comprobar_cada_s: float = COMPROBAR_VERSION_S):
+        super().__init__()
+        self.directorio = directorio
+        self.comprobar_cada_s = comprobar_cada_s
+        self._estado = None
+        self._comprobado = 0.0
+
+    def _actual(self) -> _Version:
+        with self._lock:
+            ahora = time.monotonic()
+            if self._estado is not None and ahora - self._comprobado < self.comprobar_cada_s:
+                return self._estado
+            version = version_actual(self.directorio)
+            if version is None:
+                raise FileNotFoundError(f"No hay snapshot en '{self.directorio}'. Ejecuta la ingesta con SNAPSHOT_DIR.")
+            if self._estado is None or self._estado.version != version:
+                self._estado = _Version(version)
+            self._comprobado = ahora
+            return self._estado
+
+    @property
+    def version(self):
+        return self._actual().version
+
+    def _tabla(self, estado: _Version, nombre: str):
+        import pyarrow as pa
+        import pyarrow.ipc as ipc
+
+        with self._lock:
+            if nombre not in estado.tablas:
+                ruta = os.path.join(self.directorio, estado.version, f"{nombre}.arrow")
+                if not os.path.exists(ruta):
+                    return None
+                estado.tablas[nombre] = ipc.open_file(pa.memory_map(ruta, "r")).read_all()
+            return estado.tablas[nombre]
+
+    def tabla_arrow(self, nombre: str):
+        return self._tabla(self._actual(), nombre)
+
+    def precargar(self):
+        """
+        Mapea ya todas las tablas (p. ej. desde el calentamiento de la app).
+        """
+        estado = self._actual()
+        for tabla in TABLAS:
+            self._tabla(estado, tabla)
+
+    def _columna_centimos(self, estado: _Version, t, tabla: str, columna: str):
+        clave = (tabla, columna)
+        centimos = estado.centimos.get(clave)
+        if centimos is None:
+            centimos = a_centimos(pd.Series(t.column(columna).to_numpy(), copy=False))
+            with self._lock:
+                centimos = estado.centimos.setdefault(clave, centimos)
+        return centimos
+
+    def fetch_frame(self, tabla: str, columnas: str = "*", centimos: bool = False) -> pd.DataFrame:
+        estado = self._actual()
+        completa = self._tabla(estado, tabla)
+        if completa is None:
+            return pd.DataFrame()
+        t = completa
+        if columnas.strip() != "*":
+            t = t.select([c.strip() for c in columnas.split(",") if c.strip() in t.column_names])
+        if not centimos:
+            # Fechas como datetime64 (no objetos date) para que pandas compare y filtre vectorizado
+            return t.to_pandas(date_as_object=False)
+
+        # Dinero: los arrays de céntimos se calculan una vez por versión y se reutilizan
+        dinero = [c for c in COLUMNAS_DINERO.get(tabla, ()) if c in t.column_names]
+        orden = t.column_names
+        df = t.drop_columns(dinero).to_pandas(date_as_object=False)
+        for columna in dinero:
+            df[columna] = self._columna_centimos(estado, completa, tabla, columna)
+        return df[orden]
+
+    def frame(self, tabla: str) -> pd.DataFrame:
+        return self.fetch_frame(tabla)
+
+    def _insertar(self, tabla: str, filas: list) -> list:
+        raise RuntimeError("ClienteSnapshot es de solo lectura; inserta con el backend de la base de datos.")
@@ -0,0 +1,221 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from functools import wraps
+from logging.handlers import RotatingFileHandler
+
+UMBRAL_LENTO_MS = float(os.getenv("SLOW_REQUEST_MS", "2000"))
+SLOW_LOG_PATH = os.getenv("SLOW_LOG_PATH", os.path.join("logs", "peticiones_lentas.log"))
+BUCKETS_S = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_TRAZAS = 200
+
+
+class Span:
+    """
+    Tramo medido de una petición: duración, atributos (filas, bytes, ...) y tramos hijos.
+    """
+
+    __slots__ = ("nombre", "inicio", "duracion_s", "atributos", "hijos", "error")
+
+    def __init__(self, nombre: str, atributos: dict):
+        self.nombre = nombre
+        self.inicio = datetime.now()
+        self.duracion_s = 0.0
+        self.atributos = atributos
+        self.hijos = []
+        self.error = None
+
+    def set(self, **atributos):
+        self.atributos.update(atributos)
+
+    def propio_s(self) -> float:
+        """
+        Tiempo no cubierto por los hijos (p. ej. el trabajo de pandas entre lecturas).
+        """
+        return max(0.0, self.duracion_s - sum(h.duracion_s for h in self.hijos))
+
+    def to_dict(self) -> dict:
+        d = {
+            "nombre": self.nombre,
+            "inicio": self.inicio.isoformat(timespec="milliseconds"),
+            "ms": round(self.duracion_s * 1000, 2),
+            "propio_ms": round(self.propio_s() * 1000, 2),
+            **self.atributos,
+        }
+        if self.error:
+            d["error"] = self.error
+        if self.hijos:
+            d["hijos"] = [h.to_dict() for h in self.hijos]
+        return d
+
+
+_actual = ContextVar("span_actual", default=None)
+_recientes = deque(maxlen=MAX_TRAZAS)
+_metricas = {}
+_lock = threading.Lock()
+_logger_lentas = None
+
+
+def configurar(umbral_ms: float = None, ruta_log: str = None):
+    """
+    Cambia el umbral y/o el fichero del log de peticiones lentas (p. ej. desde st.secrets).
+    """
+    global UMBRAL_LENTO_MS, SLOW_LOG_PATH, _logger_lentas
+    if umbral_ms is not None:
+        UMBRAL_LENTO_MS = float(umbral_ms)
+    if ruta_log is not None and ruta_log != SLOW_LOG_PATH:
+        SLOW_LOG_PATH = ruta_log
+        _logger_lentas = None
+
+
+@contextmanager
+def span(nombre: str, **atributos):
+    """
+    Mide un bloque. Si no hay un span abierto, este es la raíz de una nueva traza.
+    """
+    padre = _actual.get()
+    s = Span(nombre, atributos)
+    if padre is not None:
+        padre.hijos.append(s)
+    token = _actual.set(s)
+    inicio = time.perf_counter()
+    try:
+        yield s
+    except Exception as e:
+        s.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        s.duracion_s = time.perf_counter() - inicio
+        _actual.reset(token)
+        _registrar_metricas(s)
+        if padre is None:
+            _finalizar_traza(s)
+
+
+def traza(nombre: str = None):
+    """
+    Decorador: mide cada llamada a la función como un span.
+    """
+    def decorador(fn):
+        etiqueta = nombre or f"{fn.__module__}.{fn.__name__}"
+
+        @wraps(fn)
+        def envoltura(*args, **kwargs):
+            with span(etiqueta):
+                return fn(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+def span_actual():
+    return _actual.get()
+
+
+def _registrar_metricas(s: Span):
+    with _lock:
+        m = _metricas.get(s.nombre)
+        if m is None:
+            m = _metricas[s.nombre] = {"count": 0, "suma_s": 0.0, "buckets": [0] * len(BUCKETS_S),
+                                       "filas": 0, "bytes": 0, "errores": 0}
+        m["count"] += 1
+        m["suma_s"] += s.duracion_s
+        for i, limite in enumerate(BUCKETS_S):
+            if s.duracion_s <= limite:
+                m["buckets"][i] += 1
+        m["filas"] += int(s.atributos.get("filas", 0) or 0)
+        m["bytes"] += int(s.atributos.get("bytes", 0) or 0)
+        if s.error:
+            m["errores"] += 1
+
+
+def _finalizar_traza(s: Span):
+    _recientes.append(s)
+    if s.duracion_s * 1000 >= UMBRAL_LENTO_MS:
+        try:
+            _log_lentas().warning(json.dumps(s.to_dict(), ensure_ascii=False, default=str))
+        except OSError:
+            pass
+
+
+def _log_lentas() -> logging.Logger:
+    global _logger_lentas
+    if _logger_lentas is None:
+        directorio = os.path.dirname(SLOW_LOG_PATH)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        logger = logging.getLogger("residencias.lentas")
+        logger.setLevel(logging.WARNING)
+        logger.propagate = False
+        for h in list(logger.handlers):
+            logger.removeHandler(h)
+            h.close()
+        handler = RotatingFileHandler(SLOW_LOG_PATH, maxBytes=5 * 1024 * 1024, backupCount=3, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        _logger_lentas = logger
+    return _logger_lentas
+
+
+def reiniciar():
+    """
+    Vacía las métricas y las trazas recientes (tests, o para medir desde cero).
+    """
+    with _lock:
+        _metricas.clear()
+    _recientes.clear()
+
+
+def trazas_recientes() -> list:
+    """
+    Últimas trazas completas, de la más reciente a la más antigua.
+    """
+    return list(reversed(_recientes))
+
+
+def resumen_metricas() -> list:
+    with _lock:
+        return [{"span": nombre, "llamadas": m["count"],
+                 "media_ms": round(m["suma_s"] / m["count"] * 1000, 2) if m["count"] else 0.0,
+                 "total_s": round(m["suma_s"], 3), "filas": m["filas"], "bytes": m["bytes"],
+                 "errores": m["errores"]}
+                for nombre, m in sorted(_metricas.items())]
+
+
+def _etiqueta(valor: str) -> str:
+    return valor.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def exportar_prometheus() -> str:
+    """
+    Métricas acumuladas en formato de texto de Prometheus.
+    """
+    lineas = [
+        "# HELP residencias_span_duration_seconds Duración de los spans.",
+        "# TYPE residencias_span_duration_seconds histogram",
+    ]
+    with _lock:
+        metricas = {n: dict(m, buckets=list(m["buckets"])) for n, m in _metricas.items()}
+
+    for nombre, m in sorted(metricas.items()):
+        lbl = _etiqueta(nombre)
+        for limite, n in zip(BUCKETS_S, m["buckets"]):
+            lineas.append(f'residencias_span_duration_seconds_bucket{{span="{lbl}",le="{limite}"}} {n}')
+        lineas.append(f'residencias_span_duration_seconds_bucket{{span="{lbl}",le="+Inf"}} {m["count"]}')
+        lineas.append(f'residencias_span_duration_seconds_sum{{span="{lbl}"}} {m["suma_s"]:.6f}')
+        lineas.append(f'residencias_span_duration_seconds_count{{span="{lbl}"}} {m["count"]}')
+
+    for metrica, clave, ayuda in [("residencias_span_rows_total", "filas", "Filas leídas por span."),
+                                  ("residencias_span_bytes_total", "bytes", "Bytes leídos por span."),
+                                  ("residencias_span_errors_total", "errores", "Spans terminados con error.")]:
+        lineas.append(f"# HELP {metrica} {ayuda}")
+        lineas.append(f"# TYPE {metrica} counter")
+        for nombre, m in sorted(metricas.items()):
+            lineas.append(f'{metrica}{{span="{_etiqueta(nombre)}"}} {m[clave]}')
+
+    return "\n".join(lineas) + "\n"
@@ -0,0 +1,50 @@
+import time
+import threading
+
+TTL_SIN_VERSION_S = 300  # clientes sin versión (Supabase, Postgres): se reconstruye cada 5 minutos
+MAX_CLIENTES = 8         # en la app normalmente solo hay uno vivo
+
+_cache = {}   # (id(cliente), nombre) -> (cliente, version, creado, valor)
+_lock = threading.Lock()
+
+
+def version_datos(supabase_client):
+    """
+    Versión de los datos del cliente (la de la snapshot) o None si el backend no la tiene.
+    """
+    return getattr(supabase_client, "version", None)
+
+
+def por_version(supabase_client, nombre: str, construir):
+    """
+    Devuelve construir() cacheado por cliente y versión de datos: los índices en
+    memoria (nombres, intervalos, ...) se construyen una vez por snapshot.
+    """
+    version = version_datos(supabase_client)
+    clave = (id(supabase_client), nombre)
+    with _lock:
+        entrada = _cache.get(clave)
+        if entrada is not None:
+            cliente, v, creado, valor = entrada
+            if cliente is supabase_client and v == version and (
+                    version is not None or time.monotonic() - creado < TTL_SIN_VERSION_S):
+                return valor
+
+    valor = construir()
+    with _lock:
+        clientes = {k[0] for k in _cache}
+        if clave[0] not in clientes and len(clientes) >= MAX_CLIENTES:
+            antiguo = next(iter(_cache))[0]
+            for k in [k for k in _cache if k[0] == antiguo]:
+                del _cache[k]
+        _cache[clave] = (supabase_client, version, time.monotonic(), valor)
+    return valor
+
+
+def invalidar(supabase_client=None):
+    with _lock:
+        if supabase_client is None:
+            _cache.clear()
+        else:
+            for k in [k for k in _cache if k[0] == id(supabase_client)]:
+                del _cache[k]
@@ -0,0 +1,75 @@
+"""
+Responde en lote un fichero de preguntas (p. ej. el informe mensual por residencia)
+con el mismo pipeline que el chatbot, sin pasar por Streamlit.
+
+Uso:
+    python responder_preguntas.py preguntas.txt --salida informe.csv
+    python responder_preguntas.py plantillas.txt --centros "Residencia 1,Residencia 2" --years 2024,2025 --salida informe.json
+
+Las preguntas pueden llevar {centro} y {year}. Sin --centros, las plantillas con
+{centro} se expanden a todos los centros de los contratos.
+"""
+import os
+import sys
+import time
+import argparse
+from dotenv import load_dotenv
+from rag.backends import crear_cliente
+from rag.db_queries import get_contratos
+from rag.lote import leer_preguntas, expandir_plantillas, responder_lote, guardar_resultados
+from rag.motor_sql import MotorSQL, MOTORES
+
+
+def _lista(valor: str) -> list:
+    return [v.strip() for v in (valor or "").split(",") if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("preguntas", help="Fichero .txt, .json o .csv con las preguntas")
+    parser.add_argument("--salida", default="respuestas.csv", help="Resultados en .csv o .json")
+    parser.add_argument("--centros", help="Centros separados por comas para {centro}")
+    parser.add_argument("--years", help="Años separados por comas para {year}")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--motor", choices=MOTORES + ("ninguno",), default="duckdb",
+                        help="Carga los datos una vez en un motor SQL embebido (por defecto duckdb)")
+    parser.add_argument("--sin-gpt", action="store_true", help="No llama a GPT aunque haya OPENAI_API_KEY")
+    args = parser.parse_args()
+
+    load_dotenv()
+    inicio = time.perf_counter()
+
+    # 1) Datos: se cargan una sola vez y los comparten todas las preguntas
+    cliente = crear_cliente(os.environ)
+    if args.motor != "ninguno" and not hasattr(cliente, "sql"):
+        cliente = MotorSQL(cliente, args.motor)
+    if hasattr(cliente, "precargar"):
+        cliente.precargar()
+    ms_carga = (time.perf_counter() - inicio) * 1000
+
+    # 2) Preguntas y plantillas
+    preguntas = leer_preguntas(args.preguntas)
+    centros = _lista(args.centros)
+    if not centros and any("{centro}" in p["pregunta"] and not p["centro"] for p in preguntas):
+        centros = sorted(get_contratos(cliente, "centro")["centro"].dropna().unique().tolist())
+    years = [int(y) for y in _lista(args.years)]
+    preguntas = expandir_plantillas(preguntas, centros, years)
+
+    # 3) Respuestas
+    openai_api_key = None if args.sin_gpt else os.getenv("OPENAI_API_KEY")
+    filas = responder_lote(cliente, preguntas, openai_api_key, workers=args.workers)
+
+    resumen = {
+        "preguntas": len(filas),
+        "consultas_ejecutadas": sum(1 for f in filas if f["error"] is None and not f["reutilizada"]),
+        "errores": sum(1 for f in filas if f["error"]),
+        "ms_carga_datos": round(ms_carga, 1),
+        "ms_total": round((time.perf_counter() - inicio) * 1000, 1),
+    }
+    guardar_resultados(filas, args.salida, resumen)
+    print(f"{resumen['preguntas']} preguntas ({resumen['consultas_ejecutadas']} consultas distintas, "
+          f"{resumen['errores']} errores) en {resumen['ms_total'] / 1000:.2f} s -> {args.salida}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
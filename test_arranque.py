@@ -0,0 +1,71 @@
+import os
+import sys
+import json
+import subprocess
+import pandas as pd
+import pytest
+from rag import arranque
+from rag.memoria import ClienteMemoria
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+PESADOS = ("openai", "supabase", "fitz")
+
+
+@pytest.fixture(autouse=True)
+def _informe_limpio(monkeypatch):
+    monkeypatch.setattr(arranque, "_importaciones", {})
+    monkeypatch.setattr(arranque, "_eventos", {})
+    monkeypatch.setattr(arranque, "_calentamiento", [])
+
+
+class ClientePrecargado(ClienteMemoria):
+    precargado = False
+
+    def precargar(self):
+        self.precargado = True
+
+
+def test_pipeline_no_importa_dependencias_pesadas():
+    # En un proceso limpio: en este ya las han podido importar otros tests
+    codigo = ("import sys, json; from rag import arranque; arranque.importar('rag.pipeline'); "
+              f"print(json.dumps([m for m in {PESADOS!r} if m in sys.modules]))")
+    salida = subprocess.run([sys.executable, "-c", codigo], cwd=RAIZ, capture_output=True, text=True, check=True)
+    assert json.loads(salida.stdout) == []
+
+
+def test_importar_mide_solo_la_primera_vez(tmp_path, monkeypatch):
+    (tmp_path / "modulo_de_prueba_arranque.py").write_text("VALOR = 1\n", encoding="utf-8")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, "modulo_de_prueba_arranque", raising=False)
+
+    modulo = arranque.importar("modulo_de_prueba_arranque")
+    assert arranque.importar("modulo_de_prueba_arranque") is modulo and modulo.VALOR == 1
+    assert [i["módulo"] for i in arranque.informe()["importaciones"]] == ["modulo_de_prueba_arranque"]
+
+
+def test_calentar_registra_cada_paso():
+    cliente = ClientePrecargado({"proveedores": pd.DataFrame([{"id": 1, "cif_proveedor": "B1", "nombre_proveedor": "Iberia"}]),
+                                 "contratos": pd.DataFrame([{"id": 1, "proveedor_id": 1, "centro": "Residencia 1"}])})
+    hilo = arranque.hilo_calentamiento(lambda: cliente)
+    assert hilo.daemon and not hilo.is_alive()
+    hilo.start()
+    hilo.join(30)
+
+    informe = arranque.informe()
+    assert [(p["paso"], p["error"]) for p in informe["calentamiento"]] == [
+        ("importar rag.pipeline", ""), ("parser", ""), ("conexión", ""), ("snapshot", ""), ("índice de nombres", "")]
+    assert all(p["ms"] >= 0 for p in informe["calentamiento"])
+    assert cliente.precargado
+    assert [e["evento"] for e in informe["eventos"]] == ["calentamiento terminado"]
+
+
+def test_un_paso_que_falla_no_corta_el_calentamiento():
+    def sin_conexion():
+        raise ConnectionError("sin red")
+
+    arranque.marcar("imports de app.py")
+    arranque.calentar(sin_conexion)
+    informe = arranque.informe()
+    pasos = {p["paso"]: p["error"] for p in informe["calentamiento"]}
+    assert pasos == {"importar rag.pipeline": "", "parser": "", "conexión": "ConnectionError: sin red"}
+    assert [e["evento"] for e in informe["eventos"]] == ["imports de app.py", "calentamiento terminado"]
@@ -0,0 +1,146 @@
+import io
+import os
+import csv
+import threading
+from types import SimpleNamespace
+import pandas as pd
+import pytest
+from rag.backends import crear_cliente, cliente_base, escribir_csv, ClientePostgres, NULL_COPY
+from rag.motor_sql import MotorSQL
+from rag.snapshot import ClienteSnapshot
+
+
+# 📌 Pool y lectura en streaming, con una conexión falsa (sin servidor)
+class _Cursor:
+    def __init__(self, conexion, nombre):
+        self.conexion = conexion
+        self.nombre = nombre
+        self.itersize = None
+        self.description = [SimpleNamespace(name="id"), SimpleNamespace(name="centro")]
+        self._filas = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.conexion.cursores.append(self)
+        self._filas = list(self.conexion.filas)
+
+    def fetchmany(self, n):
+        lote, self._filas = self._filas[:n], self._filas[n:]
+        return lote
+
+
+class _Conexion:
+    def __init__(self, filas):
+        self.filas = filas
+        self.cursores = []
+        self.commits = self.rollbacks = 0
+
+    def cursor(self, name=None, cursor_factory=None):
+        return _Cursor(self, name)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class _Pool:
+    def __init__(self, conexion):
+        self.conexion = conexion
+        self.prestadas = 0
+
+    def getconn(self):
+        self.prestadas += 1
+        return self.conexion
+
+    def putconn(self, conn):
+        self.prestadas -= 1
+
+
+def _cliente_falso(filas, tamaño_lote=2, monkeypatch=None):
+    cliente = ClientePostgres.__new__(ClientePostgres)
+    cliente.pool = _Pool(_Conexion(filas))
+    cliente.tamaño_lote = tamaño_lote
+    cliente._registradas = set()
+    cliente._lock = threading.Lock()
+    monkeypatch.setattr(cliente, "_preparar", lambda conn: None)
+    return cliente
+
+
+def test_stream_lee_por_lotes_con_cursor_de_servidor(monkeypatch):
+    filas = [(i, f"Residencia {i}") for i in range(5)]
+    cliente = _cliente_falso(filas, monkeypatch=monkeypatch)
+
+    lotes = list(cliente.stream("contratos", "id, centro"))
+    assert [len(l) for l in lotes] == [2, 2, 1]
+    cursor = cliente.pool.conexion.cursores[0]
+    assert cursor.nombre == "stream_contratos" and cursor.itersize == 2
+
+    df = cliente.fetch_frame("contratos")
+    assert df["id"].tolist() == list(range(5)) and list(df.columns) == ["id", "centro"]
+    assert cliente.pool.prestadas == 0 and cliente.pool.conexion.commits == 2
+
+
+def test_conexion_hace_rollback_y_devuelve_la_conexion_al_pool(monkeypatch):
+    cliente = _cliente_falso([], monkeypatch=monkeypatch)
+    with pytest.raises(RuntimeError):
+        with cliente.conexion():
+            raise RuntimeError("fallo en la transacción")
+    conexion = cliente.pool.conexion
+    assert (conexion.commits, conexion.rollbacks, cliente.pool.prestadas) == (0, 1, 0)
+
+
+def test_escribir_csv_distingue_null_de_cadena_vacia():
+    buffer = io.StringIO()
+    assert escribir_csv(buffer, [(1, None, ""), (2, "a,b", "x")]) == 2
+    buffer.seek(0)
+    assert list(csv.reader(buffer)) == [["1", NULL_COPY, ""], ["2", "a,b", "x"]]
+    assert buffer.getvalue().splitlines()[0] == '1,\\N,'
+
+
+# 📌 Selección de backend
+def test_crear_cliente_valida_la_configuracion():
+    with pytest.raises(ValueError, match="DATABASE_URL"):
+        crear_cliente({"DATA_BACKEND": "postgres"})
+    with pytest.raises(ValueError, match="desconocido"):
+        crear_cliente({"DATA_BACKEND": "mysql"})
+
+
+def test_cliente_base_quita_el_motor_sql(tmp_path):
+    cliente = crear_cliente({"DATA_BACKEND": "snapshot", "SNAPSHOT_DIR": str(tmp_path), "SQL_ENGINE": "sqlite"})
+    assert isinstance(cliente, MotorSQL)
+    assert isinstance(cliente_base(cliente), ClienteSnapshot)
+    assert cliente_base(cliente.base) is cliente.base
+
+
+# 📌 Contra un Postgres real (opcional): POSTGRES_TEST_DSN=postgresql://...
+@pytest.mark.skipif(not os.getenv("POSTGRES_TEST_DSN"), reason="sin POSTGRES_TEST_DSN")
+def test_copy_y_stream_contra_postgres():
+    cliente = ClientePostgres(os.environ["POSTGRES_TEST_DSN"], maxconn=2, tamaño_lote=3)
+    with cliente.conexion() as conn, conn.cursor() as cur:
+        cur.execute("CREATE TEMP TABLE IF NOT EXISTS prueba_copy (id int, nombre text, fecha date, importe numeric)")
+        cur.execute("TRUNCATE prueba_copy")
+        filas = [(i, None if i % 2 else f"n{i}", "2024-01-0%d" % (i % 9 + 1), "1.10") for i in range(7)]
+        assert cliente.copy_rows("prueba_copy", ["id", "nombre", "fecha", "importe"], filas, conn=conn) == 7
+        cur.execute("SELECT count(*) FROM prueba_copy WHERE nombre IS NULL")
+        assert cur.fetchone()[0] == 3
+
+    # Tabla real para el cursor de servidor (las TEMP son de la conexión)
+    with cliente.conexion() as conn, conn.cursor() as cur:
+        cur.execute("DROP TABLE IF EXISTS prueba_stream")
+        cur.execute("CREATE TABLE prueba_stream AS SELECT g AS id, DATE '2024-01-01' + g AS fecha "
+                    "FROM generate_series(1, 7) g")
+    try:
+        lotes = list(cliente.stream("prueba_stream"))
+        assert [len(l) for l in lotes] == [3, 3, 1]
+        df = pd.concat(lotes)
+        assert df["fecha"].iloc[0] == "2024-01-02"
+    finally:
+        with cliente.conexion() as conn, conn.cursor() as cur:
+            cur.execute("DROP TABLE prueba_stream")
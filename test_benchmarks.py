@@ -0,0 +1,16 @@
+import pytest
+from rag import db_queries
+from benchmarks.run import CONSULTAS, SIN_ESCENARIO, PREGUNTAS, ejecutar
+
+
+def test_cada_consulta_tiene_escenario_o_motivo():
+    assert not set(CONSULTAS) & set(SIN_ESCENARIO)
+    assert all(callable(getattr(db_queries, nombre)) for nombre in [*CONSULTAS, *SIN_ESCENARIO])
+
+
+@pytest.mark.parametrize("motor", [None, "sqlite"])
+def test_todos_los_escenarios_corren_sin_errores(motor):
+    resultado = ejecutar("1k", repeticiones=1, latencia_db=0.0, latencia_gpt=0.0, max_ingest=100, seed=42, motor=motor)
+    esperados = {f"consulta.{n}" for n in CONSULTAS} | set(PREGUNTAS) | {"dashboard", "ingest_items"}
+    assert set(resultado["resultados"]) == esperados
+    assert {n: r["error"] for n, r in resultado["resultados"].items() if "error" in r} == {}
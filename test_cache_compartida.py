@@ -0,0 +1,139 @@
+import time
+import socketserver
+import threading
+import pandas as pd
+import pytest
+from rag import cache_compartida, db_queries
+from rag.gpt import GPTFunctionCaller, normalizar_pregunta
+from rag.memoria import ClienteMemoria
+
+
+class ClienteRemoto(ClienteMemoria):
+    # Como Supabase: cada lectura es una petición al servidor
+    datos_locales = False
+
+    def __init__(self, frames):
+        super().__init__(frames)
+        self.lecturas = 0
+
+    def table(self, nombre):
+        self.lecturas += 1
+        return super().table(nombre)
+
+
+def _frames() -> dict:
+    return {
+        "facturas": pd.DataFrame([
+            {"id": 1, "contrato_id": 1, "numero_factura": "F-1", "fecha_factura": "2023-02-01", "total": 100.25},
+            {"id": 2, "contrato_id": 1, "numero_factura": "F-2", "fecha_factura": None, "total": None},
+        ]),
+    }
+
+
+class _ServidorResp(socketserver.StreamRequestHandler):
+    # Lo mínimo del protocolo Redis para el cliente redis-py: GET, SET [PX], DEL y +OK para el resto
+    datos = {}
+
+    def _leer_comando(self):
+        cabecera = self.rfile.readline()
+        if not cabecera:
+            return None
+        partes = []
+        for _ in range(int(cabecera[1:])):
+            n = int(self.rfile.readline()[1:])
+            partes.append(self.rfile.read(n + 2)[:-2])
+        return partes
+
+    def handle(self):
+        while (comando := self._leer_comando()) is not None:
+            nombre = comando[0].upper()
+            if nombre == b"GET":
+                valor = self.datos.get(comando[1])
+                self.wfile.write(b"$-1\r\n" if valor is None else b"$%d\r\n%s\r\n" % (len(valor), valor))
+            elif nombre == b"SET":
+                self.datos[comando[1]] = comando[2]
+                self.wfile.write(b"+OK\r\n")
+            elif nombre == b"DEL":
+                self.wfile.write(b":%d\r\n" % (self.datos.pop(comando[1], None) is not None))
+            else:
+                self.wfile.write(b"+OK\r\n")
+
+
+@pytest.fixture
+def servidor_redis():
+    pytest.importorskip("redis")
+    _ServidorResp.datos = {}
+    servidor = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _ServidorResp)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    yield f"redis://127.0.0.1:{servidor.server_address[1]}/0"
+    servidor.shutdown()
+    servidor.server_close()
+
+
+@pytest.fixture(autouse=True)
+def _sin_cache():
+    yield
+    cache_compartida.configurar(None)
+
+
+def test_serializacion_arrow_y_json():
+    df = _frames()["facturas"]
+    datos = cache_compartida.serializar(df)
+    assert datos[:1] == b"A"
+    pd.testing.assert_frame_equal(cache_compartida.deserializar(datos), df)
+    assert cache_compartida.deserializar(cache_compartida.serializar({"a": [1, "ñ"]})) == {"a": [1, "ñ"]}
+
+
+def test_sqlite_compartida_entre_instancias_y_ttl(tmp_path):
+    ruta = str(tmp_path / "cache.db")
+    a, b = cache_compartida.CacheSQLite(ruta), cache_compartida.CacheSQLite(ruta)
+    a.set("k", b"valor")
+    a.set("caduca", b"x", ttl_s=0.05)
+    assert b.get("k") == b"valor" and b.get("caduca") == b"x"
+    time.sleep(0.1)
+    assert b.get("caduca") is None
+    b.delete("k")
+    assert a.get("k") is None
+
+
+@pytest.mark.parametrize("url", ["sqlite", "redis"])
+def test_replicas_leen_una_sola_vez(url, tmp_path, request):
+    url = f"sqlite:///{tmp_path / 'cache.db'}" if url == "sqlite" else request.getfixturevalue("servidor_redis")
+    cache_compartida.configurar(url)
+    replica_1, replica_2 = ClienteRemoto(_frames()), ClienteRemoto(_frames())
+
+    esperado = db_queries.factura_mas_reciente(replica_1)
+    assert db_queries.factura_mas_reciente(replica_2) == esperado
+    assert (replica_1.lecturas, replica_2.lecturas) == (1, 0)
+    assert url.startswith("sqlite") or _ServidorResp.datos
+    # Los céntimos se calculan después de la caché: la entrada es la misma
+    assert db_queries.get_facturas(replica_2, "total", centimos=True)["total"].tolist() == [10025, 0]
+
+
+def test_clientes_locales_no_usan_la_cache(tmp_path):
+    cache_compartida.configurar(f"sqlite:///{tmp_path / 'cache.db'}")
+    db_queries.get_facturas(ClienteMemoria(_frames()))
+    assert cache_compartida.actual()[0]._conexion().execute("SELECT count(*) FROM cache").fetchone()[0] == 0
+
+
+def test_gpt_step_1_cacheado_por_pregunta_normalizada(tmp_path):
+    pytest.importorskip("openai")
+    cache_compartida.configurar(f"sqlite:///{tmp_path / 'cache.db'}")
+    llamadas = []
+
+    def create(**kwargs):
+        llamadas.append(kwargs)
+        fn_call = type("F", (), {"name": "get_gastos_por_residencia", "arguments": '{"residencia": "R1"}'})()
+        mensaje = type("M", (), {"content": None, "function_call": fn_call})()
+        return type("R", (), {"choices": [type("C", (), {"message": mensaje})()], "usage": None})()
+
+    gpt = GPTFunctionCaller(api_key="sk-test")
+    gpt.client = type("O", (), {"chat": type("Ch", (), {"completions": type("Co", (), {"create": staticmethod(create)})()})()})()
+
+    gpt.call_step_1("¿Gasto de la  Residencia R1?")
+    otra_replica = GPTFunctionCaller(api_key="sk-test")
+    respuesta = otra_replica.call_step_1("¿gasto de la residencia r1? ")
+    assert len(llamadas) == 1
+    assert respuesta.choices[0].message.function_call.name == "get_gastos_por_residencia"
+    assert normalizar_pregunta("  A  b\n") == "a b"
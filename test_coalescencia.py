@@ -0,0 +1,148 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import pytest
+from rag import coalescencia, db_queries
+from rag.memoria import ClienteMemoria
+
+
+class ClienteLento(ClienteMemoria):
+    # Como Supabase bajo carga: cada lectura tarda y cuenta como una petición al servidor
+    datos_locales = False
+
+    def __init__(self, frames):
+        super().__init__(frames)
+        self.lecturas = 0
+
+    def table(self, nombre):
+        self.lecturas += 1
+        time.sleep(0.2)
+        return super().table(nombre)
+
+
+@pytest.fixture(autouse=True)
+def _limpio():
+    coalescencia.olvidar()
+    yield
+    coalescencia.olvidar()
+
+
+def _concurrentes(fn, n: int = 8) -> list:
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        return list(pool.map(lambda _: fn(), range(n)))
+
+
+def test_una_sola_ejecucion_en_vuelo():
+    llamadas = []
+
+    def construir():
+        llamadas.append(1)
+        time.sleep(0.2)
+        return "resultado"
+
+    assert _concurrentes(lambda: coalescencia.compartir("k", construir)) == ["resultado"] * 8
+    assert len(llamadas) == 1 and coalescencia.en_vuelo() == 0
+    # Terminada la llamada, la siguiente petición vuelve a ejecutar (sin stale-while-revalidate)
+    coalescencia.compartir("k", construir)
+    assert len(llamadas) == 2
+
+
+def test_error_compartido_y_no_recordado():
+    llamadas = []
+
+    def falla():
+        llamadas.append(1)
+        time.sleep(0.1)
+        raise ConnectionError("Supabase caído")
+
+    def pedir():
+        try:
+            return coalescencia.compartir("error", falla)
+        except ConnectionError as e:
+            return str(e)
+
+    assert _concurrentes(pedir, 4) == ["Supabase caído"] * 4
+    assert len(llamadas) == 1
+    assert coalescencia.compartir("error", lambda: "ya va") == "ya va"
+
+
+def test_timeout_del_seguidor():
+    liberar = threading.Event()
+    lider = threading.Thread(target=coalescencia.compartir, args=("lento", lambda: liberar.wait(5)))
+    lider.start()
+    time.sleep(0.05)
+    with pytest.raises(TimeoutError):
+        coalescencia.compartir("lento", lambda: None, timeout_s=0.05)
+    liberar.set()
+    lider.join()
+
+
+def test_stale_while_revalidate():
+    version = iter(range(1, 10))
+    construir = lambda: (time.sleep(0.1), next(version))[1]
+
+    assert coalescencia.compartir("swr", construir, obsoleto_s=5) == 1
+    inicio = time.perf_counter()
+    # Obsoleto: se devuelve al momento y se refresca en segundo plano una sola vez
+    assert [coalescencia.compartir("swr", construir, obsoleto_s=5) for _ in range(3)] == [1, 1, 1]
+    assert time.perf_counter() - inicio < 0.1
+    time.sleep(0.2)
+    assert coalescencia.compartir("swr", construir, obsoleto_s=5) == 2
+
+
+def test_sesiones_simultaneas_leen_la_tabla_una_vez():
+    cliente = ClienteLento({"facturas": pd.DataFrame([{"id": 1, "contrato_id": 1, "total": 10.5}])})
+    frames = _concurrentes(lambda: db_queries.get_facturas(cliente))
+    assert cliente.lecturas == 1
+    # Cada sesión recibe su copia: modificarla no afecta a las demás
+    frames[0]["total"] = 0
+    assert all(f["total"].tolist() == [10.5] for f in frames[1:])
+
+
+def test_con_swr_las_lecturas_recientes_no_se_refrescan(monkeypatch):
+    monkeypatch.setattr(coalescencia, "OBSOLETO_S", 60.0)
+    cliente = ClienteLento({"facturas": pd.DataFrame([{"id": 1, "contrato_id": 1, "total": 10.5}])})
+    for _ in range(3):
+        db_queries.get_facturas(cliente)
+    assert cliente.lecturas == 1 and coalescencia.en_vuelo() == 0
+
+    # Pasada la ventana de frescura: se sirve la obsoleta y se refresca una vez en segundo plano
+    monkeypatch.setattr(db_queries, "FRESCO_S", 0.0)
+    db_queries.get_facturas(cliente)
+    time.sleep(0.4)
+    assert cliente.lecturas == 2
+
+
+def test_gpt_no_sirve_respuestas_obsoletas(monkeypatch):
+    pytest.importorskip("openai")
+    from rag.gpt import GPTFunctionCaller
+    monkeypatch.setattr(coalescencia, "OBSOLETO_S", 60.0)
+    llamadas = []
+
+    def create(**kwargs):
+        llamadas.append(kwargs)
+        mensaje = type("M", (), {"content": f"respuesta {len(llamadas)}", "function_call": None})()
+        return type("R", (), {"choices": [type("C", (), {"message": mensaje})()], "usage": None})()
+
+    gpt = GPTFunctionCaller(api_key="sk-test")
+    gpt.client = type("O", (), {"chat": type("Ch", (), {"completions": type("Co", (), {"create": staticmethod(create)})()})()})()
+
+    # Sin caché compartida cada pregunta repetida llama a OpenAI, pero en primer plano y con su propia respuesta
+    assert gpt.call_step_1("¿Qué gasto hay?").choices[0].message.content == "respuesta 1"
+    assert gpt.call_step_1("¿Qué gasto hay?").choices[0].message.content == "respuesta 2"
+    assert coalescencia.en_vuelo() == 0
+
+
+def test_los_aciertos_retrasan_la_expulsion(monkeypatch):
+    monkeypatch.setattr(coalescencia, "MAX_ULTIMOS", 2)
+    construidas = []
+
+    def leer(clave):
+        return coalescencia.compartir(clave, lambda: construidas.append(clave) or clave, fresco_s=60.0)
+
+    leer("a"), leer("b")
+    leer("a")  # acierto: 'a' pasa a ser la usada más recientemente
+    leer("c")  # expulsa 'b', no 'a'
+    leer("a"), leer("b")
+    assert construidas == ["a", "b", "c", "b"]
@@ -0,0 +1,148 @@
+import json
+import shutil
+import sqlite3
+from contextlib import contextmanager
+import create_db
+
+
+class _CursorSQLite:
+    # El SQL de las migraciones es de Postgres: lo mínimo para que SQLite lo acepte
+    def __init__(self, conn):
+        self._cur = conn.cursor()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cur.close()
+
+    def execute(self, sql, params=None):
+        if params is not None:
+            self._cur.execute(sql.replace("%s", "?"), params)
+        elif sql.lstrip().upper().startswith("SELECT"):
+            self._cur.execute(sql)
+        else:
+            self._cur.executescript(sql.replace("NOW()", "CURRENT_TIMESTAMP"))
+
+    def fetchall(self):
+        return self._cur.fetchall()
+
+
+class _ConexionSQLite:
+    def __init__(self, ruta):
+        self._conn = sqlite3.connect(ruta)
+
+    def cursor(self):
+        return _CursorSQLite(self._conn)
+
+
+class ClienteSQLite:
+    """
+    Lo que usa aplicar_migraciones_postgres de ClientePostgres (conexion()), sobre un fichero SQLite.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = str(ruta)
+
+    @contextmanager
+    def conexion(self):
+        conn = _ConexionSQLite(self.ruta)
+        try:
+            yield conn
+            conn._conn.commit()
+        except Exception:
+            conn._conn.rollback()
+            raise
+        finally:
+            conn._conn.close()
+
+    def consultar(self, sql):
+        with sqlite3.connect(self.ruta) as conn:
+            return conn.execute(sql).fetchall()
+
+
+def test_listar_migraciones_en_orden_de_version(tmp_path, monkeypatch):
+    for nombre in ["0010_decima", "0002_segunda", "0001_primera"]:
+        (tmp_path / f"{nombre}.sql").write_text(f"-- {nombre}", encoding="utf-8")
+    (tmp_path / "LEEME.txt").write_text("no es una migración", encoding="utf-8")
+    monkeypatch.setattr(create_db, "MIGRACIONES_DIR", str(tmp_path))
+
+    assert create_db.listar_migraciones() == [
+        (1, "0001_primera", "-- 0001_primera"), (2, "0002_segunda", "-- 0002_segunda"), (10, "0010_decima", "-- 0010_decima")]
+
+
+def test_las_migraciones_del_repo_tienen_versiones_consecutivas():
+    versiones = [v for v, _, _ in create_db.listar_migraciones()]
+    assert versiones == list(range(1, len(versiones) + 1))
+
+
+def test_aplicar_migraciones_en_sqlite_solo_aplica_las_pendientes(tmp_path, monkeypatch):
+    cliente = ClienteSQLite(tmp_path / "contratos.db")
+    nombres = [n for _, n, _ in create_db.listar_migraciones()]
+
+    assert create_db.aplicar_migraciones_postgres(cliente) == nombres
+    assert [n for (n,) in cliente.consultar("SELECT nombre FROM schema_migrations ORDER BY version")] == nombres
+    indices = {n for (n,) in cliente.consultar("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {indice for _, _, indice in create_db.CONSULTAS_CALIENTES} <= indices
+
+    # Volver a ejecutar no repite nada; una migración nueva se aplica sola
+    assert create_db.aplicar_migraciones_postgres(cliente) == []
+    migraciones = tmp_path / "migrations"
+    shutil.copytree(create_db.MIGRACIONES_DIR, migraciones)
+    (migraciones / "0099_notas.sql").write_text("ALTER TABLE contratos ADD COLUMN notas TEXT;", encoding="utf-8")
+    monkeypatch.setattr(create_db, "MIGRACIONES_DIR", str(migraciones))
+    assert create_db.aplicar_migraciones_postgres(cliente) == ["0099_notas"]
+    assert "notas" in [fila[1] for fila in cliente.consultar("PRAGMA table_info(contratos)")]
+
+
+# Salida de EXPLAIN (FORMAT JSON) de Postgres para un join facturas -> contratos
+PLAN = {
+    "Node Type": "Nested Loop",
+    "Plans": [
+        {"Node Type": "Index Scan", "Index Name": "idx_contratos_centro", "Relation Name": "contratos"},
+        {"Node Type": "Bitmap Heap Scan", "Relation Name": "facturas",
+         "Plans": [{"Node Type": "Bitmap Index Scan", "Index Name": "idx_facturas_contrato_fecha"}]},
+        {"Node Type": "Seq Scan", "Relation Name": "proveedores"},
+    ],
+}
+
+
+def test_indices_del_plan_recorre_todos_los_nodos():
+    assert create_db._indices_del_plan(PLAN) == {"idx_contratos_centro", "idx_facturas_contrato_fecha"}
+    assert create_db._indices_del_plan({"Node Type": "Seq Scan", "Relation Name": "facturas"}) == set()
+
+
+class _CursorExplain:
+    def __init__(self, planes):
+        self.planes, self.sql = planes, []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, sql):
+        self.sql.append(sql)
+
+    def fetchone(self):
+        return (json.dumps([{"Plan": self.planes[self.sql[-1]]}]),)
+
+
+def test_comprobar_indices_falla_si_una_consulta_no_usa_su_indice(capsys):
+    planes = {"EXPLAIN (FORMAT JSON) " + sql: {"Node Type": "Index Scan", "Index Name": indice}
+              for _, sql, indice in create_db.CONSULTAS_CALIENTES}
+    cursor = _CursorExplain(planes)
+
+    class Cliente:
+        @contextmanager
+        def conexion(self):
+            yield type("Conexion", (), {"cursor": lambda _: cursor})()
+
+    assert create_db.comprobar_indices(Cliente())
+    assert cursor.sql[0] == "SET LOCAL enable_seqscan = off"
+
+    nombre, sql, _ = create_db.CONSULTAS_CALIENTES[0]
+    planes["EXPLAIN (FORMAT JSON) " + sql] = {"Node Type": "Seq Scan", "Relation Name": "proveedores"}
+    assert not create_db.comprobar_indices(Cliente())
+    assert f"❌ {nombre}" in capsys.readouterr().out
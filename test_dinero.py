@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+from rag import db_queries
+from rag.dinero import a_centimos, a_euros, formatear
+from rag.memoria import ClienteMemoria
+from rag.motor_sql import MotorSQL
+from rag.snapshot import exportar_snapshot, ClienteSnapshot
+
+
+def _cliente(n: int = 10_000) -> ClienteMemoria:
+    # n facturas de 0,10 €: en float la suma se desvía, en céntimos da justo n * 10
+    return ClienteMemoria({
+        "facturas": pd.DataFrame({
+            "id": range(1, n + 1), "contrato_id": 1, "numero_factura": [f"F-{i}" for i in range(n)],
+            "fecha_factura": "2023-06-01", "concepto": "Limpieza", "total": 0.1,
+        }),
+        "contratos": pd.DataFrame([
+            {"id": 1, "proveedor_id": 1, "centro": "Residencia Norte", "fecha_contrato": "2022-01-01",
+             "fecha_vencimiento": "2030-01-01", "importe": 19.99}]),
+    })
+
+
+def test_a_centimos_redondea_y_rellena_vacios():
+    valores = a_centimos(pd.Series([0.1, 0.29, 1234.56, None, "12.3"], dtype=object))
+    assert valores.dtype == np.int64
+    assert valores.tolist() == [10, 29, 123456, 0, 1230]
+
+
+def test_formatear_sin_pasar_por_float():
+    assert formatear(123456) == "1234.56"
+    assert formatear(-5) == "-0.05"
+    assert formatear(123456789, miles=True) == "1,234,567.89"
+    assert a_euros(1999) == 19.99
+
+
+def test_suma_exacta_en_centimos():
+    cliente = _cliente()
+    assert f"{sum([0.1] * 10_000):.10f}" != "1000.0000000000"
+    df = db_queries.get_facturas(cliente, "total", centimos=True)
+    assert df["total"].dtype == np.int64 and int(df["total"].sum()) == 100_000
+    assert db_queries.gasto_en_rango_fechas(cliente, "01/01/2023", "31/12/2023").endswith(" 1000.00.")
+
+
+def test_backends_devuelven_los_mismos_centimos(tmp_path):
+    cliente = _cliente(50)
+    esperado = db_queries.get_facturas(cliente, "numero_factura,total", centimos=True)
+
+    exportar_snapshot(cliente, str(tmp_path))
+    for otro in (ClienteSnapshot(str(tmp_path)), MotorSQL(cliente, "duckdb")):
+        df = db_queries.get_facturas(otro, "numero_factura,total", centimos=True)
+        pd.testing.assert_frame_equal(df.reset_index(drop=True), esperado.reset_index(drop=True))
+        # Sin centimos=True el dinero sigue llegando en euros
+        assert db_queries.get_facturas(otro, "total")["total"].iloc[0] == 0.1
@@ -0,0 +1,98 @@
+import os
+import json
+import threading
+import pytest
+from rag.extraccion_pdf import ExtractorPDF, Extraccion, hash_contenido
+
+fitz = pytest.importorskip("fitz")
+
+
+def _pdf(*paginas) -> bytes:
+    doc = fitz.open()
+    for texto in paginas:
+        doc.new_page().insert_text((72, 72), texto)
+    return doc.tobytes()
+
+
+def _esperar(extraccion: Extraccion) -> dict:
+    paginas = dict(extraccion.iterar())
+    assert extraccion.terminada and extraccion.error is None
+    return paginas
+
+
+def test_acierto_de_cache_no_vuelve_a_extraer(tmp_path, monkeypatch):
+    data = _pdf("Contrato de limpieza", "Cláusula de penalización")
+    paginas = _esperar(ExtractorPDF(cache_dir=str(tmp_path)).extraer(data))
+    assert "limpieza" in paginas[0] and "penalización" in paginas[1]
+    assert os.path.exists(tmp_path / f"{hash_contenido(data)}.json")
+
+    # Otra instancia (otro rerun) sirve el mismo contenido desde disco, sin lanzar la extracción
+    otro = ExtractorPDF(cache_dir=str(tmp_path))
+    monkeypatch.setattr(otro, "_ejecutar", lambda *a: pytest.fail("no debería extraer"))
+    cacheada = otro.extraer(data)
+    assert cacheada.terminada
+    assert dict(cacheada.iterar()) == paginas
+
+
+def test_offsets_marcan_el_inicio_de_cada_pagina(tmp_path):
+    data = _pdf("Contrato de limpieza", "Cláusula de penalización", "Anexo de precios")
+    extraccion = ExtractorPDF(cache_dir=str(tmp_path)).extraer(data)
+    paginas = _esperar(extraccion)
+    texto, offsets = extraccion.texto(), extraccion.offsets()
+    assert [texto[o:o + len(paginas[i])] for i, o in enumerate(offsets)] == [paginas[0], paginas[1], paginas[2]]
+
+    # Se guardan en la caché y vuelven con el texto en el siguiente acierto
+    registro = json.loads((tmp_path / f"{hash_contenido(data)}.json").read_text(encoding="utf-8"))
+    assert registro["offsets"] == offsets
+    cacheada = ExtractorPDF(cache_dir=str(tmp_path)).extraer(data)
+    assert cacheada.texto() == texto and cacheada.offsets() == offsets
+
+
+def test_abrir_un_pdf_no_bloquea_las_demas_extracciones(tmp_path, monkeypatch):
+    lento, rapido = _pdf("PDF lento"), _pdf("PDF rápido")
+    abrir, dentro, seguir = fitz.open, threading.Event(), threading.Event()
+
+    def abrir_con_espera(*args, **kwargs):
+        if kwargs.get("stream") == lento:
+            dentro.set()
+            seguir.wait(10)
+        return abrir(*args, **kwargs)
+
+    monkeypatch.setattr(fitz, "open", abrir_con_espera)
+    extractor = ExtractorPDF(cache_dir=str(tmp_path))
+    hilo = threading.Thread(target=extractor.extraer, args=(lento,))
+    hilo.start()
+    try:
+        assert dentro.wait(10)
+        # Mientras el otro hilo sigue abriendo su PDF, este extrae el suyo sin esperarle
+        assert "rápido" in _esperar(extractor.extraer(rapido))[0]
+    finally:
+        seguir.set()
+        hilo.join(10)
+
+
+def test_expulsa_las_entradas_usadas_hace_mas_tiempo(tmp_path):
+    extractor = ExtractorPDF(cache_dir=str(tmp_path), max_bytes=10 ** 9)
+    for n, clave in enumerate(["vieja", "media", "nueva"]):
+        trabajo = Extraccion(clave, 1)
+        trabajo.paginas = {0: "x" * 1000}
+        extractor._guardar_cache(trabajo)
+        os.utime(tmp_path / f"{clave}.json", (1000 + n, 1000 + n))
+
+    # Leer 'vieja' la marca como reciente: la siguiente en salir es 'media'
+    assert extractor._leer_cache("vieja") is not None
+    extractor.max_bytes = 2 * os.path.getsize(tmp_path / "nueva.json")
+    extractor._expulsar()
+    assert sorted(os.listdir(tmp_path)) == ["nueva.json", "vieja.json"]
+
+
+@pytest.mark.parametrize("contenido", ['{"paginas": ["a", ', '{"otra": 1}', '{"paginas": 3, "offsets": []}',
+                                       '{"paginas": ["a"]}', '{"paginas": ["a"], "offsets": [0, 2]}'])
+def test_entrada_corrupta_se_descarta_y_se_vuelve_a_extraer(tmp_path, contenido):
+    data = _pdf("Factura de mantenimiento")
+    ruta = tmp_path / f"{hash_contenido(data)}.json"
+    ruta.write_text(contenido, encoding="utf-8")
+
+    paginas = _esperar(ExtractorPDF(cache_dir=str(tmp_path)).extraer(data))
+    assert "mantenimiento" in paginas[0]
+    assert json.loads(ruta.read_text(encoding="utf-8")) == {"paginas": [paginas[0]], "offsets": [0]}
@@ -0,0 +1,129 @@
+import os
+import time
+import shutil
+import pandas as pd
+import pytest
+from rag import cache_compartida, db_queries, indice_documentos
+from rag.indice_documentos import construir_indice, cargar_indice, tokenizar
+from rag.memoria import ClienteMemoria
+from rag.pipeline import process_user_question
+
+
+def _pdf(ruta, paginas):
+    fitz = pytest.importorskip("fitz")
+    doc = fitz.open()
+    for texto in paginas:
+        doc.new_page().insert_text((72, 72), texto)
+    doc.save(str(ruta))
+    doc.close()
+
+
+@pytest.fixture
+def documentos(tmp_path):
+    carpeta = tmp_path / "docs"
+    (carpeta / "2023").mkdir(parents=True)
+    _pdf(carpeta / "contrato_limpieza.pdf", ["Contrato de limpieza", "Cláusula de penalización por retraso"])
+    _pdf(carpeta / "2023" / "factura_gas.pdf", ["Factura de gas natural", "Revisión del IPC aplicada"])
+    (carpeta / "acta.txt").write_text("Acta de la reunión: penalización, penalización y revisión.", encoding="utf-8")
+    cliente = ClienteMemoria({
+        "contratos": pd.DataFrame([{"id": 1, "centro": "Residencia Norte"}, {"id": 2, "centro": "Residencia Sur"}]),
+        "facturas": pd.DataFrame([{"id": 10, "contrato_id": 2, "numero_factura": "F-10"}]),
+        "documentos": pd.DataFrame([
+            {"id": 1, "contrato_id": 1, "factura_id": None, "nombre_archivo": "contrato_limpieza.pdf"},
+            {"id": 2, "contrato_id": None, "factura_id": 10, "nombre_archivo": "factura_gas.pdf"},
+            {"id": 3, "contrato_id": 2, "factura_id": None, "nombre_archivo": "acta.txt"},
+            {"id": 4, "contrato_id": 2, "factura_id": None, "nombre_archivo": "no_existe.pdf"},
+        ]),
+    })
+    return cliente, str(carpeta), str(tmp_path / "indice")
+
+
+def test_tokenizar_sin_tildes_ni_stopwords():
+    assert tokenizar("La Cláusula de PENALIZACIÓN") == ["clausula", "penalizacion"]
+
+
+def test_indexa_y_enlaza_con_contratos_y_facturas(documentos):
+    cliente, docs_dir, destino = documentos
+    resumen = construir_indice(cliente, docs_dir, destino, max_workers=2)
+    assert (resumen["documentos"], resumen["ficheros_extraidos"], resumen["sin_fichero"]) == (3, 3, 1)
+
+    indice = cargar_indice(destino)
+    resultados = indice.buscar("penalización")
+    # El acta repite el término en un texto corto: va primero
+    assert [r["documento_id"] for r in resultados] == [3, 1]
+    assert "penalización" in resultados[1]["fragmento"]
+
+    gas = indice.buscar("revision ipc gas")[0]
+    assert (gas["documento_id"], gas["factura_id"], gas["contrato_id"], gas["centro"]) == (2, 10, 2, "Residencia Sur")
+    assert indice.buscar("inexistente") == []
+
+
+def test_reindexar_reutiliza_los_ficheros_sin_cambios(documentos):
+    cliente, docs_dir, destino = documentos
+    primera = construir_indice(cliente, docs_dir, destino, max_workers=2)
+    time.sleep(0.01)
+    with open(f"{docs_dir}/acta.txt", "a", encoding="utf-8") as f:
+        f.write(" Nueva cláusula de rescisión.")
+    segunda = construir_indice(cliente, docs_dir, destino, max_workers=2)
+    assert segunda["version"] != primera["version"]
+    assert (segunda["ficheros_extraidos"], segunda["ficheros_reutilizados"]) == (1, 2)
+    assert cargar_indice(destino).buscar("rescision")[0]["documento_id"] == 3
+
+
+def test_intencion_del_chatbot(documentos, monkeypatch):
+    cliente, docs_dir, destino = documentos
+    construir_indice(cliente, docs_dir, destino, max_workers=2)
+    monkeypatch.setattr(indice_documentos, "INDICE_DIR", destino)
+    respuesta = process_user_question(cliente, "Busca en los documentos la cláusula de penalización", None)
+    assert respuesta.startswith("Documentos más relevantes para 'la cláusula de penalización'")
+    assert "acta.txt · contrato 2, Residencia Sur" in respuesta
+
+
+class ClienteRemoto(ClienteMemoria):
+    # Como Supabase: las lecturas pasan por la caché compartida
+    datos_locales = False
+
+
+def test_indexa_lo_recien_ingestado_aunque_este_cacheado(documentos, tmp_path):
+    cliente, docs_dir, destino = documentos
+    remoto = ClienteRemoto(cliente.frames)
+    cache_compartida.configurar(f"sqlite:///{tmp_path / 'cache.db'}")
+    try:
+        assert len(db_queries._tabla(remoto, "documentos")) == 4  # queda en la caché compartida
+        with open(os.path.join(docs_dir, "anexo.txt"), "w", encoding="utf-8") as f:
+            f.write("Anexo con la cláusula de rescisión.")
+        remoto.table("documentos").insert({"contrato_id": 1, "factura_id": None, "nombre_archivo": "anexo.txt"}).execute()
+
+        resumen = construir_indice(remoto, docs_dir, destino, max_workers=2)
+        assert (resumen["documentos"], resumen["sin_fichero"]) == (4, 1)
+    finally:
+        cache_compartida.configurar(None)
+
+
+def test_busqueda_con_version_borrada_por_otro_proceso(documentos, monkeypatch):
+    cliente, docs_dir, destino = documentos
+    monkeypatch.setattr(indice_documentos, "INDICE_DIR", destino)
+    construir_indice(cliente, docs_dir, destino, max_workers=2)
+    vieja = cargar_indice(destino)
+    # Otro proceso publica dos versiones: la que tenemos cargada se borra
+    construir_indice(cliente, docs_dir, destino, max_workers=2)
+    construir_indice(cliente, docs_dir, destino, max_workers=2)
+    assert not os.path.exists(vieja.ruta)
+    with pytest.raises(FileNotFoundError):
+        vieja.texto(0)
+
+    cargas = iter([vieja])
+    monkeypatch.setattr(db_queries, "cargar_indice", lambda: next(cargas, None) or cargar_indice(destino))
+    respuesta = db_queries.buscar_documentos(cliente, "penalización")
+    assert respuesta.startswith("Documentos más relevantes para 'penalización'")
+
+
+def test_reindexar_si_otro_proceso_borra_la_version_anterior(documentos, monkeypatch):
+    cliente, docs_dir, destino = documentos
+    construir_indice(cliente, docs_dir, destino, max_workers=2)
+    anterior = cargar_indice(destino)
+    monkeypatch.setattr(indice_documentos, "cargar_indice", lambda directorio: anterior)
+    shutil.rmtree(anterior.ruta)
+
+    resumen = construir_indice(cliente, docs_dir, destino, max_workers=2)
+    assert (resumen["documentos"], resumen["ficheros_extraidos"], resumen["ficheros_reutilizados"]) == (3, 3, 0)
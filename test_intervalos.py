@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+from rag.intervalos import IndiceIntervalos
+
+
+def _contratos(n: int = 500, seed: int = 7) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    inicio = np.datetime64("2020-01-01") + rng.integers(0, 2000, n).astype("timedelta64[D]")
+    venc = inicio + rng.integers(-30, 1500, n).astype("timedelta64[D]")  # algunos mal cargados (venc < inicio)
+    df = pd.DataFrame({
+        "id": np.arange(1, n + 1),
+        "centro": [f"Residencia {i % 7}" for i in range(n)],
+        "fecha_contrato": np.datetime_as_string(inicio, unit="D").astype(object),
+        "fecha_vencimiento": np.datetime_as_string(venc, unit="D").astype(object),
+        "importe": np.round(rng.uniform(100, 5000, n), 2),
+    })
+    df.loc[::50, "fecha_vencimiento"] = None
+    df.loc[::40, "fecha_contrato"] = None
+    return df
+
+
+def _fechas(df, columna):
+    return pd.to_datetime(df[columna], errors="coerce")
+
+
+def test_consultas_iguales_que_un_recorrido_completo():
+    df = _contratos()
+    indice = IndiceIntervalos(df)
+    venc, inicio = _fechas(df, "fecha_vencimiento"), _fechas(df, "fecha_contrato")
+
+    for fecha in ["2019-01-01", "2021-06-15", "2023-03-01", "2030-01-01"]:
+        d = pd.Timestamp(fecha)
+        assert indice.vencen_antes_de(d)["id"].tolist() == df[venc < d]["id"].tolist()
+        hasta = d + pd.Timedelta(days=180)
+        assert indice.vencen_entre(d, hasta)["id"].tolist() == df[(venc >= d) & (venc <= hasta)]["id"].tolist()
+        vigentes = df[venc.notna() & (inicio.isna() | (inicio <= d)) & (venc > d)]
+        assert indice.vigentes_en(d)["id"].tolist() == vigentes["id"].tolist()
+
+
+def test_vigentes_en_los_bordes_de_los_intervalos():
+    # Fechas muy repetidas: muchos contratos empiezan o vencen justo el día consultado
+    df = _contratos(n=400, seed=3)
+    df["fecha_contrato"] = pd.to_datetime(df["fecha_contrato"]).dt.to_period("Q").dt.start_time.dt.strftime("%Y-%m-%d")
+    indice = IndiceIntervalos(df)
+    venc, inicio = _fechas(df, "fecha_vencimiento"), _fechas(df, "fecha_contrato")
+    bordes = pd.concat([inicio, venc]).dropna().drop_duplicates()
+    for d in pd.concat([bordes, bordes - pd.Timedelta(days=1)]).sort_values()[::3]:
+        vigentes = df[venc.notna() & (inicio.isna() | (inicio <= d)) & (venc > d)]
+        assert indice.vigentes_en(d)["id"].tolist() == vigentes["id"].tolist()
+
+
+def test_el_arbol_tiene_profundidad_logaritmica():
+    indice = IndiceIntervalos(_contratos(n=4000))
+
+    def profundidad(nodo):
+        return 0 if nodo < 0 else 1 + max(profundidad(indice._izq[nodo]), profundidad(indice._der[nodo]))
+
+    assert profundidad(0) <= np.log2(len(indice)) + 1
+
+
+def test_serie_as_of_cuenta_los_vigentes_de_cada_fecha():
+    df = _contratos()
+    indice = IndiceIntervalos(df)
+    serie = indice.serie_vigentes("2020-01-01", "2026-01-01")
+    for fecha, n in zip(serie["fecha"], serie["contratos_vigentes"]):
+        assert n == len(indice.vigentes_en(fecha))
+    assert (indice.n_vigentes(serie["fecha"]) == serie["contratos_vigentes"].to_numpy()).all()
+
+    fecha = serie["fecha"].iloc[20]
+    esperado = pd.to_numeric(indice.vigentes_en(fecha)["importe"]).sum()
+    assert abs(serie["importe_vigente"].iloc[20] - esperado) < 0.01
+
+
+def test_sin_contratos():
+    indice = IndiceIntervalos(pd.DataFrame(columns=["id", "centro", "fecha_contrato", "fecha_vencimiento", "importe"]))
+    assert indice.n_contratos == 0
+    assert indice.vencen_antes_de("2024-01-01").empty
+    assert indice.vigentes_en("2024-01-01").empty
+    assert indice.serie_vigentes("2024-01-01", "2024-03-01")["contratos_vigentes"].tolist() == [0, 0, 0]
@@ -0,0 +1,102 @@
+import csv
+import json
+import pandas as pd
+from rag.lote import leer_preguntas, expandir_plantillas, responder_lote, guardar_resultados
+from rag.memoria import ClienteMemoria
+
+
+def _cliente() -> ClienteMemoria:
+    return ClienteMemoria({
+        "proveedores": pd.DataFrame([{"id": 1, "cif_proveedor": "B1", "nombre_proveedor": "Gas Norte S.L."}]),
+        "contratos": pd.DataFrame([
+            {"id": 1, "proveedor_id": 1, "centro": "Residencia 1", "fecha_vencimiento": "2030-01-01", "importe": 10.0},
+            {"id": 2, "proveedor_id": 1, "centro": "Residencia 2", "fecha_vencimiento": "2030-01-01", "importe": 20.0},
+        ]),
+        "facturas": pd.DataFrame([
+            {"id": 1, "contrato_id": 1, "numero_factura": "F-1", "fecha_factura": "2023-05-01", "total": 100.0},
+            {"id": 2, "contrato_id": 2, "numero_factura": "F-2", "fecha_factura": "2024-05-01", "total": 50.0},
+        ]),
+    })
+
+
+def test_leer_y_expandir_plantillas(tmp_path):
+    ruta = tmp_path / "preguntas.txt"
+    ruta.write_text("# comentario\n¿Cuál es el gasto por residencia {centro}?\n\nFacturas más costosas\n", encoding="utf-8")
+    preguntas = expandir_plantillas(leer_preguntas(str(ruta)), centros=["Residencia 1", "Residencia 2"], years=[2023])
+    assert [p["pregunta"] for p in preguntas] == [
+        "¿Cuál es el gasto por residencia Residencia 1?",
+        "¿Cuál es el gasto por residencia Residencia 2?",
+        "Facturas más costosas",
+    ]
+    assert preguntas[0]["plantilla"] == "¿Cuál es el gasto por residencia {centro}?"
+    assert preguntas[2]["plantilla"] is None
+
+
+def test_responder_lote_reutiliza_consultas_iguales(tmp_path):
+    preguntas = expandir_plantillas([
+        {"pregunta": "¿Cuál es el gasto por residencia {centro}?", "centro": None, "year": None},
+        {"pregunta": "¿Cuáles son las facturas más costosas?", "centro": None, "year": None},
+        {"pregunta": "Dime las facturas más costosas", "centro": None, "year": None},
+    ], centros=["Residencia 1", "Residencia 2"])
+
+    filas = responder_lote(_cliente(), preguntas, workers=2)
+    assert [f["intent"] for f in filas] == ["get_gastos_por_residencia"] * 2 + ["facturas_mas_elevadas"] * 2
+    assert filas[0]["respuesta"].endswith("100.00 €.")
+    assert filas[1]["respuesta"].endswith("50.00 €.")
+    assert filas[3]["reutilizada"] and filas[3]["respuesta"] == filas[2]["respuesta"]
+    assert not any(f["error"] for f in filas)
+
+    guardar_resultados(filas, str(tmp_path / "r.csv"))
+    guardar_resultados(filas, str(tmp_path / "r.json"), {"preguntas": len(filas)})
+    with open(tmp_path / "r.csv", encoding="utf-8") as f:
+        assert len(list(csv.DictReader(f))) == 4
+    with open(tmp_path / "r.json", encoding="utf-8") as f:
+        assert json.load(f)["resumen"] == {"preguntas": 4}
+
+
+def test_centro_de_la_plantilla_aunque_el_regex_no_lo_reconozca():
+    cliente = _cliente()
+    cliente.table("contratos").insert({"proveedor_id": 1, "centro": "Fundación San José", "importe": 5.0}).execute()
+    cliente.table("facturas").insert({"contrato_id": 3, "numero_factura": "F-3", "fecha_factura": "2023-06-01",
+                                      "total": 30.0}).execute()
+    preguntas = expandir_plantillas([{"pregunta": "Gasto por residencia en {centro}", "centro": None, "year": None}],
+                                    centros=["Fundación San José", "Residencia 1"])
+
+    filas = responder_lote(cliente, preguntas)
+    assert [f["respuesta"] for f in filas] == [
+        "El gasto total para la residencia Fundación San José es de 30.00 €.",
+        "El gasto total para la residencia Residencia 1 es de 100.00 €.",
+    ]
+    assert not any(f["reutilizada"] for f in filas)
+
+
+def test_centro_de_la_fila_no_separa_intenciones_que_no_lo_usan():
+    preguntas = [{"pregunta": "¿Cuál es la factura más reciente?", "centro": centro, "year": 2023}
+                 for centro in ("Residencia 1", "Residencia 2")]
+    filas = responder_lote(_cliente(), preguntas)
+    assert [f["intent"] for f in filas] == ["factura_mas_reciente"] * 2
+    assert [f["reutilizada"] for f in filas] == [False, True]
+    assert filas[0]["respuesta"] == filas[1]["respuesta"]
+
+
+def test_argumentos_de_cada_intencion_coinciden_con_el_mapeo():
+    from rag.pipeline import _mapeo, argumentos_intencion
+
+    class Registro(dict):
+        def __init__(self):
+            super().__init__()
+            self.leidos = set()
+
+        def get(self, clave, defecto=None):
+            self.leidos.add(clave)
+            return super().get(clave, defecto)
+
+    cliente = _cliente()
+    for intencion in _mapeo(cliente, {}):
+        parsed_intent = Registro()
+        try:
+            _mapeo(cliente, parsed_intent)[intencion]()
+        except Exception:
+            pass  # basta con saber qué argumentos ha leído
+        assert parsed_intent.leidos == set(argumentos_intencion(intencion)), intencion
+    assert argumentos_intencion("get_gastos_por_residencia") == ("residencia", "centro")
@@ -0,0 +1,197 @@
+import pandas as pd
+import pytest
+from rag import db_queries
+from rag.memoria import ClienteMemoria
+from rag.motor_sql import MotorSQL
+
+# Funciones de db_queries con rama SQL; la referencia es la versión pandas sobre ClienteMemoria
+CONSULTAS = [
+    ("facturas_importe_mayor", {"importe": 150.0}),
+    ("proveedor_mas_contratos", {}),
+    ("factura_mas_reciente", {}),
+    ("gasto_en_rango_fechas", {"fecha_inicio": "01/01/2023", "fecha_fin": "31/12/2023"}),
+    ("contratos_vencen_antes_de", {"fecha_limite": "01/01/2024"}),
+    ("gasto_proveedor_en_year", {"proveedor": "limp", "year": 2023}),
+    ("facturas_mas_elevadas", {"top_n": 3}),
+    ("ranking_proveedores_por_importe", {"limit": 5, "year": 2023}),
+    ("top_conceptos_global", {}),
+    ("get_gastos_por_residencia", {"residencia": "Residencia Norte"}),
+    ("get_gastos_por_residencia", {"residencia": "residencia nrte"}),
+    ("facturas_de_proveedor", {"proveedor": "Limpiezas Sur S.L.", "year": 2023}),
+    ("get_facturas_por_proveedor", {"proveedor": "cocinas norte", "year": 2023}),
+    ("get_proveedores_con_contratos_vigentes", {}),
+    ("get_contratos_vencen_proximos_meses", {}),
+    ("get_top_centros_mayores_gastos", {"year": 2023}),
+    ("contrato_mas_costoso", {}),
+    ("top_contratos_mas_costosos", {}),
+]
+
+
+def _frames() -> dict:
+    # Sin empates en importes ni en recuentos, para que el orden no dependa del motor
+    return {
+        "proveedores": pd.DataFrame([
+            {"id": 1, "cif_proveedor": "B1", "nombre_proveedor": "Limpiezas Sur S.L.", "tipo_servicio": "limpieza"},
+            {"id": 2, "cif_proveedor": "B2", "nombre_proveedor": "Cocinas Norte S.A.", "tipo_servicio": "cocina"},
+            {"id": 3, "cif_proveedor": "B3", "nombre_proveedor": "Ascensores 100%_", "tipo_servicio": "mantenimiento"},
+        ]),
+        "contratos": pd.DataFrame([
+            {"id": 1, "proveedor_id": 1, "centro": "Residencia Norte", "fecha_contrato": "2022-01-01",
+             "fecha_vencimiento": "2023-06-30", "importe": 1200.0},
+            {"id": 2, "proveedor_id": 1, "centro": "Residencia Sur", "fecha_contrato": "2022-03-01",
+             "fecha_vencimiento": "2030-12-31", "importe": 800.5},
+            {"id": 3, "proveedor_id": 1, "centro": "Residencia Este", "fecha_contrato": "2023-01-01",
+             "fecha_vencimiento": "2099-01-01", "importe": None},
+            {"id": 4, "proveedor_id": 2, "centro": "Residencia Norte", "fecha_contrato": "2021-05-01",
+             "fecha_vencimiento": "2022-05-01", "importe": 3000.0},
+        ]),
+        "facturas": pd.DataFrame([
+            {"id": 1, "contrato_id": 1, "numero_factura": "F-1", "fecha_factura": "2023-02-01",
+             "concepto": "Limpieza", "total": 100.0},
+            {"id": 2, "contrato_id": 1, "numero_factura": "F-2", "fecha_factura": "2023-12-31",
+             "concepto": "Limpieza", "total": 250.25},
+            {"id": 3, "contrato_id": 2, "numero_factura": "F-3", "fecha_factura": "2024-01-01",
+             "concepto": "Cristales", "total": 75.5},
+            {"id": 4, "contrato_id": 4, "numero_factura": "F-4", "fecha_factura": "2023-07-15",
+             "concepto": "Menú", "total": 980.0},
+            {"id": 5, "contrato_id": 3, "numero_factura": "F-5", "fecha_factura": None,
+             "concepto": "Sin fecha", "total": 12.0},
+        ]),
+        "documentos": pd.DataFrame(columns=["id", "contrato_id", "factura_id", "nombre_archivo"]),
+    }
+
+
+def _normalizar(resultado):
+    if isinstance(resultado, pd.DataFrame):
+        return resultado.reset_index(drop=True).astype(str)
+    return resultado
+
+
+@pytest.mark.parametrize("motor", ["duckdb", "sqlite"])
+@pytest.mark.parametrize("nombre,kwargs", CONSULTAS)
+def test_motor_sql_igual_que_pandas(motor, nombre, kwargs):
+    if motor == "duckdb":
+        pytest.importorskip("duckdb")
+    fn = getattr(db_queries, nombre)
+    esperado = fn(ClienteMemoria(_frames()), **kwargs)
+    obtenido = fn(MotorSQL(ClienteMemoria(_frames()), motor), **kwargs)
+    if isinstance(esperado, pd.DataFrame):
+        pd.testing.assert_frame_equal(_normalizar(obtenido), _normalizar(esperado))
+    else:
+        assert obtenido == esperado
+
+
+@pytest.mark.parametrize("motor", ["duckdb", "sqlite"])
+def test_motor_sql_recarga_al_refrescar(motor):
+    if motor == "duckdb":
+        pytest.importorskip("duckdb")
+    base = ClienteMemoria(_frames())
+    motor_sql = MotorSQL(base, motor)
+    antes = db_queries.facturas_mas_elevadas(motor_sql, top_n=1)
+
+    base.table("facturas").insert({"contrato_id": 2, "numero_factura": "F-6",
+                                   "fecha_factura": "2024-03-01", "total": 5000.0}).execute()
+    assert db_queries.facturas_mas_elevadas(motor_sql, top_n=1) == antes
+
+    motor_sql.refrescar()
+    assert "F-6" in db_queries.facturas_mas_elevadas(motor_sql, top_n=1)
+
+
+@pytest.mark.parametrize("motor", ["duckdb", "sqlite"])
+def test_sumas_sql_en_centimos_exactos(motor):
+    if motor == "duckdb":
+        pytest.importorskip("duckdb")
+    # 0.1 no es representable en float: sumando euros en REAL (SQLite) se acumula error
+    frames = _frames()
+    frames["facturas"] = pd.DataFrame({"id": range(1, 1001), "contrato_id": 1, "numero_factura": "F",
+                                       "fecha_factura": "2023-05-01", "concepto": "x", "total": 0.1})
+    cliente = MotorSQL(ClienteMemoria(frames), motor)
+    suma = db_queries._sql(cliente, f"SELECT sum({db_queries._centimos_sql('total')}) AS s FROM facturas")["s"]
+    assert db_queries._enteros(suma).tolist() == [10000]
+    assert db_queries.gasto_en_rango_fechas(cliente, "01/01/2023", "31/12/2023") == \
+        "El gasto total entre 01/01/2023 y 31/12/2023 es 100.00."
+
+
+def test_fetch_frame_concurrente_con_refrescar():
+    import threading
+
+    motor_sql = MotorSQL(ClienteMemoria(_frames()), "sqlite")
+    errores, parar = [], threading.Event()
+
+    def leer():
+        try:
+            while not parar.is_set():
+                assert len(motor_sql.fetch_frame("facturas", "id,total", centimos=True)) == 5
+        except Exception as e:
+            errores.append(e)
+            parar.set()
+
+    lectores = [threading.Thread(target=leer) for _ in range(4)]
+    for t in lectores:
+        t.start()
+    for _ in range(200):
+        motor_sql.refrescar()
+    parar.set()
+    for t in lectores:
+        t.join()
+    assert errores == []
+
+
+def test_sin_version_recarga_pasado_el_ttl(monkeypatch):
+    from rag import motor_sql as modulo
+
+    base = ClienteMemoria(_frames())
+    motor_sql = MotorSQL(base, "sqlite")
+    assert motor_sql.sql("SELECT count(*) AS n FROM contratos")["n"][0] == 4
+    base.table("contratos").insert({"proveedor_id": 2, "centro": "Residencia Oeste", "importe": 1.0}).execute()
+    assert motor_sql.sql("SELECT count(*) AS n FROM contratos")["n"][0] == 4
+
+    monkeypatch.setattr(modulo, "TTL_SIN_VERSION_S", 0.0)
+    assert motor_sql.sql("SELECT count(*) AS n FROM contratos")["n"][0] == 5
+
+
+def test_la_conexion_sustituida_se_cierra_al_quedar_libre():
+    import sqlite3
+
+    motor_sql = MotorSQL(ClienteMemoria(_frames()), "sqlite")
+    libre = motor_sql._cargar()[2]
+    motor_sql.refrescar()
+    en_uso = motor_sql._usar()  # recarga: la anterior no la usa nadie y se cierra ya
+    with pytest.raises(sqlite3.ProgrammingError):
+        libre.execute("SELECT 1")
+    motor_sql.refrescar()
+    motor_sql.precargar()
+    # La que tenía una consulta en curso sigue abierta hasta que esta termina
+    assert en_uso.execute("SELECT count(*) FROM facturas").fetchone()[0] == 5
+    motor_sql._soltar(en_uso)
+    with pytest.raises(sqlite3.ProgrammingError):
+        en_uso.execute("SELECT 1")
+
+
+@pytest.mark.parametrize("motor", ["duckdb", "sqlite"])
+def test_sql_concurrente_con_refrescar(motor):
+    import threading
+
+    if motor == "duckdb":
+        pytest.importorskip("duckdb")
+    motor_sql = MotorSQL(ClienteMemoria(_frames()), motor)
+    errores, parar = [], threading.Event()
+
+    def consultar():
+        try:
+            while not parar.is_set():
+                assert motor_sql.sql("SELECT count(*) AS n FROM facturas")["n"][0] == 5
+        except Exception as e:
+            errores.append(e)
+            parar.set()
+
+    lectores = [threading.Thread(target=consultar) for _ in range(4)]
+    for t in lectores:
+        t.start()
+    for _ in range(30):
+        motor_sql.refrescar()
+        motor_sql.precargar()
+    parar.set()
+    for t in lectores:
+        t.join()
+    assert errores == [] and motor_sql._usos == {}
@@ -0,0 +1,115 @@
+import time
+import pandas as pd
+from rag import db_queries
+from rag.memoria import ClienteMemoria
+from rag.nombres import IndiceNombres, indice_nombres, normalizar
+
+
+def _indice() -> IndiceNombres:
+    df_prov = pd.DataFrame([
+        {"id": 1, "cif_proveedor": "B12345678", "nombre_proveedor": "Lavandería Industrial Castilla S.L."},
+        {"id": 2, "cif_proveedor": "A87654321", "nombre_proveedor": "Energía del Atlántico S.A."},
+        {"id": 3, "cif_proveedor": "B11111111", "nombre_proveedor": "Energia Mediterraneo S.L."},
+    ])
+    df_contr = pd.DataFrame([
+        {"id": 10, "centro": "Residencia San José"},
+        {"id": 11, "centro": "Residencia San Jose"},
+        {"id": 12, "centro": "Residencia Los Olivos"},
+    ])
+    return IndiceNombres.desde_frames(df_prov, df_contr)
+
+
+def test_normalizar_tildes_y_signos():
+    assert normalizar("  Lavandería  S.L. ") == "lavanderia s l"
+    assert normalizar(None) == ""
+
+
+def test_resolver_exacto_substring_y_cif():
+    indice = _indice()
+    assert indice.resolver("proveedor", "LAVANDERIA industrial castilla s.l.") == [1]
+    assert indice.resolver("proveedor", "avander") == [1]
+    assert indice.resolver("proveedor", "b12345678") == [1]
+    # Por el CIF se muestra el nombre del proveedor
+    assert indice.resolucion("proveedor", "b12345678").nombre == "Lavandería Industrial Castilla S.L."
+
+
+def test_prefijo_ambiguo_no_se_resuelve():
+    res = _indice().resolucion("proveedor", "energía")
+    assert res.ambigua and res.ids == []
+    assert [c.nombre for c in res.candidatos] == ["Energía del Atlántico S.A.", "Energia Mediterraneo S.L."]
+    assert _indice().resolver("centro", "Residencia") == []
+
+
+def test_no_aproxima_numeros_distintos():
+    df_contr = pd.DataFrame({"id": range(1, 101), "centro": [f"Residencia {i}" for i in range(1, 101)]})
+    indice = IndiceNombres.desde_frames(None, df_contr)
+    res = indice.resolucion("centro", "Residencia 999")
+    assert res.ids == [] and not res.ambigua
+    assert indice.resolver("centro", "residencia 9") == [9]
+    assert indice.resolver("centro", "Residncia 42") == [42]
+
+
+def test_resolver_con_erratas():
+    indice = _indice()
+    assert indice.resolver("proveedor", "lavanderia industrial castila") == [1]
+    assert indice.resolver("centro", "residencia los olibos") == [12]
+    assert indice.resolver("proveedor", "zzzz") == []
+    res = indice.resolucion("proveedor", "energia mediteraneo")
+    assert (res.ids, res.nombre, res.exacta) == ([3], "Energia Mediterraneo S.L.", False)
+
+
+def test_centros_con_y_sin_tilde_son_el_mismo():
+    assert _indice().resolver("centro", "San José") == [10, 11]
+
+
+def test_buscar_ordena_por_similitud():
+    candidatos = _indice().buscar("proveedor", "energia mediteraneo")
+    assert candidatos[0].ids == [3]
+    assert all(a.similitud >= b.similitud for a, b in zip(candidatos, candidatos[1:]))
+
+
+def test_resolucion_submilisegundo():
+    n = 5000
+    df_prov = pd.DataFrame({"id": range(1, n + 1),
+                            "cif_proveedor": [f"B{i:08d}" for i in range(1, n + 1)],
+                            "nombre_proveedor": [f"Servicios Integrales {i} S.L." for i in range(1, n + 1)]})
+    indice = IndiceNombres.desde_frames(df_prov, None)
+    inicio = time.perf_counter()
+    for _ in range(100):
+        indice.resolver("proveedor", "servicios integrales 4321 s.l.")
+    assert (time.perf_counter() - inicio) / 100 < 0.001
+
+
+def test_indice_se_reutiliza_por_cliente():
+    cliente = ClienteMemoria({
+        "proveedores": pd.DataFrame([{"id": 1, "cif_proveedor": "B1", "nombre_proveedor": "Gas Norte"}]),
+        "contratos": pd.DataFrame([{"id": 1, "proveedor_id": 1, "centro": "Residencia 1"}]),
+        "facturas": pd.DataFrame([{"id": 1, "contrato_id": 1, "numero_factura": "F-1",
+                                   "fecha_factura": "2023-05-01", "total": 10.0}]),
+    })
+    assert indice_nombres(cliente) is indice_nombres(cliente)
+    assert db_queries.facturas_de_proveedor(cliente, "gas nrte", 2023) == "Facturas de Gas Norte en 2023:\n- Factura F-1: 10.00 €"
+
+
+def _cliente_residencias() -> ClienteMemoria:
+    return ClienteMemoria({
+        "proveedores": pd.DataFrame([{"id": 1, "cif_proveedor": "B1", "nombre_proveedor": "Gas Norte"}]),
+        "contratos": pd.DataFrame([{"id": i, "proveedor_id": 1, "centro": f"Residencia {i}"} for i in range(1, 101)]),
+        "facturas": pd.DataFrame([{"id": i, "contrato_id": i, "numero_factura": f"F-{i}",
+                                   "fecha_factura": "2023-05-01", "total": 10.0} for i in range(1, 101)]),
+    })
+
+
+def test_residencia_inexistente_no_suma_la_mas_parecida():
+    respuesta = db_queries.get_gastos_por_residencia(_cliente_residencias(), "Residencia 999")
+    assert respuesta.startswith("No encontré ninguna residencia que coincida con 'Residencia 999'.")
+    assert "gasto total" not in respuesta
+
+
+def test_prefijo_ambiguo_pide_elegir():
+    respuesta = db_queries.get_gastos_por_residencia(_cliente_residencias(), "Residencia")
+    assert respuesta.startswith("Hay varias residencias que coinciden con 'Residencia': Residencia 1, Residencia 10,")
+    assert respuesta.endswith("(y 92 más). ¿A cuál te refieres?")
+    # Con erratas pero sin dudas: se responde nombrando la residencia resuelta
+    assert (db_queries.get_gastos_por_residencia(_cliente_residencias(), "residncia 42")
+            == "El gasto total para la residencia Residencia 42 es de 10.00 €.")
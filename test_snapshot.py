@@ -0,0 +1,121 @@
+import os
+import threading
+import pandas as pd
+import pytest
+from rag import cache_compartida, db_queries
+from rag.memoria import ClienteMemoria
+from rag.snapshot import exportar_snapshot, ClienteSnapshot, version_actual
+
+pytest.importorskip("pyarrow")
+
+
+class ClienteRemoto(ClienteMemoria):
+    # Como Supabase: las lecturas pasan por la caché compartida
+    datos_locales = False
+
+
+def _frames() -> dict:
+    return {
+        "proveedores": pd.DataFrame([
+            {"id": 1, "cif_proveedor": "B1", "nombre_proveedor": "Limpiezas Norte", "tipo_servicio": "limpieza"},
+        ]),
+        "contratos": pd.DataFrame([
+            {"id": 1, "proveedor_id": 1, "centro": "Residencia 1", "fecha_contrato": "2023-01-15",
+             "fecha_vencimiento": None, "importe": 1200.5},
+            {"id": 2, "proveedor_id": 1, "centro": "Residencia 2", "fecha_contrato": "2022-06-01",
+             "fecha_vencimiento": "2025-05-31", "importe": None},
+        ]),
+        "facturas": pd.DataFrame([
+            {"id": 1, "contrato_id": 1, "numero_factura": "F-1", "fecha_factura": "2023-02-01", "concepto": "enero",
+             "base_exenta": 0.0, "base_general": 82.85, "iva_general": 17.40, "total": 100.25,
+             "inicio_periodo": "2023-01-01", "fin_periodo": "2023-01-31"},
+        ]),
+        "documentos": pd.DataFrame([
+            {"id": 1, "contrato_id": 1, "factura_id": None, "nombre_archivo": "contrato.pdf"},
+            {"id": 2, "contrato_id": None, "factura_id": 1, "nombre_archivo": "F-1.pdf"},
+        ]),
+    }
+
+
+def test_ida_y_vuelta(tmp_path):
+    frames = _frames()
+    exportar_snapshot(ClienteMemoria(_frames()), str(tmp_path))
+    cliente = ClienteSnapshot(str(tmp_path))
+
+    for tabla, original in frames.items():
+        leido = cliente.fetch_frame(tabla)
+        assert list(leido.columns) == list(original.columns)
+        for columna in original.columns:
+            if columna.startswith(("fecha", "inicio", "fin")):
+                esperado = pd.to_datetime(original[columna]).astype(leido[columna].dtype)
+            else:
+                esperado = original[columna].astype(leido[columna].dtype)
+            pd.testing.assert_series_equal(leido[columna], esperado, check_names=False, check_dtype=False)
+
+    # Proyección de columnas y dinero en céntimos
+    assert list(cliente.fetch_frame("contratos", "id, centro").columns) == ["id", "centro"]
+    contratos = cliente.fetch_frame("contratos", "id,importe", centimos=True)
+    assert contratos["importe"].tolist()[0] == 120050
+    assert os.path.exists(tmp_path / cliente.version / "facturas.parquet")
+
+
+def test_version_nueva_se_ve_en_la_siguiente_lectura(tmp_path):
+    origen = ClienteMemoria(_frames())
+    exportar_snapshot(origen, str(tmp_path))
+    cliente = ClienteSnapshot(str(tmp_path), comprobar_cada_s=0)
+    espaciado = ClienteSnapshot(str(tmp_path))
+    assert len(cliente.fetch_frame("contratos")) == len(espaciado.fetch_frame("contratos")) == 2
+    primera = cliente.version
+
+    origen.table("contratos").insert({"proveedor_id": 1, "centro": "Residencia 3", "importe": 10}).execute()
+    exportar_snapshot(origen, str(tmp_path))
+    exportar_snapshot(origen, str(tmp_path))
+    assert len(cliente.fetch_frame("contratos")) == 3
+    # ACTUAL no se relee en cada llamada, solo cada COMPROBAR_VERSION_S
+    assert espaciado.version == primera
+    assert cliente.version == version_actual(str(tmp_path)) != primera
+    # Se conservan las dos últimas versiones (otros procesos pueden seguir con la anterior mapeada)
+    versiones = sorted(d for d in os.listdir(tmp_path) if (tmp_path / d).is_dir())
+    assert len(versiones) == 2 and versiones[-1] == cliente.version and primera not in versiones
+
+
+def test_exporta_lo_recien_ingestado_aunque_este_cacheado(tmp_path):
+    cache_compartida.configurar(f"sqlite:///{tmp_path / 'cache.db'}")
+    try:
+        origen = ClienteRemoto(_frames())
+        assert len(db_queries.get_contratos(origen)) == 2  # queda en la caché compartida
+        origen.table("contratos").insert({"proveedor_id": 1, "centro": "Residencia 3", "importe": 10}).execute()
+        assert len(db_queries.get_contratos(origen)) == 2
+
+        exportar_snapshot(origen, str(tmp_path / "snap"))
+        assert len(ClienteSnapshot(str(tmp_path / "snap")).fetch_frame("contratos")) == 3
+    finally:
+        cache_compartida.configurar(None)
+
+
+def test_fetch_frame_concurrente_con_version_nueva(tmp_path):
+    origen = ClienteMemoria(_frames())
+    exportar_snapshot(origen, str(tmp_path))
+    cliente = ClienteSnapshot(str(tmp_path), comprobar_cada_s=0)
+    errores, parar = [], threading.Event()
+
+    def leer():
+        try:
+            while not parar.is_set():
+                df = cliente.fetch_frame("contratos", "id,importe", centimos=True)
+                # Céntimos y filas de la misma versión: una fila más por versión exportada
+                assert df["importe"].tolist() == [120050, 0] + [1000] * (len(df) - 2)
+        except Exception as e:
+            errores.append(e)
+            parar.set()
+
+    lectores = [threading.Thread(target=leer) for _ in range(4)]
+    for t in lectores:
+        t.start()
+    for _ in range(15):
+        origen.table("contratos").insert({"proveedor_id": 1, "centro": "Residencia 3", "importe": 10}).execute()
+        exportar_snapshot(origen, str(tmp_path))
+    parar.set()
+    for t in lectores:
+        t.join()
+    assert errores == []
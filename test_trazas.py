@@ -0,0 +1,90 @@
+import re
+import json
+import pytest
+from rag import trazas
+from rag.trazas import span
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    """
+    Reloj controlado: cada span dura exactamente lo que se pide con reloj.avanzar().
+    """
+    class Reloj:
+        ahora = 0.0
+
+        def avanzar(self, segundos):
+            self.ahora += segundos
+
+    r = Reloj()
+    monkeypatch.setattr(trazas.time, "perf_counter", lambda: r.ahora)
+    trazas.reiniciar()
+    yield r
+    trazas.reiniciar()
+
+
+def _medir(reloj, nombre, segundos, **atributos):
+    with span(nombre, **atributos):
+        reloj.avanzar(segundos)
+
+
+def _muestras(texto: str) -> dict:
+    muestras = {}
+    for linea in texto.splitlines():
+        if not linea.startswith("#"):
+            serie, valor = linea.rsplit(" ", 1)
+            muestras[serie] = float(valor)
+    return muestras
+
+
+def test_buckets_acumulados(reloj):
+    for segundos in (0.003, 0.03, 0.3, 3.0, 30.0):
+        _medir(reloj, "db.facturas", segundos, filas=10, bytes=100)
+
+    muestras = _muestras(trazas.exportar_prometheus())
+    bucket = lambda le: muestras[f'residencias_span_duration_seconds_bucket{{span="db.facturas",le="{le}"}}']
+    esperados = {"0.005": 1, "0.01": 1, "0.025": 1, "0.05": 2, "0.1": 2, "0.25": 2, "0.5": 3,
+                 "1.0": 3, "2.5": 3, "5.0": 4, "10.0": 4, "+Inf": 5}
+    assert {le: bucket(le) for le in esperados} == esperados
+    assert muestras['residencias_span_duration_seconds_count{span="db.facturas"}'] == 5
+    assert muestras['residencias_span_duration_seconds_sum{span="db.facturas"}'] == pytest.approx(33.333)
+    assert muestras['residencias_span_rows_total{span="db.facturas"}'] == 50
+    assert muestras['residencias_span_bytes_total{span="db.facturas"}'] == 500
+
+
+def test_formato_de_exposicion(reloj):
+    _medir(reloj, 'raro "con" comillas\ny salto', 0.01)
+    with pytest.raises(ValueError):
+        with span("falla"):
+            raise ValueError("x")
+
+    texto = trazas.exportar_prometheus()
+    assert texto.endswith("\n")
+    serie = re.compile(r'^[a-z_]+\{span="(?:[^"\\]|\\.)*"(?:,le="[^"]+")?\} -?[0-9.e+-]+$')
+    for linea in texto.splitlines():
+        assert linea.startswith(("# HELP ", "# TYPE ")) or serie.match(linea), linea
+    # Cada métrica declara su tipo una vez, antes de sus muestras
+    tipos = re.findall(r"^# TYPE (\S+) (\S+)$", texto, flags=re.M)
+    assert tipos == [("residencias_span_duration_seconds", "histogram"), ("residencias_span_rows_total", "counter"),
+                     ("residencias_span_bytes_total", "counter"), ("residencias_span_errors_total", "counter")]
+    assert 'span="raro \\"con\\" comillas\\ny salto"' in texto
+    assert _muestras(texto)['residencias_span_errors_total{span="falla"}'] == 1
+
+
+def test_solo_las_trazas_lentas_van_al_log(reloj, tmp_path):
+    ruta, anterior = tmp_path / "lentas.log", (trazas.UMBRAL_LENTO_MS, trazas.SLOW_LOG_PATH)
+    trazas.configurar(umbral_ms=100, ruta_log=str(ruta))
+    try:
+        _medir(reloj, "vista.chat", 0.05)
+        with span("vista.chat", pregunta="gasto total"):
+            _medir(reloj, "db.facturas", 0.15, filas=3)
+            reloj.avanzar(0.05)
+    finally:
+        trazas.configurar(*anterior)
+
+    lineas = ruta.read_text(encoding="utf-8").splitlines()
+    assert len(lineas) == 1
+    traza = json.loads(lineas[0])
+    assert (traza["nombre"], traza["ms"], traza["propio_ms"], traza["pregunta"]) == ("vista.chat", 200.0, 50.0, "gasto total")
+    assert [(h["nombre"], h["filas"]) for h in traza["hijos"]] == [("db.facturas", 3)]
+    assert [t.nombre for t in trazas.trazas_recientes()] == ["vista.chat", "vista.chat"]